@@ -1,14 +1,23 @@
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import ClientDisconnect
+from datetime import datetime
 from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import Optional
+import cProfile
 import shutil
 import tempfile
 import os
+import asyncio
+import json
 import logging
+import threading
+import time
 import traceback
 from dotenv import load_dotenv
 
@@ -24,14 +33,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from settings import settings
-from db import init_db
+from db import db_executor, embedding_state, engine, ensure_vector_index, init_db, run_db, vector_store_stats
+import metrics
+from ingest.jobs import JobManager
 from ingest.pipeline import ingest_path
-from rag.embedder import Embedder
-from rag.retriever import Retriever
-from rag.chat import ChatLLM
+from ingest.reembed import migrate_embeddings
+from ingest.uploads import (
+    MultipartUpload, OffsetMismatch, UploadBudget, UploadError, UploadFeed, UploadSession, UploadSessions,
+    UploadTooLarge, archive_kind,
+)
+from rag.embedder import configured_model
+from rag.registry import registry
+from rag.retriever import EmbeddingModelChanged, Retriever, MODES as RETRIEVAL_MODES
+from rag.answer_cache import AnswerCache, context_fingerprint
+from rag.local_store import LocalStoreMismatch
+from rag.context import mmr, pack_context
 
-app = FastAPI(title="TauON PlantAI")
+# Filled in by the background startup task; see /ready
+# failed: startup hit an error retrying can't fix (see /health)
+startup_state = {"ready": False, "error": None, "failed": False}
+
+def _initialize():
+    """
+    Blocking startup work: load the active embedding model (its dimension sizes
+    the table), create/migrate the schema and fail over jobs left running by a
+    previous process.
+    """
+    state = embedding_state()  # None on a fresh database
+    if state and state["model"]:
+        registry.set_embedding_model(state["model"])
+    embedder = registry.embedder()
+    init_db(embedding_dimension=embedder.dimension, embed_model=embedder.model_name)
+    state = embedding_state()
+    if state and state["model"] and state["model"] != embedder.model_name:
+        # First start on tables from before embedding_state, filled by another model
+        registry.set_embedding_model(state["model"])
+        embedder = registry.embedder()
+    if settings.embed_cache_enabled:
+        metrics.register_cache("embedding", lambda: registry.embedder().cache.stats())
+    if state and configured_model() != embedder.model_name:
+        logger.warning(
+            f"Serving embeddings from {embedder.model_name}, the model the stored vectors were made with; "
+            f"POST /admin/embedding-migrations to move them to the configured {configured_model()}"
+        )
+    jobs.recover()
+
+async def _startup():
+    delay = 1
+    while True:
+        try:
+            await asyncio.to_thread(_initialize)
+            break
+        except LocalStoreMismatch as e:
+            startup_state.update(error=str(e), failed=True)
+            logger.error(f"Startup failed: {e}")
+            return
+        except Exception as e:
+            # Typically the database isn't reachable yet; keep serving /health meanwhile
+            startup_state["error"] = f"{type(e).__name__}: {e}"
+            logger.error(f"Startup failed, retrying in {delay}s: {startup_state['error']}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    startup_state.update(ready=True, error=None)
+    logger.info("Startup complete, accepting requests")
+    # Nice-to-haves that must not delay readiness
+    try:
+        if settings.warm_models:
+            await asyncio.to_thread(registry.warm)
+        await asyncio.to_thread(ensure_vector_index)
+    except Exception:
+        logger.error("Background warm-up failed:")
+        logger.error(traceback.format_exc())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The process starts listening immediately; models and DDL load in the background
+    task = asyncio.create_task(_startup())
+    yield
+    task.cancel()
+    jobs.pool.shutdown(wait=False, cancel_futures=True)
+    db_executor.shutdown(wait=False)
+    engine.dispose()
+    if settings.vector_store == "local":
+        from rag.local_store import local_store
+        local_store().close()
+
+# Probes and scrapes must answer while the service is still starting
+READINESS_EXEMPT = {"/health", "/ready", "/metrics"}
+
+async def require_ready(request: Request):
+    if not startup_state["ready"] and request.url.path not in READINESS_EXEMPT:
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "5"})
+
+app = FastAPI(title="TauON PlantAI", lifespan=lifespan, dependencies=[Depends(require_ready)])
 
 # Configure CORS to allow frontend requests
 # CORS_ORIGINS can be set in .env file (e.g., "http://localhost:5173,http://localhost:3000")
@@ -44,13 +140,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_profile_lock = threading.Lock()
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """
+    Record request latency per route (until the last body byte, so SSE streams
+    count in full). With PROFILING=1, a request sent with `X-Profile: 1` is also
+    run under cProfile and the trace is written to PROFILE_DIR; one profiled
+    request at a time, only work on the event-loop thread is captured, and a
+    streamed body is profiled up to its first byte.
+    """
+    profiler = None
+    if settings.profiling_enabled and request.headers.get("x-profile") == "1" and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    status = 500
+
+    def finish():
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - start)
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish()
+        raise
+    finally:
+        # Not in the body iterator: a body that is never iterated (client gone) would hold the lock forever
+        if profiler is not None:
+            profiler.disable()
+            try:
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                out = Path(settings.profile_dir)
+                out.mkdir(parents=True, exist_ok=True)
+                dump = out / f"{int(time.time() * 1000)}-{request.method}-{route.strip('/').replace('/', '_') or 'root'}.prof"
+                profiler.dump_stats(str(dump))
+                logger.info(f"Profile of {request.method} {request.url.path} written to {dump}")
+            finally:
+                _profile_lock.release()
+    status = response.status_code
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish()
+
+    response.body_iterator = observed_body()
+    return response
+
 # Add exception handlers to ensure CORS headers are included in error responses
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
-        headers={"Access-Control-Allow-Origin": request.headers.get("origin", "*")}
+        headers={**(exc.headers or {}), "Access-Control-Allow-Origin": request.headers.get("origin", "*")}
     )
 
 @app.exception_handler(RequestValidationError)
@@ -69,21 +218,34 @@ async def general_exception_handler(request: Request, exc: Exception):
         headers={"Access-Control-Allow-Origin": request.headers.get("origin", "*")}
     )
 
-# Initialize embedder first to detect dimension
-embedder = Embedder()
+retriever = Retriever(k=8)
+answer_cache = AnswerCache() if settings.answer_cache_enabled else None
+jobs = JobManager()
 
-# Initialize database with the correct embedding dimension
-init_db(embedding_dimension=embedder.dimension)
+def start_upload_job(session: UploadSession) -> str:
+    """Queue the ingestion of a finished resumable upload."""
+    def run(progress, cancel):
+        try:
+            return ingest_path(str(session.dir), "upload", progress, cancel,
+                               site=session.site, area=session.area, files=session.feed)
+        finally:
+            uploads.discard(session.id)
 
-retriever = Retriever(k=8)
-llm = ChatLLM()
+    return jobs.submit("upload", f"resumable upload {session.id}", run, cleanup_dir=str(session.dir))
+
+uploads = UploadSessions(start_upload_job)
+
+metrics.register_pool(engine.pool)
+if answer_cache:
+    metrics.register_cache("answer", answer_cache.stats)
 
 def check_auth(x_api_key: str):
     """
     Check API key authentication.
     
     This function validates the provided API key against the configured key in settings.
-    It logs authentication attempts for diagnostics.
+    Failed attempts are logged (with the key masked); successful ones only at DEBUG
+    level, since this runs on every request.
     
     Args:
         x_api_key: The API key provided by the client
@@ -99,62 +261,90 @@ def check_auth(x_api_key: str):
             return "***masked***"
         return f"{key[:4]}...{key[-4:]}"
     
-    received_key_masked = mask_key(x_api_key)
-    
-    # Log authentication attempt without exposing the expected key
-    logger.info(f"Authentication attempt - Received key: {received_key_masked}")
-    
     if x_api_key != settings.api_key:
-        logger.error(f"Authentication failed - Invalid API key provided: {received_key_masked}")
+        logger.error(f"Authentication failed - Invalid API key provided: {mask_key(x_api_key)}")
         raise HTTPException(status_code=401, detail="Invalid API key")
     
-    logger.info("Authentication successful")
+    logger.debug("Authentication successful")
 
 
 @app.post("/ingest/local")
-async def ingest_local(x_api_key: str = Form(...), path: str = Form(...)):
+async def ingest_local(
+    x_api_key: str = Form(...),
+    path: str = Form(...),
+    site: Optional[str] = Form(None),
+    area: Optional[str] = Form(None),
+):
     check_auth(x_api_key)
-    ingest_path(path, source_label="local")
-    return {"status": "ok"}
+    job_id = jobs.submit(
+        "local", path, lambda progress, cancel: ingest_path(path, "local", progress, cancel, site=site, area=area)
+    )
+    return {"status": "queued", "job_id": job_id}
+
+def upload_http_error(e: UploadError) -> HTTPException:
+    if isinstance(e, UploadTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, OffsetMismatch):
+        return HTTPException(status_code=409, detail={"error": str(e), "offset": e.received})
+    return HTTPException(status_code=400, detail=str(e))
 
 @app.post("/ingest/folder-upload")
-async def ingest_folder_upload(x_api_key: str = Form(...), files: list[UploadFile] = File(...)):
+async def ingest_folder_upload(request: Request):
     """
-    Ingest files from a folder upload.
-    
-    This endpoint receives multiple files, saves them to a temporary directory,
-    and processes them through the ingestion pipeline.
-    
-    Authentication is required via x_api_key form parameter.
+    Ingest files from a folder upload (multipart form: x_api_key, optional
+    site/area, then one or more `files`; fields must come before the files).
+
+    The body is parsed as it arrives: each file is written once, straight into
+    a temporary directory, and handed to the ingestion job as soon as its last
+    byte lands, so processing overlaps the upload. .zip and .tar(.gz) files are
+    unpacked. Files are limited to UPLOAD_MAX_FILE_MB each and
+    UPLOAD_MAX_TOTAL_MB together. The directory is removed when the job ends.
     """
-    logger.info(f"Starting /ingest/folder-upload - Received {len(files)} files")
-    
+    logger.info("Starting /ingest/folder-upload")
+    tmp = Path(tempfile.mkdtemp(prefix="tauon-upload-")).resolve()
+    feed = UploadFeed()
+    job_ids = []
+    ok = False
+
+    def start(fields: dict):
+        # Runs when the first file part begins, on the parser thread
+        check_auth(fields.get("x_api_key", ""))
+        site, area = fields.get("site") or None, fields.get("area") or None
+        job_ids.append(jobs.submit(
+            "upload", "folder upload",
+            lambda progress, cancel: ingest_path(str(tmp), "upload", progress, cancel, site=site, area=area, files=feed),
+            cleanup_dir=str(tmp),
+        ))
+        logger.info(f"Queued ingestion job {job_ids[0]} for {tmp}")
+
     try:
-        # Check authentication with detailed logging
-        check_auth(x_api_key)
-        
-        with tempfile.TemporaryDirectory() as tmp:
-            base = Path(tmp)
-            logger.info(f"Created temporary directory: {tmp}")
-            
-            for i, f in enumerate(files, 1):
-                logger.info(f"Processing file {i}/{len(files)}: {f.filename}")
-                p = base / f.filename
-                p.parent.mkdir(parents=True, exist_ok=True)
-                with p.open("wb") as out:
-                    shutil.copyfileobj(f.file, out)
-                logger.info(f"Saved file: {p}")
-            
-            logger.info(f"Starting ingestion pipeline for {tmp}")
-            ingest_path(tmp, source_label="upload")
-            logger.info("Ingestion pipeline completed successfully")
-        
-        return {"status": "ok"}
-    
+        receiver = MultipartUpload(request.headers.get("content-type", ""), tmp, UploadBudget(), feed, start)
+        try:
+            async for chunk in request.stream():
+                await asyncio.to_thread(receiver.write, chunk)
+            await asyncio.to_thread(receiver.finish)
+        except BaseException:
+            await asyncio.to_thread(receiver.abort)
+            raise
+        if not job_ids:
+            check_auth(receiver.fields.get("x_api_key", ""))
+            raise UploadError("No files in upload")
+        logger.info(f"Received {receiver.files} files for job {job_ids[0]}")
+        ok = True
+        return {"status": "queued", "job_id": job_ids[0], "files": receiver.files}
+
     except HTTPException as http_exc:
         # Re-raise HTTP exceptions (like 401 from check_auth) without modification
         logger.error(f"HTTP exception in /ingest/folder-upload: {http_exc.status_code} - {http_exc.detail}")
         raise
+
+    except UploadError as e:
+        logger.error(f"Rejected upload in /ingest/folder-upload: {e}")
+        raise upload_http_error(e)
+
+    except ClientDisconnect:
+        logger.error("Client disconnected during /ingest/folder-upload")
+        raise HTTPException(status_code=400, detail="Upload interrupted")
     
     except Exception as e:
         # Log the full traceback for debugging (server-side)
@@ -175,28 +365,318 @@ async def ingest_folder_upload(x_api_key: str = Form(...), files: list[UploadFil
             detail=error_detail
         )
 
+    finally:
+        feed.close()
+        if not job_ids:
+            shutil.rmtree(tmp, ignore_errors=True)
+        elif not ok:
+            # The job stops and removes the directory; files ingested so far stay
+            jobs.cancel(job_ids[0])
+
+@app.post("/ingest/uploads")
+async def create_upload(
+    x_api_key: str = Form(...),
+    site: Optional[str] = Form(None),
+    area: Optional[str] = Form(None),
+):
+    """
+    Start a resumable upload, for plant networks that drop connections.
+
+    Send each file with PUT /ingest/uploads/{upload_id}/files/{path} in
+    chunks (raw body, `offset` = bytes already stored, `final=true` on the
+    last chunk); after an interruption GET /ingest/uploads/{upload_id} gives
+    the offset to resume from. POST /ingest/uploads/{upload_id}/finish once
+    all are sent to start their ingestion job (archives are unpacked as they
+    complete); a session idle for UPLOAD_IDLE_TIMEOUT is finished for you.
+    """
+    check_auth(x_api_key)
+    session = uploads.create(site, area)
+    return {"status": "open", "upload_id": session.id, "job_id": None}
+
+def get_upload_session(upload_id: str):
+    session = uploads.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found or already finished")
+    return session
+
+@app.put("/ingest/uploads/{upload_id}/files/{path:path}")
+async def upload_chunk(upload_id: str, path: str, request: Request, x_api_key: str, offset: int = 0, final: bool = False):
+    """Append the request body to `path` at `offset`; 409 (with the stored size) if that isn't where the file ends."""
+    check_auth(x_api_key)
+    session = get_upload_session(upload_id)
+    try:
+        target, out, size = session.open_chunk(path, offset)
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                session.budget.add(path, len(chunk), None if archive_kind(path) else size)
+                session.feed.touch()
+                await asyncio.to_thread(out.write, chunk)
+        except BaseException:
+            # Keep what was written; the client resumes from the stored size
+            await asyncio.to_thread(session.close_chunk, path, target, out, False)
+            raise
+        await asyncio.to_thread(session.close_chunk, path, target, out, final)
+    except UploadError as e:
+        raise upload_http_error(e)
+    except ClientDisconnect:
+        raise HTTPException(status_code=400, detail="Upload interrupted")
+    return {"path": path, "received": size, "complete": final}
+
+@app.get("/ingest/uploads/{upload_id}")
+async def get_upload(upload_id: str, x_api_key: str):
+    check_auth(x_api_key)
+    return get_upload_session(upload_id).status()
+
+@app.post("/ingest/uploads/{upload_id}/finish")
+async def finish_upload(upload_id: str, x_api_key: str = Form(...)):
+    """No more files: queue the ingestion job for the files received (idempotent)."""
+    check_auth(x_api_key)
+    session = get_upload_session(upload_id)
+    try:
+        uploads.finish(session)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return session.status()
 
 @app.post("/ingest/sharepoint")
-async def ingest_sharepoint(x_api_key: str = Form(...), sp_folder: str = Form(...)):
+async def ingest_sharepoint(
+    x_api_key: str = Form(...),
+    sp_folder: str = Form(...),
+    site: Optional[str] = Form(None),
+    area: Optional[str] = Form(None),
+):
     check_auth(x_api_key)
     from ingest.sharepoint_client import SharePointClient
     sp = SharePointClient()
-    with tempfile.TemporaryDirectory() as tmp:
-        base = Path(tmp)
-        async def run():
-            async for name, content in sp.iter_files(sp_folder):
-                p = base / name
-                p.parent.mkdir(parents=True, exist_ok=True)
-                with p.open("wb") as out:
-                    out.write(content)
-        await run()
-        ingest_path(tmp, source_label="sharepoint")
-    return {"status": "ok"}
+    # A persistent mirror (one directory per folder) lets delta syncs fetch only
+    # changed items and gives the ingest manifest stable paths to diff against.
+    mirror = Path(settings.sp_mirror_dir) / sp_folder.strip("/").replace("/", "__")
+
+    def run(progress, cancel):
+        # Runs on a job worker thread, which has no event loop of its own
+        asyncio.run(sp.sync_folder(sp_folder, mirror))
+        return ingest_path(str(mirror), "sharepoint", progress, cancel, site=site, area=area)
+
+    job_id = jobs.submit("sharepoint", sp_folder, run)
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/ingest/jobs")
+async def list_ingest_jobs(x_api_key: str, limit: int = 50):
+    check_auth(x_api_key)
+    return {"jobs": await run_db(jobs.list, limit)}
+
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str, x_api_key: str):
+    check_auth(x_api_key)
+    job = await run_db(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str, x_api_key: str = Form(...)):
+    check_auth(x_api_key)
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not running on this server or already finished")
+    return {"status": "cancelling", "job_id": job_id}
+
+@app.get("/stats/answer-cache")
+async def answer_cache_stats(x_api_key: str):
+    check_auth(x_api_key)
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+@app.get("/stats/embedding-cache")
+async def embedding_cache_stats(x_api_key: str):
+    check_auth(x_api_key)
+    cache = registry.embedder().cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/stats/vector-store")
+async def vector_store_stats_endpoint(x_api_key: str):
+    """Rows and on-disk footprint of the active vector store (pgvector or local)."""
+    check_auth(x_api_key)
+    return await run_db(vector_store_stats)
+
+@app.post("/admin/embedding-migrations")
+async def start_embedding_migration(x_api_key: str = Form(...), model: Optional[str] = Form(None)):
+    """
+    Re-embed the corpus with `model` in a background job and switch to it
+    atomically when done (see ingest/reembed.py). `model` is an embedder name
+    such as "openai:text-embedding-3-large@1024" or "st:BAAI/bge-m3"; the
+    default is the model configured in the environment.
+    """
+    check_auth(x_api_key)
+    if settings.vector_store == "local":
+        raise HTTPException(status_code=400, detail="Embedding migrations need VECTOR_STORE=pgvector")
+    target = model or configured_model()
+    if target == registry.embedder().model_name:
+        raise HTTPException(status_code=409, detail=f"{target} is already the active embedding model")
+    job_id = jobs.submit("reembed", target, lambda progress, cancel: migrate_embeddings(target, progress, cancel))
+    return {"status": "queued", "job_id": job_id, "model": target}
+
+@app.get("/admin/embedding-migrations")
+async def list_embedding_migrations(x_api_key: str, limit: int = 20):
+    """The active embedding model, the configured one and recent migration jobs."""
+    check_auth(x_api_key)
+    return {
+        "active": await run_db(embedding_state),
+        "configured": configured_model(),
+        "jobs": await run_db(jobs.list, limit, "reembed"),
+    }
+
+class SearchFilters:
+    """Optional /chat form fields that narrow retrieval to part of the corpus."""
+
+    def __init__(
+        self,
+        mode: Optional[str] = Form(None),
+        source: Optional[str] = Form(None),
+        uri_prefix: Optional[str] = Form(None),
+        site: Optional[str] = Form(None),
+        area: Optional[str] = Form(None),
+        doc_type: Optional[str] = Form(None),
+        ingested_after: Optional[str] = Form(None),
+    ):
+        if mode is not None and mode not in RETRIEVAL_MODES:
+            raise HTTPException(status_code=422, detail=f"mode must be one of {list(RETRIEVAL_MODES)}")
+        if ingested_after is not None:
+            try:
+                datetime.fromisoformat(ingested_after)
+            except ValueError:
+                raise HTTPException(status_code=422, detail="ingested_after must be an ISO 8601 timestamp")
+        self.kwargs = {
+            "mode": mode, "source": source, "uri_prefix": uri_prefix, "site": site, "area": area,
+            "doc_type": doc_type.lower().lstrip(".") if doc_type else None, "ingested_after": ingested_after,
+        }
+
+async def search(q_emb, question: str, filters: SearchFilters, embed_model: str):
+    """
+    Retrieve context for `question`. With RERANK=1 a deeper candidate pool is
+    re-scored by the cross-encoder and MMR drops near-duplicates; either way the
+    hits are packed into CONTEXT_TOKEN_BUDGET prompt tokens.
+    """
+    reranker = registry.reranker()
+    if reranker is None:
+        with metrics.CHAT_STAGE_SECONDS.labels("retrieve").time():
+            hits = await retriever.asearch(q_emb, query_text=question, embed_model=embed_model, **filters.kwargs)
+    else:
+        with metrics.CHAT_STAGE_SECONDS.labels("retrieve").time():
+            candidates = await retriever.asearch(
+                q_emb, query_text=question, k=max(settings.rerank_candidates, retriever.k),
+                embed_model=embed_model, **filters.kwargs
+            )
+        with metrics.CHAT_STAGE_SECONDS.labels("rerank").time():
+            ranked = await asyncio.to_thread(reranker.rerank, question, candidates, retriever.k)
+        hits = mmr(ranked, retriever.k, settings.mmr_lambda)
+    return pack_context(hits, settings.context_token_budget)
+
+async def embed_and_search(question: str, filters: SearchFilters):
+    """
+    Embed `question` and retrieve context for it; returns (question embedding,
+    hits, embedding model).
+    If an embedding migration cut over meanwhile (possibly in another process),
+    switch to the new model and embed the question again.
+    """
+    embedder = registry.embedder()
+    for attempt in range(2):
+        with metrics.CHAT_STAGE_SECONDS.labels("embed").time():
+            q_emb = (await embedder.aembed([question]))[0]
+        try:
+            return q_emb, await search(q_emb, question, filters, embedder.model_name), embedder.model_name
+        except EmbeddingModelChanged as e:
+            if attempt:
+                raise
+            logger.info(f"Embedding model changed to {e.model}; re-embedding the question")
+            await asyncio.to_thread(registry.set_embedding_model, e.model)
+            embedder = registry.embedder()
 
 @app.post("/chat")
-async def chat(x_api_key: str = Form(...), question: str = Form(...)):
+async def chat(
+    x_api_key: str = Form(...),
+    question: str = Form(...),
+    filters: SearchFilters = Depends(),
+):
     check_auth(x_api_key)
-    q_emb = embedder.embed([question])[0]
-    hits = retriever.search(q_emb)
-    answer = llm.answer(question, hits)
+    q_emb, hits, embed_model = await embed_and_search(question, filters)
+    fingerprint = context_fingerprint(hits, embed_model)
+    answer = answer_cache.get(question, q_emb, fingerprint) if answer_cache else None
+    if answer is None:
+        with metrics.CHAT_STAGE_SECONDS.labels("llm").time():
+            answer = await registry.llm().aanswer(question, hits)
+        if answer_cache:
+            answer_cache.put(question, q_emb, fingerprint, answer)
     return JSONResponse({"answer": answer, "sources": hits})
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(
+    x_api_key: str = Form(...),
+    question: str = Form(...),
+    filters: SearchFilters = Depends(),
+):
+    """
+    Server-Sent Events variant of /chat.
+
+    Emits one `sources` event with the retrieved chunks, then a `token` event per
+    answer fragment as the model generates it, and finally `done` (or `error`).
+    """
+    check_auth(x_api_key)
+
+    async def events():
+        try:
+            q_emb, hits, embed_model = await embed_and_search(question, filters)
+            yield sse_event("sources", hits)
+            fingerprint = context_fingerprint(hits, embed_model)
+            cached = answer_cache.get(question, q_emb, fingerprint) if answer_cache else None
+            if cached is not None:
+                yield sse_event("token", cached)
+            else:
+                parts = []
+                t0 = time.perf_counter()
+                async for token in registry.llm().astream(question, hits):
+                    if not parts:
+                        metrics.CHAT_STAGE_SECONDS.labels("llm_first_token").observe(time.perf_counter() - t0)
+                    parts.append(token)
+                    yield sse_event("token", token)
+                metrics.CHAT_STAGE_SECONDS.labels("llm").observe(time.perf_counter() - t0)
+                if answer_cache:
+                    answer_cache.put(question, q_emb, fingerprint, "".join(parts))
+            yield sse_event("done", {})
+        except Exception as e:
+            logger.error("Exception occurred in /chat/stream:")
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the browser as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (unauthenticated, like most exporters; disable with METRICS=0)."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving (models/DB may still be loading), 500 if startup gave up."""
+    if startup_state["failed"]:
+        return JSONResponse({"status": "failed", "error": startup_state["error"]}, status_code=500)
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the schema is in place and the embedder is loaded, 503 before."""
+    body = {"ready": startup_state["ready"], "error": startup_state["error"], "models": registry.loaded()}
+    return JSONResponse(body, status_code=200 if startup_state["ready"] else 503)
@@ -1,4 +1,8 @@
 
+import asyncio
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from pgvector.sqlalchemy import Vector
@@ -8,15 +12,278 @@ DSN = (
     f"postgresql+psycopg2://{settings.postgres_user}:{settings.postgres_password}"
     f"@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
 )
-engine = create_engine(DSN)
+engine = create_engine(
+    DSN,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,  # drop connections before LBs/firewalls silently cut them
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_use_lifo=True,  # reuse warm connections (and their prepared statements) first
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def init_db(embedding_dimension: int = 3072):
+# Blocking DB work from async handlers runs here. Sized to the connection pool
+# so threads never queue on pool checkout.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.db_pool_size + settings.db_max_overflow, thread_name_prefix="db"
+)
+
+def metadata_session():
+    """
+    Session on the database holding documents, the manifest and jobs: Postgres,
+    or the local store's SQLite file with VECTOR_STORE=local.
+    """
+    if settings.vector_store == "local":
+        from rag.local_store import local_store
+        return local_store().session()
+    return SessionLocal()
+
+async def run_db(fn, *args):
+    """Run blocking DB code `fn(*args)` without stalling the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, fn, *args)
+
+def vector_literal(vec) -> str:
+    """pgvector text form of `vec` ("[0.1,0.2,...]"), for bound parameters and COPY."""
+    return "[" + ",".join(str(float(x)) for x in vec) + "]"
+
+# pgvector index limits per storage type
+MAX_INDEX_DIMS = {"vector": 2000, "halfvec": 4000}
+
+def embedding_column(conn, column: str = "embedding") -> tuple[str, int] | None:
+    """Return (type name, dimension) of documents.<column>, or None if it doesn't exist."""
+    row = conn.execute(text(
+        """
+        SELECT t.typname, a.atttypmod
+        FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = to_regclass('documents') AND a.attname = :column
+        """
+    ), {"column": column}).fetchone()
+    return (row[0], row[1]) if row else None
+
+def embedding_search_sql(col_type: str, dim: int, column: str = "embedding") -> tuple[str, str, str | None]:
+    """
+    Return (indexed expression, query cast type, operator class) for cosine search.
+
+    `vector` columns wider than the 2000-dim index limit are indexed through a
+    halfvec expression (up to 4000 dims) so the full-precision values stay in
+    the table; queries must ORDER BY the same expression to use the index.
+    The operator class is None when no ANN index is possible.
+    """
+    if col_type == "vector" and dim > MAX_INDEX_DIMS["vector"]:
+        col_type, expr = "halfvec", f"({column}::halfvec({dim}))"
+    else:
+        expr = column
+    opclass = f"{col_type}_cosine_ops" if dim <= MAX_INDEX_DIMS[col_type] else None
+    return expr, f"{col_type}({dim})", opclass
+
+def vector_index_options(rows: int) -> str:
+    """WITH (...) options for a VECTOR_INDEX (hnsw | ivfflat) index over `rows` vectors."""
+    if settings.vector_index == "ivfflat":
+        lists = settings.ivfflat_lists or max(10, int(rows / 1000) if rows <= 1_000_000 else int(rows ** 0.5))
+        return f"lists = {lists}"
+    return f"m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction}"
+
+# pg advisory lock keys: several workers/replicas start at once but only one should run DDL
+SCHEMA_LOCK = 7_245_001
+VECTOR_INDEX_LOCK = 7_245_002
+# Held shared by searches and ingestion runs, exclusively by an embedding migration's cutover
+EMBEDDING_LOCK = 7_245_003
+EMBEDDING_MIGRATION_LOCK = 7_245_004
+# Searches re-read embedding_state at most this often (seconds) while no migration is
+# announced (next_model set); a cutover waits twice this long after the announcement
+EMBEDDING_STATE_RECHECK = 5.0
+
+def embedding_state(conn=None) -> dict | None:
+    """
+    The active embedding model: `model` (an Embedder.model_name, None when
+    unknown), `dimension`, `generation` (bumped by every cutover) and
+    `next_model` (target of a migration in progress). None before the first
+    init_db() and with VECTOR_STORE=local.
+    """
+    if settings.vector_store == "local":
+        return None
+    if conn is None:
+        with engine.connect() as conn:
+            return embedding_state(conn)
+    if not conn.execute(text("SELECT to_regclass('embedding_state')")).scalar():
+        return None
+    row = conn.execute(text(
+        "SELECT model, dimension, generation, next_model FROM embedding_state WHERE id = 1"
+    )).mappings().first()
+    return dict(row) if row else None
+
+@contextmanager
+def active_embedding_model():
+    """
+    Pin the active embedding model for a write path such as an ingestion run:
+    yields embedding_state() and holds EMBEDDING_LOCK (shared) until exit, so
+    a migration can't swap the embedding column underneath. Yields None with
+    VECTOR_STORE=local.
+    """
+    if settings.vector_store == "local":
+        yield None
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock_shared(:k)"), {"k": EMBEDDING_LOCK})
+        state = embedding_state(conn)
+        conn.commit()  # session-level lock: don't sit idle in a transaction meanwhile
+        try:
+            yield state
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock_shared(:k)"), {"k": EMBEDDING_LOCK})
+            conn.commit()
+
+def _index_valid(conn, name: str) -> bool | None:
+    """Whether index `name` is usable (False: left invalid by an interrupted CONCURRENTLY build; None: absent)."""
+    return conn.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {"name": name}).scalar()
+
+def _reloptions(with_clause: str) -> set[str]:
+    """`m = 16, ef_construction = 64` in the form pg_class.reloptions stores it."""
+    return {o.replace(" ", "") for o in with_clause.split(",")}
+
+def ensure_vector_index(rebuild: bool = False):
+    """
+    Create (or rebuild) the ANN index on documents.embedding according to
+    VECTOR_INDEX (hnsw | ivfflat | none). Meant to run after bulk loads:
+    IVFFLAT is skipped on an empty table and rebuilt when the row count has
+    drifted far from what its lists were trained for; HNSW is rebuilt when
+    HNSW_M/HNSW_EF_CONSTRUCTION change. If another process is already
+    building, this call returns immediately.
+
+    Indexes are built CONCURRENTLY and a rebuild is swapped in by renaming, so
+    searches and ingestion keep running against the old index meanwhile.
+    """
+    if settings.vector_store == "local":
+        from rag.local_store import local_store
+        return local_store().ensure_index(rebuild)
+    with engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": VECTOR_INDEX_LOCK}).scalar():
+            print("[DB] Vector index maintenance already running in another process; skipping")
+            return
+        try:
+            if settings.index_maintenance_work_mem:
+                conn.execute(text(f"SET maintenance_work_mem = '{settings.index_maintenance_work_mem}'"))
+            _ensure_vector_index(conn, rebuild)
+        finally:
+            if settings.index_maintenance_work_mem:
+                conn.execute(text("RESET maintenance_work_mem"))
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": VECTOR_INDEX_LOCK})
+
+def _ensure_vector_index(conn, rebuild: bool):
+    current = embedding_column(conn)
+    if not current or settings.vector_index == "none":
+        return
+    col_type, dim = current
+    expr, _, opclass = embedding_search_sql(col_type, dim)
+    if opclass is None:
+        print(f"[DB] No ANN index possible for {col_type}({dim}); set EMBED_DIMENSIONS <= 4000 to enable one")
+        return
+    existing = conn.execute(text(
+        """
+        SELECT am.amname, c.reloptions, i.indisvalid
+        FROM pg_class c JOIN pg_am am ON am.oid = c.relam JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = 'idx_documents_embedding'
+        """
+    )).fetchone()
+    if existing and not existing[2]:
+        conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_documents_embedding"))
+        existing = None
+    rows = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'documents'")).scalar() or 0
+    if settings.vector_index == "ivfflat":
+        if rows <= 0:
+            rows = conn.execute(text("SELECT count(*) FROM documents")).scalar()
+        if rows == 0:
+            print("[DB] Deferring IVFFLAT index until documents has rows")
+            return
+        with_clause = vector_index_options(rows)
+        lists = int(with_clause.split("=")[1])
+        if existing and existing[0] == "ivfflat" and not rebuild:
+            built = int(next((o.split("=")[1] for o in existing[1] or [] if o.startswith("lists=")), lists))
+            if not lists / 2 <= built <= lists * 2:
+                print(f"[DB] IVFFLAT index was trained for lists={built}, table now wants {lists}; rebuilding")
+                rebuild = True
+        elif existing and existing[0] != "ivfflat":
+            rebuild = True
+    else:
+        with_clause = vector_index_options(rows)
+        if existing and (existing[0] != "hnsw" or set(existing[1] or []) != _reloptions(with_clause)):
+            print(f"[DB] HNSW index options changed to {with_clause}; rebuilding")
+            rebuild = True
+    if not existing or rebuild:
+        target = "idx_new_documents_embedding" if existing else "idx_documents_embedding"
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {target}"))  # leftover of an interrupted rebuild
+        print(f"[DB] Building {settings.vector_index.upper()} index on {expr} ({with_clause}) over ~{rows} rows...")
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {target} ON documents "
+            f"USING {settings.vector_index} ({expr} {opclass}) WITH ({with_clause})"
+        ))
+        if existing:
+            # Renames only take a SHARE UPDATE EXCLUSIVE lock; searches never wait on the swap
+            with engine.begin() as swap:
+                swap.execute(text("ALTER INDEX idx_documents_embedding RENAME TO idx_old_documents_embedding"))
+                swap.execute(text(f"ALTER INDEX {target} RENAME TO idx_documents_embedding"))
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_old_documents_embedding"))
+            # Partial indexes were built with the old options; rebuilt below
+            for (name,) in conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'documents' AND indexname LIKE 'idx\\_documents\\_embedding\\_%'"
+            )).fetchall():
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        print("[DB] Vector index ready")
+    _ensure_partial_vector_indexes(conn, expr, opclass)
+
+def _ensure_partial_vector_indexes(conn, expr: str, opclass: str):
+    """
+    With VECTOR_INDEX_PARTITION_BY=site|source, give every value with at least
+    PARTIAL_INDEX_MIN_ROWS chunks its own ANN index restricted to it
+    (`WHERE site = '...'`). A filtered search then walks a graph holding only
+    that site's vectors instead of post-filtering the global one, which stays
+    fast and keeps recall when one site is a small share of the corpus.
+    """
+    column = settings.vector_index_partition_by
+    if column not in ("site", "source"):
+        return
+    values = conn.execute(text(
+        f"SELECT {column}, count(*) FROM documents WHERE {column} IS NOT NULL "
+        f"GROUP BY {column} HAVING count(*) >= :min_rows"
+    ), {"min_rows": settings.partial_index_min_rows}).fetchall()
+    for value, rows in values:
+        name = f"idx_documents_embedding_{column}_{hashlib.md5(value.encode()).hexdigest()[:12]}"
+        valid = _index_valid(conn, name)
+        if valid:
+            continue
+        if valid is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        with_clause = vector_index_options(rows)
+        literal = value.replace("'", "''")
+        print(f"[DB] Building partial {settings.vector_index.upper()} index for {column} = {value!r} ({rows} rows)...")
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {name} ON documents USING {settings.vector_index} ({expr} {opclass}) "
+            f"WITH ({with_clause}) WHERE {column} = '{literal}'"
+        ))
+
+def init_db(embedding_dimension: int = 3072, embed_model: str | None = None):
     """
     Initialize database with the correct embedding dimension.
     Default is 3072 for text-embedding-3-large model.
+    `embed_model` is recorded as the active embedding model on first start
+    (see embedding_state()); moving the vectors to a different model is an
+    embedding migration (ingest/reembed.py), not something done here.
+    Concurrent callers are serialized on an advisory lock; the ANN index is
+    left to ensure_vector_index(), which can take long and runs separately.
+    With VECTOR_STORE=local this sets up the embedded store instead.
     """
+    if settings.vector_store == "local":
+        from rag.local_store import local_store
+        return local_store().init(embedding_dimension)
     with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": SCHEMA_LOCK})
+        # Fail fast (and let the caller retry) instead of queueing behind a long index build
+        conn.execute(text("SET LOCAL lock_timeout = '10s'"))
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         
         # Check if table exists and get its dimension
@@ -29,26 +296,22 @@ def init_db(embedding_dimension: int = 3072):
         )).fetchone()
         
         if result:
-            # Table exists - check if we need to recreate it with new dimension
-            # We'll drop and recreate if dimension doesn't match
-            # In production, you'd want a proper migration
             print(f"[DB] Table 'documents' already exists. Checking dimension...")
-            # Get current dimension from vector type
-            dim_result = conn.execute(text(
-                """
-                SELECT atttypmod - 4 as dimension
-                FROM pg_attribute
-                WHERE attrelid = 'documents'::regclass AND attname = 'embedding'
-                """
-            )).fetchone()
-            
-            if dim_result and dim_result[0] != embedding_dimension:
-                print(f"[DB] WARNING: Existing table has dimension {dim_result[0]}, but model requires {embedding_dimension}")
-                print(f"[DB] Please run: DROP TABLE documents; to recreate with correct dimension")
-                print(f"[DB] Or update your embedding model to match dimension {dim_result[0]}")
+            current = embedding_column(conn)
+            if current and current[1] != embedding_dimension:
+                if not conn.execute(text("SELECT EXISTS (SELECT 1 FROM documents)")).scalar():
+                    # Nothing embedded yet: just resize the column (its indexes go with it)
+                    storage = "HALFVEC" if settings.vector_storage == "halfvec" else "VECTOR"
+                    print(f"[DB] Table is empty; recreating embedding as {storage.lower()}({embedding_dimension})")
+                    conn.execute(text("ALTER TABLE documents DROP COLUMN embedding"))
+                    conn.execute(text(f"ALTER TABLE documents ADD COLUMN embedding {storage}({embedding_dimension})"))
+                else:
+                    print(f"[DB] WARNING: Existing vectors have dimension {current[1]}, but {embed_model} produces {embedding_dimension}")
+                    print("[DB] Re-embed them with POST /admin/embedding-migrations (no downtime, no re-extraction)")
         else:
             # Table doesn't exist - create it with the correct dimension
-            print(f"[DB] Creating 'documents' table with embedding dimension {embedding_dimension}...")
+            storage = "HALFVEC" if settings.vector_storage == "halfvec" else "VECTOR"
+            print(f"[DB] Creating 'documents' table with embedding {storage.lower()}({embedding_dimension})...")
             conn.execute(text(
                 f"""
                 CREATE TABLE IF NOT EXISTS documents (
@@ -58,23 +321,15 @@ def init_db(embedding_dimension: int = 3072):
                   page INTEGER,
                   chunk_id VARCHAR(128),
                   content TEXT,
-                  embedding VECTOR({embedding_dimension})
+                  embedding {storage}({embedding_dimension})
                 );
                 """
             ))
             
-            # Create IVFFLAT index only if dimension <= 2000 (pgvector limitation)
-            # For dimensions > 2000, the table will work but without the IVFFLAT index
-            # which may result in slower similarity searches but allows use of large models
-            if embedding_dimension <= 2000:
-                conn.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_documents_embedding ON documents USING ivfflat (embedding vector_cosine_ops);"
-                ))
-                print(f"[DB] Created IVFFLAT index for embedding dimension {embedding_dimension}")
-            else:
-                print(f"[DB] Skipping IVFFLAT index creation: dimension {embedding_dimension} exceeds pgvector limit of 2000")
-                print(f"[DB] Similarity searches will work but may be slower without the index")
-            
+            # The ANN index is built by ensure_vector_index() once there is data:
+            # IVFFLAT lists trained on an empty table are useless, and HNSW
+            # builds much faster in bulk than row by row during ingestion.
+
             # Always create source index regardless of embedding dimension
             conn.execute(text(
                 "CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source);"
@@ -82,3 +337,160 @@ def init_db(embedding_dimension: int = 3072):
             
             print(f"[DB] Table created successfully with dimension {embedding_dimension}")
 
+        # Incremental ingestion: per-chunk content hash plus a per-file manifest
+        # so unchanged files are skipped and changed files only re-embed the
+        # chunks whose text actually changed.
+        conn.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_uri ON documents(uri);"))
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_manifest (
+              uri VARCHAR(1024) PRIMARY KEY,
+              source VARCHAR(512),
+              size BIGINT,
+              mtime DOUBLE PRECISION,
+              content_hash VARCHAR(64),
+              embed_model VARCHAR(256),
+              updated_at TIMESTAMPTZ DEFAULT now()
+            );
+            """
+        ))
+
+        # Lexical side of hybrid retrieval (see rag/retriever.py). 'simple' keeps
+        # tag numbers and alarm codes intact instead of stemming them.
+        conn.execute(text(
+            f"""
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('{settings.text_search_config}', coalesce(content, ''))) STORED
+            """
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_content_tsv ON documents USING gin (content_tsv);"))
+
+        # Metadata for filtered retrieval: site/area come from the ingest request or
+        # the folder layout (INGEST_PATH_METADATA), doc_type from the file extension
+        for column in ("site VARCHAR(256)", "area VARCHAR(256)", "doc_type VARCHAR(32)",
+                       "ingested_at TIMESTAMPTZ DEFAULT now()"):
+            conn.execute(text(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS {column}"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_site_area ON documents(site, area);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_doc_type ON documents(doc_type);"))
+        conn.execute(text("ALTER TABLE ingest_manifest ADD COLUMN IF NOT EXISTS site VARCHAR(256)"))
+        conn.execute(text("ALTER TABLE ingest_manifest ADD COLUMN IF NOT EXISTS area VARCHAR(256)"))
+
+        # Embedding cache shared by ingestion and /chat (see rag/embed_cache.py)
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+              model VARCHAR(256) NOT NULL,
+              text_hash CHAR(64) NOT NULL,
+              embedding BYTEA NOT NULL,
+              last_used TIMESTAMPTZ NOT NULL DEFAULT now(),
+              PRIMARY KEY (model, text_hash)
+            );
+            """
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used);"))
+
+        # SharePoint delta sync state (see ingest/sharepoint_client.py)
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS sharepoint_delta (
+              drive_id VARCHAR(256) NOT NULL,
+              folder VARCHAR(1024) NOT NULL,
+              delta_link TEXT,
+              updated_at TIMESTAMPTZ DEFAULT now(),
+              PRIMARY KEY (drive_id, folder)
+            );
+            """
+        ))
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS sharepoint_items (
+              drive_id VARCHAR(256) NOT NULL,
+              folder VARCHAR(1024) NOT NULL,
+              item_id VARCHAR(256) NOT NULL,
+              parent_id VARCHAR(256),
+              name VARCHAR(1024),
+              is_folder BOOLEAN NOT NULL,
+              etag VARCHAR(256),
+              path VARCHAR(2048),
+              PRIMARY KEY (drive_id, folder, item_id)
+            );
+            """
+        ))
+
+        # Background ingestion jobs (see ingest/jobs.py)
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+              id VARCHAR(32) PRIMARY KEY,
+              kind VARCHAR(32) NOT NULL,
+              target VARCHAR(1024),
+              status VARCHAR(16) NOT NULL,
+              progress JSONB,
+              error TEXT,
+              created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+              started_at TIMESTAMPTZ,
+              finished_at TIMESTAMPTZ
+            );
+            """
+        ))
+
+        # Which model produced documents.embedding; an embedding migration swaps it (see ingest/reembed.py)
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_state (
+              id INTEGER PRIMARY KEY CHECK (id = 1),
+              model VARCHAR(256),
+              dimension INTEGER,
+              generation INTEGER NOT NULL DEFAULT 1,
+              next_model VARCHAR(256),
+              updated_at TIMESTAMPTZ DEFAULT now()
+            );
+            """
+        ))
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM embedding_state)")).scalar():
+            # Tables from before embedding_state: the manifest knows which model embedded the
+            # stored chunks, which may not be the configured one
+            model = None
+            if conn.execute(text("SELECT EXISTS (SELECT 1 FROM documents)")).scalar():
+                model = conn.execute(text(
+                    "SELECT split_part(embed_model, ';', 1) FROM ingest_manifest WHERE embed_model IS NOT NULL "
+                    "GROUP BY 1 ORDER BY count(*) DESC LIMIT 1"
+                )).scalar()
+            dim = embedding_column(conn)[1]
+            if model is None and dim == embedding_dimension:
+                model = embed_model
+            if model is None:
+                print("[DB] WARNING: Unknown model behind the stored vectors; re-embed them with POST /admin/embedding-migrations")
+            conn.execute(text(
+                "INSERT INTO embedding_state (id, model, dimension) VALUES (1, :model, :dim)"
+            ), {"model": model, "dim": dim})
+
+def vector_store_stats() -> dict:
+    """Row count and on-disk footprint of the vectors, their ANN indexes and everything else."""
+    if settings.vector_store == "local":
+        from rag.local_store import local_store
+        return local_store().stats()
+    with engine.connect() as conn:
+        col_type, dim = embedding_column(conn)
+        row = conn.execute(text(
+            """
+            SELECT (SELECT reltuples::bigint FROM pg_class WHERE relname = 'documents') AS rows,
+                   pg_total_relation_size('documents') AS total_bytes,
+                   (SELECT coalesce(sum(pg_relation_size(indexname::text::regclass)), 0) FROM pg_indexes
+                    WHERE tablename = 'documents' AND indexname LIKE 'idx\\_documents\\_embedding%') AS index_bytes
+            """
+        )).mappings().first()
+    rows = max(row["rows"], 0)
+    # Estimated from the storage type rather than summed over every row (4-byte varlena + 4-byte header)
+    vector_bytes = rows * (8 + dim * (2 if col_type == "halfvec" else 4))
+    return {
+        "backend": "pgvector",
+        "rows": rows,
+        "dimension": dim,
+        "dtype": col_type,
+        "index": settings.vector_index,
+        "vector_bytes": vector_bytes,
+        "index_bytes": int(row["index_bytes"]),
+        "metadata_bytes": max(0, row["total_bytes"] - int(row["index_bytes"]) - vector_bytes),
+    }
@@ -1,43 +1,145 @@
 
+import csv
+import itertools
+import time
+import zlib
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator, Optional
 from pypdf import PdfReader
 import docx2txt
-import pandas as pd
-from PIL import Image
-import pytesseract
+from openpyxl import load_workbook
+from settings import settings
+from .ocr import log_throughput, needs_ocr, ocr_image, ocr_image_file, pdfium, render_pdf_page
 
 TEXT_EXTS = {".txt", ".md", ".log"}
 DOC_EXTS = {".docx"}
 PDF_EXTS = {".pdf"}
 TABULAR_EXTS = {".csv", ".tsv", ".xlsx"}
 IMG_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff"}
+# Formats extracted in bounded segments, so any file size fits in flat memory
+STREAM_EXTS = TEXT_EXTS | TABULAR_EXTS
+# A half-full segment ends after the next line whose CRC is 0 mod this (blank lines always are)
+_CUT_MODULUS = 16
 
-def extract_text(path: Path) -> Iterable[tuple[str, int]]:
+def _segments(lines: Iterable[tuple[int, str]], header: str = "") -> Iterator[tuple[str, int]]:
+    """
+    Group numbered lines into segments of at most ~`EXTRACT_SEGMENT_CHARS`
+    characters, yielded with the number of their first line. `header` (e.g. a
+    table's first row) is repeated at the top of every segment.
+
+    Boundaries are chosen by line content rather than by position, so editing a
+    line only moves the boundaries next to it, and segments are numbered by
+    line: the chunk ids of the rest of the file stay put.
+    """
+    limit = settings.extract_segment_chars
+    buf, size, first = [], 0, None
+    for number, line in lines:
+        if first is None:
+            first = number
+        buf.append(line)
+        size += len(line) + 1
+        if size >= limit or (size >= limit // 2 and zlib.crc32(line.encode()) % _CUT_MODULUS == 0):
+            yield "\n".join([header] + buf if header else buf), first
+            buf, size, first = [], 0, None
+    if buf:
+        yield "\n".join([header] + buf if header else buf), first
+
+def _text_lines(path: Path) -> Iterator[str]:
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        # readline(limit) so a single huge line can't be loaded whole
+        for line in iter(lambda: f.readline(settings.extract_segment_chars), ""):
+            yield line.rstrip("\r\n")
+
+def _row_text(row) -> str:
+    cells = ["" if v is None else str(v).strip() for v in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return " | ".join(cells)
+
+def _table_segments(rows: Iterable[tuple[int, tuple]]) -> Iterator[tuple[str, int]]:
+    rows = ((i, t) for i, t in ((i, _row_text(r)) for i, r in rows) if t)
+    header_number, header = next(rows, (None, ""))
+    if not header:
+        return
+    empty = True
+    for segment in _segments(rows, header):
+        empty = False
+        yield segment
+    if empty:
+        yield header, header_number
+
+def _csv_segments(path: Path, delimiter: str) -> Iterator[tuple[str, int]]:
+    with path.open(newline="", encoding="utf-8", errors="ignore") as f:
+        yield from _table_segments(enumerate(csv.reader(f, delimiter=delimiter), start=1))
+
+def _xlsx_segments(path: Path) -> Iterator[tuple[str, int]]:
+    # read_only streams rows from the sheet XML instead of building the workbook in memory
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Rows are numbered across the workbook so two sheets never share a segment number
+        numbers = itertools.count(1)
+        for ws in wb.worksheets:
+            for segment, number in _table_segments(zip(numbers, ws.iter_rows(values_only=True))):
+                yield f"{ws.title}\n{segment}", number
+    finally:
+        wb.close()
+
+def pdf_page_count(path: Path) -> int:
+    return len(PdfReader(str(path)).pages)
+
+def _pdf_pages(path: Path, first: int, last: Optional[int]) -> Iterator[tuple[str, int]]:
+    """Text layer of pages [first, last); pages that are only a scanned image are rasterized and OCR'd."""
+    reader = PdfReader(str(path))
+    pdf = None
+    ocr_pages, ocr_seconds = 0, 0.0
+    try:
+        for i in range(first, min(last or len(reader.pages), len(reader.pages))):
+            page = reader.pages[i]
+            text = page.extract_text() or ""
+            if needs_ocr(page, text):
+                t0 = time.perf_counter()
+                pdf = pdf or pdfium.PdfDocument(str(path))
+                text = ocr_image(render_pdf_page(pdf, i))
+                ocr_pages += 1
+                ocr_seconds += time.perf_counter() - t0
+            yield text, i + 1
+    finally:
+        if pdf is not None:
+            pdf.close()
+        log_throughput(path, ocr_pages, ocr_seconds)
+
+def extract_text(path: Path, first: int = 0, last: Optional[int] = None) -> Iterable[tuple[str, int]]:
+    """
+    Yield (text, page) pairs. PDFs yield one pair per page (only pages
+    [first, last) when given); logs, CSV/TSV and XLSX yield segments of at most
+    ~`EXTRACT_SEGMENT_CHARS` characters (table segments repeat the header row)
+    so large files are never held whole, with the line or record number the
+    segment starts at as its page; images yield one pair per frame.
+    """
     ext = path.suffix.lower()
     if ext in TEXT_EXTS:
-        yield path.read_text(encoding="utf-8", errors="ignore"), 1
+        yield from _segments(enumerate(_text_lines(path), start=1))
     elif ext in DOC_EXTS:
         text = docx2txt.process(str(path)) or ""
         yield text, 1
     elif ext in PDF_EXTS:
-        reader = PdfReader(str(path))
-        for i, page in enumerate(reader.pages, start=1):
-            yield page.extract_text() or "", i
+        yield from _pdf_pages(path, first, last)
     elif ext in TABULAR_EXTS:
         if ext == ".xlsx":
-            xls = pd.read_excel(path, sheet_name=None, header=None)
-            text = "\\n\\n".join([df.to_string(index=False, header=False) for df in xls.values()])
+            segments = _xlsx_segments(path)
         else:
-            df = pd.read_csv(path, header=None)
-            text = df.to_string(index=False, header=False)
-        yield text, 1
+            segments = _csv_segments(path, "\t" if ext == ".tsv" else ",")
+        yield from segments
     elif ext in IMG_EXTS:
+        produced = False
         try:
-            img = Image.open(path)
-            text = pytesseract.image_to_string(img)
-            yield text, 1
-        except Exception:
-            yield "", 1
+            for frame in ocr_image_file(path):
+                produced = True
+                yield frame
+        except Exception as e:
+            print(f"[OCR] Failed on {path.name}: {e}")
+            # Frames already OCR'd are kept; the placeholder only stands in for a file with none
+            if not produced:
+                yield "", 1
     else:
         yield "", 1
@@ -0,0 +1,114 @@
+
+import json
+import shutil
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import text
+from db import metadata_session
+from settings import settings
+
+class JobManager:
+    """
+    Runs ingestion jobs on a small background pool and tracks them in `ingest_jobs`.
+
+    At most `INGEST_MAX_CONCURRENT_JOBS` jobs run at once (others wait as
+    `queued`) so large imports can't starve /chat of CPU and DB connections.
+    Jobs left `queued`/`running` by a previous process are marked failed on startup.
+    """
+
+    def __init__(self, max_workers: int | None = None):
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ingest_max_concurrent_jobs, thread_name_prefix="ingest-job"
+        )
+        self._cancel: Dict[str, threading.Event] = {}
+
+    def recover(self):
+        with metadata_session() as s:
+            n = s.execute(text(
+                """
+                UPDATE ingest_jobs
+                SET status = 'failed', finished_at = now(), error = 'Interrupted by server restart'
+                WHERE status IN ('queued', 'running')
+                """
+            )).rowcount
+            s.commit()
+        if n:
+            print(f"[JOBS] Marked {n} interrupted ingestion job(s) as failed")
+
+    def submit(self, kind: str, target: str, fn: Callable[[Callable[[dict], None], threading.Event], dict],
+               cleanup_dir: Optional[str] = None) -> str:
+        """
+        Queue `fn(progress, cancel)` as a job and return its id immediately.
+        `cleanup_dir` is removed once the job ends, whatever its outcome.
+        """
+        job_id = uuid.uuid4().hex
+        with metadata_session() as s:
+            s.execute(text(
+                "INSERT INTO ingest_jobs (id, kind, target, status) VALUES (:id, :kind, :target, 'queued')"
+            ), {"id": job_id, "kind": kind, "target": target})
+            s.commit()
+        cancel = threading.Event()
+        self._cancel[job_id] = cancel
+        self.pool.submit(self._run, job_id, fn, cancel, cleanup_dir)
+        return job_id
+
+    def _update(self, job_id: str, *raw: str, **fields):
+        """Set `fields` (bound parameters) and `raw` SQL assignments on one job row."""
+        sets = ", ".join([f"{k} = :{k}" for k in fields] + list(raw))
+        with metadata_session() as s:
+            s.execute(text(f"UPDATE ingest_jobs SET {sets} WHERE id = :id"), {"id": job_id, **fields})
+            s.commit()
+
+    def _run(self, job_id: str, fn, cancel: threading.Event, cleanup_dir: Optional[str]):
+        try:
+            if cancel.is_set():
+                self._update(job_id, status="cancelled")
+                return
+            self._update(job_id, "started_at = now()", status="running")
+
+            def progress(snapshot: dict):
+                # Untyped literal: Postgres coerces it to the JSONB column, SQLite stores the text
+                self._update(job_id, progress=json.dumps(snapshot, default=str))
+
+            result = fn(progress, cancel) or {}
+            status = "cancelled" if result.get("cancelled") or cancel.is_set() else "succeeded"
+            self._update(job_id, status=status)
+        except Exception as e:
+            print(f"[JOBS] Job {job_id} failed:\n{traceback.format_exc()}")
+            self._update(job_id, status="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            self._update(job_id, "finished_at = now()")
+            self._cancel.pop(job_id, None)
+            if cleanup_dir:
+                shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; returns False if the job is unknown or already finished."""
+        event = self._cancel.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with metadata_session() as s:
+            row = s.execute(text("SELECT * FROM ingest_jobs WHERE id = :id"), {"id": job_id}).mappings().first()
+        return self._row(row) if row else None
+
+    def list(self, limit: int = 50, kind: Optional[str] = None) -> List[Dict]:
+        where = "WHERE kind = :kind " if kind else ""
+        with metadata_session() as s:
+            rows = s.execute(text(
+                f"SELECT * FROM ingest_jobs {where}ORDER BY created_at DESC LIMIT :limit"
+            ), {"limit": limit, "kind": kind}).mappings().all()
+        return [self._row(r) for r in rows]
+
+    @staticmethod
+    def _row(row) -> Dict:
+        job = dict(row)
+        if isinstance(job.get("progress"), str):  # local store keeps JSON as text
+            job["progress"] = json.loads(job["progress"])
+        return job
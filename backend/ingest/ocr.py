@@ -0,0 +1,134 @@
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence
+import pypdfium2 as pdfium
+import pytesseract
+from settings import settings
+
+# Extraction already runs one process per core; keep tesseract single-threaded inside each
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Bump when preprocessing changes so cached text from the old pipeline is not reused
+OCR_VERSION = "1"
+
+# Per-process OCR work (cache misses only), collected by the ingestion pipeline via take_stats()
+_stats = {"pages": 0, "seconds": 0.0}
+
+def take_stats() -> tuple[int, float]:
+    """Return and reset (pages OCR'd, seconds spent) for this process."""
+    pages, seconds = _stats["pages"], _stats["seconds"]
+    _stats["pages"], _stats["seconds"] = 0, 0.0
+    return pages, seconds
+
+def _deskew_angle(gray: Image.Image) -> float:
+    """
+    Estimate page skew (degrees) by projection profile on a small thumbnail:
+    text lines are horizontal when the row-sum variance of dark pixels peaks.
+    """
+    thumb = gray.copy()
+    thumb.thumbnail((800, 800))
+    ink = Image.eval(thumb, lambda p: 255 if p < 128 else 0)
+    best, best_score = 0.0, -1.0
+    for angle in np.arange(-5.0, 5.01, 0.5):
+        rows = np.asarray(ink.rotate(float(angle), fillcolor=0), dtype=np.float32).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best, best_score = float(angle), score
+    return best
+
+def preprocess(img: Image.Image) -> Image.Image:
+    """Grayscale, downscale to `OCR_MAX_SIDE` pixels and straighten small rotations."""
+    gray = ImageOps.grayscale(ImageOps.exif_transpose(img))
+    if max(gray.size) > settings.ocr_max_side:
+        gray.thumbnail((settings.ocr_max_side, settings.ocr_max_side), Image.LANCZOS)
+    angle = _deskew_angle(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return gray
+
+def _cache_path(img: Image.Image) -> Path:
+    h = hashlib.sha256()
+    h.update(f"{OCR_VERSION}|{settings.ocr_lang}|{img.mode}|{img.size}|".encode())
+    h.update(img.tobytes())
+    key = h.hexdigest()
+    return Path(settings.ocr_cache_dir) / key[:2] / f"{key}.txt"
+
+def ocr_image(img: Image.Image) -> str:
+    """
+    OCR one image. Results are cached on disk (`OCR_CACHE_DIR`) by a hash of
+    the image pixels, so re-ingesting the same drawing or scan is free.
+    """
+    path = _cache_path(img) if settings.ocr_cache_enabled else None
+    if path is not None and path.exists():
+        return path.read_text(encoding="utf-8")
+    t0 = time.perf_counter()
+    text = pytesseract.image_to_string(preprocess(img), lang=settings.ocr_lang)
+    _stats["pages"] += 1
+    _stats["seconds"] += time.perf_counter() - t0
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[OCR] Cache write failed: {e}")
+    return text
+
+def _page_resources(page):
+    """The page's /Resources, or the nearest one inherited from the page tree."""
+    node, depth = page, 0
+    while node is not None and depth < 32:
+        if "/Resources" in node:
+            return node["/Resources"].get_object()
+        parent = node.get("/Parent")
+        node, depth = parent.get_object() if parent is not None else None, depth + 1
+    return None
+
+def _draws_images(resources, depth: int = 0) -> bool:
+    """True when `resources` holds an image XObject, directly or inside a form XObject."""
+    xobjects = resources.get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return False
+    xobjects = xobjects.get_object()
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            return True
+        # Forms are often vector art or stamps; they only count when they wrap an image (some scanners do)
+        if subtype == "/Form" and depth < 3 and "/Resources" in xobject:
+            if _draws_images(xobject["/Resources"].get_object(), depth + 1):
+                return True
+    return False
+
+def needs_ocr(page, text: str) -> bool:
+    """A PDF page is treated as scanned when it has (almost) no text layer but draws images."""
+    if not settings.ocr_enabled or len(text.strip()) >= settings.ocr_min_chars:
+        return False
+    try:
+        return _draws_images(_page_resources(page))
+    except (KeyError, TypeError, AttributeError):
+        return False
+
+def render_pdf_page(pdf: pdfium.PdfDocument, index: int) -> Image.Image:
+    """Rasterize page `index` (0-based) of an open document at `OCR_DPI`."""
+    return pdf[index].render(scale=settings.ocr_dpi / 72).to_pil()
+
+def ocr_image_file(path: Path) -> Iterator[tuple[str, int]]:
+    """OCR an image file, one page per frame (multi-page TIFFs)."""
+    t0 = time.perf_counter()
+    n = 0
+    with Image.open(path) as img:
+        for n, frame in enumerate(ImageSequence.Iterator(img), start=1):
+            yield ocr_image(frame.copy()), n
+    log_throughput(path, n, time.perf_counter() - t0)
+
+def log_throughput(path: Path, pages: int, seconds: float):
+    if pages:
+        print(f"[OCR] {path.name}: {pages} page(s) in {seconds:.1f}s ({pages / seconds if seconds else 0:.2f} pages/s on one core)")
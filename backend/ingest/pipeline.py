@@ -1,36 +1,593 @@
 
+import csv
+import io
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Optional
+from psycopg2.extras import execute_values
 from sqlalchemy import text
-from db import SessionLocal
+from db import active_embedding_model, engine, ensure_vector_index, metadata_session, vector_literal
+import metrics
 from rag.embedder import Embedder
-from .extractors import extract_text
-from .utils import split_into_chunks
-
-def ingest_path(root: str, source_label: Optional[str] = None):
-    root_path = Path(root)
-    emb = Embedder()
-    with SessionLocal() as s:
-        for file in root_path.rglob("*"):
-            if not file.is_file():
+from rag.local_store import local_store
+from rag.registry import registry
+from settings import settings
+from .extractors import PDF_EXTS, STREAM_EXTS, extract_text, pdf_page_count
+from .ocr import take_stats as take_ocr_stats
+from .utils import CHUNKER_VERSION, split_into_chunks, text_sha256, file_sha256
+
+_DONE = object()
+# Chunk hashes remembered per file for boilerplate dedupe
+DEDUPE_WINDOW = 4096
+
+@dataclass
+class FileWork:
+    """One file travelling through the chunk -> embed -> write stages."""
+    uri: str
+    source: str
+    size: int
+    mtime: float
+    content_hash: str
+    site: Optional[str] = None
+    area: Optional[str] = None
+    doc_type: Optional[str] = None
+    # (row_id or None, page, chunk_id, content, content_hash)
+    pending: list = field(default_factory=list)
+    vectors: list = field(default_factory=list)
+    stale_ids: list = field(default_factory=list)
+    # Intermediate slice of a streamed file: written, but the manifest waits for the last one
+    partial: bool = False
+
+class StageStats:
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.busy += seconds
+        metrics.INGEST_STAGE_ITEMS.labels(self.name).inc(items)
+        metrics.INGEST_STAGE_SECONDS.labels(self.name).inc(seconds)
+
+    def report(self) -> str:
+        rate = self.items / self.busy if self.busy else 0.0
+        return f"{self.name}: {self.items} {self.unit} in {self.busy:.1f}s busy ({rate:.1f} {self.unit}/s)"
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _load_manifest(s, root_path: Path, source: str) -> dict:
+    rows = s.execute(text(
+        """
+        SELECT uri, size, mtime, content_hash, embed_model, site, area
+        FROM ingest_manifest
+        WHERE source = :source AND uri LIKE :prefix ESCAPE '\\'
+        """
+    ), {"source": source, "prefix": _like_escape(str(root_path) + os.sep) + "%"}).mappings().all()
+    return {r["uri"]: dict(r) for r in rows}
+
+def _delete_file(s, uri: str):
+    if settings.vector_store == "local":
+        local_store().delete_file(uri)
+        return
+    s.execute(text("DELETE FROM documents WHERE uri = :uri"), {"uri": uri})
+    s.execute(text("DELETE FROM ingest_manifest WHERE uri = :uri"), {"uri": uri})
+
+def _extract_pages(path: str, first: int = 0, last: Optional[int] = None) -> tuple[list[tuple[str, int]], int, float]:
+    """
+    Process-pool entry point: run the CPU-heavy extractors (text layer, OCR) for
+    one file or PDF page range. Returns (pages, OCR'd pages, OCR seconds).
+    """
+    take_ocr_stats()  # drop anything left over from a failed call in this worker
+    pages = list(extract_text(Path(path), first, last))
+    return (pages, *take_ocr_stats())
+
+def _record_extraction(results: list) -> list[tuple[str, int]]:
+    """Merge `_extract_pages` results (one per page range) and count their OCR work."""
+    for _, ocr_pages, ocr_seconds in results:
+        metrics.INGEST_OCR_PAGES.inc(ocr_pages)
+        metrics.INGEST_OCR_SECONDS.inc(ocr_seconds)
+    return [page for pages, _, _ in results for page in pages]
+
+@dataclass
+class _Extraction:
+    """A file being extracted in the pool, possibly as several PDF page-range tasks."""
+    work: FileWork
+    reembed_all: bool
+    started: float
+    parts: list
+    failed: bool = False
+
+def _page_ranges(path: Path) -> list[tuple[int, Optional[int]]]:
+    """Split long PDFs into `INGEST_PDF_PAGES_PER_TASK` page ranges so one scanned book uses every worker."""
+    if path.suffix.lower() not in PDF_EXTS:
+        return [(0, None)]
+    try:
+        n = pdf_page_count(path)
+    except Exception:
+        return [(0, None)]  # let the worker report the error
+    step = settings.ingest_pdf_pages_per_task
+    return [(i, i + step) for i in range(0, n, step)] or [(0, None)]
+
+def _plan_chunks(s, work: FileWork, pages: Iterable[tuple[str, int]], reembed_all: bool,
+                 emit: Optional[Callable[[FileWork], None]] = None):
+    """
+    Diff the chunks of one file against what is stored in `documents`.
+    Chunks whose content hash is unchanged keep their stored embedding; new or
+    changed chunks go to `work.pending` and chunks that disappeared to `work.stale_ids`.
+
+    With `emit`, pending chunks are handed off as partial `FileWork`s every
+    `INGEST_EMBED_BATCH` chunks, so a streamed file never accumulates in memory.
+    """
+    name = Path(work.uri).name
+    existing = {}
+    for r in s.execute(
+        text("SELECT id, chunk_id, content_hash FROM documents WHERE uri = :uri ORDER BY id"),
+        {"uri": work.uri},
+    ).mappings().all():
+        if r["chunk_id"] in existing:
+            # Duplicate left behind by older, non-incremental runs
+            work.stale_ids.append(r["id"])
+        else:
+            existing[r["chunk_id"]] = (r["id"], r["content_hash"])
+    seen = set()
+    # Recently seen chunk hashes (LRU): bounded, so a streamed file's dedupe never grows with its size
+    hashes: "OrderedDict[str, None]" = OrderedDict()
+    for page_text, page_num in pages:
+        metrics.INGEST_PAGES.inc()
+        for idx, chunk in enumerate(split_into_chunks(page_text, settings.chunk_tokens, settings.chunk_overlap_tokens)):
+            h = text_sha256(chunk)
+            if h in hashes:
+                # Repeated boilerplate (headers, footers, legends) is indexed once per file
+                hashes.move_to_end(h)
+                continue
+            hashes[h] = None
+            if len(hashes) > DEDUPE_WINDOW:
+                hashes.popitem(last=False)
+            chunk_id = f"{name}#p{page_num}#c{idx}"
+            prev = existing.get(chunk_id)
+            if prev:
+                # Only stored ids matter for finding stale rows: a new file's plan stays flat
+                seen.add(chunk_id)
+            if prev and prev[1] == h and not reembed_all:
+                continue
+            work.pending.append((prev[0] if prev else None, page_num, chunk_id, chunk, h))
+            if emit is not None and len(work.pending) >= settings.ingest_embed_batch:
+                emit(replace(work, pending=work.pending, stale_ids=[], partial=True))
+                work.pending = []
+    work.stale_ids += [row_id for chunk_id, (row_id, _) in existing.items() if chunk_id not in seen]
+
+def _flush_writes(conn, batch: list[FileWork], embed_model: str, vtype: str):
+    """
+    Write a batch of files in one transaction: new chunks are streamed with
+    COPY, changed chunks and manifest rows go through multi-row execute_values.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    updates, stale, manifest, metadata = [], [], [], []
+    for work in batch:
+        for (row_id, page_num, chunk_id, chunk, h), vec in zip(work.pending, work.vectors):
+            chunk = chunk.replace("\x00", "")  # Postgres text cannot hold NUL
+            if row_id is None:
+                writer.writerow([work.source, work.uri, page_num, chunk_id, chunk, h, vector_literal(vec),
+                                 work.site, work.area, work.doc_type])
+            else:
+                updates.append((row_id, work.source, page_num, chunk, h, vector_literal(vec)))
+        stale += work.stale_ids
+        if not work.partial:
+            manifest.append((work.uri, work.source, work.size, work.mtime, work.content_hash, embed_model,
+                             work.site, work.area))
+            metadata.append((work.uri, work.site, work.area, work.doc_type))
+    with conn.cursor() as cur:
+        if buf.tell():
+            buf.seek(0)
+            cur.copy_expert(
+                "COPY documents (source, uri, page, chunk_id, content, content_hash, embedding, site, area, doc_type) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        if updates:
+            execute_values(cur, """
+                UPDATE documents AS d
+                SET source = v.source, page = v.page, content = v.content,
+                    content_hash = v.content_hash, embedding = v.embedding, ingested_at = now()
+                FROM (VALUES %s) AS v(id, source, page, content, content_hash, embedding)
+                WHERE d.id = v.id
+                """, updates, template=f"(%s, %s, %s, %s, %s, %s::{vtype})")
+        if stale:
+            cur.execute("DELETE FROM documents WHERE id = ANY(%s)", (stale,))
+        if metadata:
+            # Files whose site/area changed (or were moved to a new one) without new content
+            execute_values(cur, """
+                UPDATE documents AS d
+                SET site = v.site, area = v.area, doc_type = v.doc_type
+                FROM (VALUES %s) AS v(uri, site, area, doc_type)
+                WHERE d.uri = v.uri AND (d.site IS DISTINCT FROM v.site OR d.area IS DISTINCT FROM v.area
+                                         OR d.doc_type IS DISTINCT FROM v.doc_type)
+                """, metadata, template="(%s, %s::varchar, %s::varchar, %s::varchar)")
+        if manifest:
+            execute_values(cur, """
+                INSERT INTO ingest_manifest (uri, source, size, mtime, content_hash, embed_model, site, area)
+                VALUES %s
+                ON CONFLICT (uri) DO UPDATE SET
+                  source = EXCLUDED.source, size = EXCLUDED.size, mtime = EXCLUDED.mtime,
+                  content_hash = EXCLUDED.content_hash, embed_model = EXCLUDED.embed_model,
+                  site = EXCLUDED.site, area = EXCLUDED.area, updated_at = now()
+                """, manifest)
+    conn.commit()
+
+def _embed_stage(emb: Embedder, in_q: queue.Queue, out_q: queue.Queue, stats: StageStats, errors: list,
+                 abort: threading.Event):
+    """
+    Pack pending chunks from many files into batches of `ingest_embed_batch`.
+    A failure sets `abort` so the run stops extracting files nobody will embed.
+    """
+    batch: list[FileWork] = []
+    size = 0
+    finished = False
+
+    def flush():
+        nonlocal batch, size
+        texts = [p[3] for w in batch for p in w.pending]
+        t0 = time.perf_counter()
+        vectors = emb.embed(texts) if texts else []
+        stats.add(len(texts), time.perf_counter() - t0)
+        pos = 0
+        for w in batch:
+            w.vectors = vectors[pos:pos + len(w.pending)]
+            pos += len(w.pending)
+            out_q.put(w)
+        batch, size = [], 0
+
+    try:
+        while True:
+            try:
+                item = in_q.get(timeout=0.5) if batch else in_q.get()
+            except queue.Empty:
+                # Nothing new arriving; don't hold a partial batch hostage.
+                flush()
                 continue
-            for page_text, page_num in extract_text(file):
-                chunks = split_into_chunks(page_text, 1500, 200)
-                if not chunks:
+            if item is _DONE:
+                finished = True
+                break
+            batch.append(item)
+            size += len(item.pending)
+            if size >= settings.ingest_embed_batch:
+                flush()
+        if batch:
+            flush()
+    except Exception as e:
+        errors.append(("embed", repr(e)))
+        abort.set()
+        # Keep draining so upstream never blocks on a full queue.
+        while not finished and in_q.get() is not _DONE:
+            pass
+    finally:
+        out_q.put(_DONE)
+
+def _write_stage(embed_model: str, in_q: queue.Queue, stats: StageStats, errors: list, abort: threading.Event):
+    """
+    Accumulate files until `ingest_write_batch` rows, then write and commit them together.
+    A failed batch is reported per file; losing the connection itself sets `abort`.
+    """
+    conn = vtype = None
+    batch: list[FileWork] = []
+    rows = 0
+    finished = False
+
+    def flush():
+        nonlocal batch, rows
+        t0 = time.perf_counter()
+        try:
+            if conn is None:
+                local_store().write(batch, embed_model)
+            else:
+                _flush_writes(conn, batch, embed_model, vtype)
+            stats.add(rows, time.perf_counter() - t0)
+        except Exception as e:
+            errors.extend((w.uri, repr(e)) for w in batch)
+            if conn is not None:
+                conn.rollback()  # raises when the connection is gone, which ends the stage
+        batch, rows = [], 0
+
+    try:
+        if settings.vector_store != "local":
+            conn = engine.raw_connection()
+            with conn.cursor() as cur:
+                cur.execute("SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                            "WHERE attrelid = 'documents'::regclass AND attname = 'embedding'")
+                vtype = cur.fetchone()[0]
+            conn.commit()
+        while True:
+            work = in_q.get()
+            if work is _DONE:
+                finished = True
+                break
+            batch.append(work)
+            rows += len(work.pending)
+            if rows >= settings.ingest_write_batch:
+                flush()
+        if batch:
+            flush()
+    except Exception as e:
+        errors.append(("write", repr(e)))
+        abort.set()
+        # Keep draining so upstream never blocks on a full queue.
+        while not finished and in_q.get() is not _DONE:
+            pass
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+def ingest_path(
+    root: str,
+    source_label: Optional[str] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    site: Optional[str] = None,
+    area: Optional[str] = None,
+    files: Optional[Iterable[Optional[Path]]] = None,
+):
+    """
+    Incrementally ingest every file under `root`, or the files yielded by
+    `files` (all under `root`) as they arrive, e.g. an `UploadFeed` of an
+    upload still in progress. Such an iterable may yield None while it waits;
+    finished extractions are handed on meanwhile.
+
+    Every chunk is tagged with `site`/`area` (or, when not given, the folder
+    levels named by INGEST_PATH_METADATA, e.g. "site/area" for
+    root/<site>/<area>/...), its file type and ingestion time, so /chat can
+    filter by them.
+
+    A manifest (path, size, mtime, content hash, embedding model) decides per file:
+    unchanged files are skipped without being read, changed files only re-embed
+    their changed chunks, and files that vanished from `root` have their rows removed.
+
+    Work flows through a staged pipeline: extraction runs in a process pool
+    (`INGEST_EXTRACT_WORKERS`), chunking/diffing on this thread, embedding and
+    DB writes on their own threads. The stages are joined by bounded queues
+    (`INGEST_QUEUE_SIZE`) so a slow stage throttles the ones before it and memory
+    stays flat. Rows are bulk-loaded (COPY / execute_values) and committed every
+    `INGEST_WRITE_BATCH` rows so an interrupted run keeps its progress.
+
+    `progress`, if given, is called about once a second with a snapshot of the
+    counters; setting `cancel` stops the run after the current file (vanished
+    files are only deleted when the whole tree was walked).
+
+    Chunks are embedded with the active embedding model, which an embedding
+    migration (ingest/reembed.py) can't replace until the run is over.
+    """
+    with active_embedding_model() as state:
+        if state is not None and state["model"]:
+            # A migration may have cut over in another process since this one loaded its embedder
+            registry.set_embedding_model(state["model"])
+        return _ingest_path(root, source_label, progress, cancel, site, area, files)
+
+def _ingest_path(
+    root: str,
+    source_label: Optional[str],
+    progress: Optional[Callable[[dict], None]],
+    cancel: Optional[threading.Event],
+    site: Optional[str],
+    area: Optional[str],
+    files: Optional[Iterable[Optional[Path]]],
+):
+    root_path = Path(root).resolve()
+    source = source_label or "local"
+    path_levels = [level for level in settings.ingest_path_metadata.split("/") if level]
+
+    def file_metadata(file: Path) -> dict:
+        meta = dict(zip(path_levels, file.relative_to(root_path).parts[:-1]))
+        return {
+            "site": site or meta.get("site"),
+            "area": area or meta.get("area"),
+            "doc_type": file.suffix.lower().lstrip(".") or None,
+        }
+    emb = registry.embedder()  # shared with /chat and other jobs; loaded once per process
+    stats = {"files_seen": 0, "skipped": 0, "updated": 0, "deleted": 0, "chunks_embedded": 0,
+             "errors": [], "cancelled": False}
+    extract_stats = StageStats("extract", "files")
+    chunk_stats = StageStats("chunk", "files")
+    embed_stats = StageStats("embed", "chunks")
+    write_stats = StageStats("write", "rows")
+
+    # The manifest records both the embedding model and the chunker settings, so
+    # changing either reprocesses files (chunks whose text is unchanged keep their vectors)
+    index_id = f"{emb.model_name};chunks={settings.chunk_tokens}/{settings.chunk_overlap_tokens}/{CHUNKER_VERSION}"
+
+    embed_q: queue.Queue = queue.Queue(maxsize=settings.ingest_queue_size)
+    write_q: queue.Queue = queue.Queue(maxsize=settings.ingest_queue_size)
+    abort = threading.Event()  # set by the embed/write stage when it can't go on
+    embedder_t = threading.Thread(
+        target=_embed_stage, args=(emb, embed_q, write_q, embed_stats, stats["errors"], abort), daemon=True
+    )
+    writer_t = threading.Thread(
+        target=_write_stage, args=(index_id, write_q, write_stats, stats["errors"], abort), daemon=True
+    )
+    embedder_t.start()
+    writer_t.start()
+
+    workers = settings.ingest_extract_workers
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    max_in_flight = max(1, workers) * 2
+    in_flight = {}
+    started = time.perf_counter()
+    last_report = started
+
+    def report(force: bool = False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if progress is None or (not force and now - last_report < 1.0):
+            return
+        last_report = now
+        elapsed = now - started
+        progress({
+            **{k: v for k, v in stats.items() if k != "errors"},
+            "files_extracted": extract_stats.items,
+            "chunks_done": embed_stats.items,
+            "rows_written": write_stats.items,
+            "elapsed": elapsed,
+            "chunks_per_sec": embed_stats.items / elapsed if elapsed else 0.0,
+            "errors": [{"uri": u, "error": e} for u, e in stats["errors"]],
+        })
+
+    def send(work: FileWork):
+        if abort.is_set():
+            return  # the run is stopping; nothing would embed it
+        stats["chunks_embedded"] += len(work.pending)
+        embed_q.put(work)  # blocks when the embedder falls behind
+
+    def send_part(work: FileWork):
+        if abort.is_set():
+            raise RuntimeError("Ingestion aborted")  # stop reading a streamed file mid-way
+        send(work)
+
+    def handle(work: FileWork, pages: Iterable, reembed_all: bool, streamed: bool = False):
+        t0 = time.perf_counter()
+        try:
+            _plan_chunks(s, work, pages, reembed_all, emit=send_part if streamed else None)
+        finally:
+            s.rollback()  # end the read transaction; writes happen on the writer thread
+        chunk_stats.add(1, time.perf_counter() - t0)
+        stats["updated"] += 1
+        metrics.INGEST_FILES.labels("updated").inc()
+        metrics.INGEST_BYTES.inc(work.size)
+        send(work)
+
+    def failed(uri: str, e: Exception):
+        stats["errors"].append((uri, repr(e)))
+        metrics.INGEST_FILES.labels("error").inc()
+
+    def drain(block_until: int, timeout: Optional[float] = None):
+        while len(in_flight) > block_until:
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                return
+            for fut in done:
+                job, part = in_flight.pop(fut)
+                if job.failed:
+                    continue
+                try:
+                    job.parts[part] = fut.result()
+                except Exception as e:
+                    job.failed = True
+                    failed(job.work.uri, e)
+                    continue
+                if all(p is not None for p in job.parts):
+                    extract_stats.add(1, time.perf_counter() - job.started)
+                    handle(job.work, _record_extraction(job.parts), job.reembed_all)
+
+    try:
+        with metadata_session() as s:
+            manifest = _load_manifest(s, root_path, source)
+            s.rollback()
+            seen = set()
+            for file in root_path.rglob("*") if files is None else files:
+                if cancel is not None and cancel.is_set():
+                    stats["cancelled"] = True
+                    break
+                if abort.is_set():
+                    break
+                report()
+                if file is None:
+                    drain(0, timeout=0)
                     continue
-                vectors = emb.embed(chunks)
-                for idx, (chunk, vec) in enumerate(zip(chunks, vectors)):
-                    s.execute(text(
-                        """
-                        INSERT INTO documents (source, uri, page, chunk_id, content, embedding)
-                        VALUES (:source, :uri, :page, :chunk_id, :content, :embedding)
-                        """
-                    ), {
-                        "source": source_label or "local",
-                        "uri": str(file),
-                        "page": page_num,
-                        "chunk_id": f"{file.name}#p{page_num}#c{idx}",
-                        "content": chunk,
-                        "embedding": vec,
-                    })
-        s.commit()
+                if not file.is_file():
+                    continue
+                uri = str(file)
+                seen.add(uri)
+                stats["files_seen"] += 1
+                st = file.stat()
+                entry = manifest.get(uri)
+                current = entry is not None and entry["embed_model"] == index_id
+                same_model = entry is not None and entry["embed_model"].split(";")[0] == emb.model_name
+                meta = file_metadata(file)
+                same_meta = entry is not None and (entry["site"], entry["area"]) == (meta["site"], meta["area"])
+                if current and same_meta and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                    stats["skipped"] += 1
+                    metrics.INGEST_FILES.labels("skipped").inc()
+                    continue
+                content_hash = file_sha256(file)
+                work = FileWork(uri, source, st.st_size, st.st_mtime, content_hash, **meta)
+                if current and entry["content_hash"] == content_hash:
+                    # Touched or re-tagged but not modified: the writer refreshes stat info and metadata only.
+                    stats["skipped"] += 1
+                    metrics.INGEST_FILES.labels("skipped").inc()
+                    send(work)
+                    continue
+                if file.suffix.lower() in STREAM_EXTS and st.st_size >= settings.ingest_stream_min_bytes:
+                    # Large logs/tables: extract lazily on this thread, handing chunks
+                    # downstream as they are produced instead of materializing the file
+                    t0 = time.perf_counter()
+                    try:
+                        handle(work, extract_text(file), not same_model, streamed=True)
+                    except Exception as e:
+                        failed(uri, e)
+                        continue
+                    extract_stats.add(1, time.perf_counter() - t0)
+                elif pool is None:
+                    t0 = time.perf_counter()
+                    try:
+                        pages = _record_extraction([_extract_pages(uri)])
+                    except Exception as e:
+                        failed(uri, e)
+                        continue
+                    extract_stats.add(1, time.perf_counter() - t0)
+                    handle(work, pages, not same_model)
+                else:
+                    ranges = _page_ranges(file)
+                    drain(max(0, max_in_flight - len(ranges)))
+                    job = _Extraction(work, not same_model, time.perf_counter(), [None] * len(ranges))
+                    for part, (first, last) in enumerate(ranges):
+                        in_flight[pool.submit(_extract_pages, uri, first, last)] = (job, part)
+            if not stats["cancelled"] and not abort.is_set():
+                drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=not (stats["cancelled"] or abort.is_set()), cancel_futures=True)
+        embed_q.put(_DONE)
+        embedder_t.join()
+        writer_t.join()
+
+    if abort.is_set():
+        report(force=True)
+        stage, error = next((u, e) for u, e in stats["errors"] if u in ("embed", "write"))
+        raise RuntimeError(f"Ingestion stopped: the {stage} stage failed with {error}")
+
+    if not stats["cancelled"]:
+        with metadata_session() as s:
+            for uri in manifest.keys() - seen:
+                _delete_file(s, uri)
+                stats["deleted"] += 1
+                metrics.INGEST_FILES.labels("deleted").inc()
+            s.commit()
+    if stats["updated"] or stats["deleted"]:
+        # Build the ANN index after the bulk load (no-op when it is already adequate)
+        ensure_vector_index()
+
+    elapsed = time.perf_counter() - started
+    print(f"[INGEST] {root_path}: {stats['updated']} updated, {stats['skipped']} skipped, "
+          f"{stats['deleted']} deleted, {stats['chunks_embedded']} chunks embedded, "
+          f"{len(stats['errors'])} errors in {elapsed:.1f}s" + (" (cancelled)" if stats["cancelled"] else ""))
+    for st_ in (extract_stats, chunk_stats, embed_stats, write_stats):
+        print(f"[INGEST]   {st_.report()}")
+    if emb.cache is not None:
+        print(f"[INGEST]   embedding cache: {emb.cache.stats()}")
+    for uri, err in stats["errors"]:
+        print(f"[INGEST]   error {uri}: {err}")
+    stats["elapsed"] = elapsed
+    stats["stages"] = {x.name: {"items": x.items, "busy_s": x.busy}
+                       for x in (extract_stats, chunk_stats, embed_stats, write_stats)}
+    report(force=True)
+    return stats
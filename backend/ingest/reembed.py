@@ -0,0 +1,318 @@
+
+import threading
+import time
+from typing import Callable, Optional
+import psycopg2.errors
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+from db import (
+    EMBEDDING_LOCK, EMBEDDING_MIGRATION_LOCK, EMBEDDING_STATE_RECHECK, SCHEMA_LOCK, embedding_column,
+    embedding_search_sql, embedding_state, engine, ensure_vector_index, vector_index_options, vector_literal,
+)
+from rag.embedder import Embedder
+from rag.registry import registry
+from settings import settings
+
+# The new model's vectors are staged next to the live ones until the cutover renames them
+NEXT_COLUMN = "embedding_next"
+# Deliberately outside the idx_documents_embedding* names ensure_vector_index() manages
+NEXT_INDEX = "idx_next_documents_embedding"
+RESET_TRIGGER = "documents_reset_embedding_next"
+
+# Rows whose text is worth embedding (providers reject empty inputs)
+_PENDING = f"{NEXT_COLUMN} IS NULL AND coalesce(content, '') <> ''"
+# Most rows the cutover embeds while holding EMBEDDING_LOCK; more are caught up without it first
+CUTOVER_MAX_ROWS = 100
+
+def _prepare(emb: Embedder) -> str:
+    """
+    Add the staging column for `emb` (or keep the one an interrupted run of the
+    same migration left behind) and return its SQL type. A trigger clears a
+    row's staged vector whenever ingestion rewrites its content.
+    """
+    storage = "halfvec" if settings.vector_storage == "halfvec" else "vector"
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": SCHEMA_LOCK})
+        conn.execute(text("SET LOCAL lock_timeout = '10s'"))
+        state = embedding_state(conn)
+        staged = embedding_column(conn, NEXT_COLUMN)
+        if staged and (state["next_model"] != emb.model_name or staged[1] != emb.dimension):
+            print(f"[REEMBED] Discarding vectors staged for {state['next_model']}")
+            conn.execute(text(f"ALTER TABLE documents DROP COLUMN {NEXT_COLUMN}"))
+            staged = None
+        if staged is None:
+            conn.execute(text(f"ALTER TABLE documents ADD COLUMN {NEXT_COLUMN} {storage}({emb.dimension})"))
+        conn.execute(text(
+            f"""
+            CREATE OR REPLACE FUNCTION {RESET_TRIGGER}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+              NEW.{NEXT_COLUMN} := NULL;
+              RETURN NEW;
+            END $$
+            """
+        ))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {RESET_TRIGGER} ON documents"))
+        conn.execute(text(
+            f"CREATE TRIGGER {RESET_TRIGGER} BEFORE UPDATE OF content ON documents FOR EACH ROW "
+            f"WHEN (OLD.content IS DISTINCT FROM NEW.content) EXECUTE FUNCTION {RESET_TRIGGER}()"
+        ))
+        conn.execute(text(
+            "UPDATE embedding_state SET next_model = :model, updated_at = now() WHERE id = 1"
+        ), {"model": emb.model_name})
+        col_type, dim = embedding_column(conn, NEXT_COLUMN)
+    return f"{col_type}({dim})"
+
+def _abandon(emb: Embedder):
+    """
+    Undo _prepare() after a cancelled or failed run. Without the trigger the
+    staged vectors could go stale, so they are dropped with it; clearing
+    `next_model` lets searches cache embedding_state again.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": SCHEMA_LOCK})
+        conn.execute(text("SET LOCAL lock_timeout = '10s'"))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {RESET_TRIGGER} ON documents"))
+        conn.execute(text(f"DROP FUNCTION IF EXISTS {RESET_TRIGGER}()"))
+        # Takes NEXT_INDEX with it
+        conn.execute(text(f"ALTER TABLE documents DROP COLUMN IF EXISTS {NEXT_COLUMN}"))
+        conn.execute(text(
+            "UPDATE embedding_state SET next_model = NULL, updated_at = now() WHERE id = 1 AND next_model = :model"
+        ), {"model": emb.model_name})
+    print(f"[REEMBED] Migration to {emb.model_name} abandoned; staged vectors dropped")
+
+def _embed_batch(cur, emb: Embedder, vtype: str, after_id: int) -> tuple[Optional[int], int]:
+    """
+    Stage vectors for the next `EMBED_MIGRATION_BATCH` pending rows with id
+    above `after_id`; returns (last id or None when none are left, rows read).
+    Rows whose content changed since they were read are left pending.
+    """
+    cur.execute(
+        f"SELECT id, content, content_hash FROM documents WHERE {_PENDING} AND id > %s ORDER BY id LIMIT %s",
+        (after_id, settings.embed_migration_batch),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return None, 0
+    vectors = emb.embed([content for _, content, _ in rows])
+    execute_values(cur, f"""
+        UPDATE documents AS d SET {NEXT_COLUMN} = v.embedding
+        FROM (VALUES %s) AS v(id, content_hash, embedding)
+        WHERE d.id = v.id AND d.content_hash IS NOT DISTINCT FROM v.content_hash
+        """, [(row_id, h, vector_literal(vec)) for (row_id, _, h), vec in zip(rows, vectors)],
+        template=f"(%s, %s::varchar, %s::{vtype})")
+    return rows[-1][0], len(rows)
+
+def _build_index():
+    """Build the ANN index for the staged vectors without blocking writes."""
+    if settings.vector_index == "none":
+        return
+    with engine.connect() as conn:
+        col_type, dim = embedding_column(conn, NEXT_COLUMN)
+        valid = conn.execute(text(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+        ), {"name": NEXT_INDEX}).scalar()
+        rows = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'documents'")).scalar() or 0
+    if valid:
+        return
+    expr, _, opclass = embedding_search_sql(col_type, dim, NEXT_COLUMN)
+    if opclass is None:
+        print(f"[REEMBED] No ANN index possible for {col_type}({dim})")
+        return
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        # An interrupted CONCURRENTLY build leaves an invalid index behind
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {NEXT_INDEX}"))
+        if settings.index_maintenance_work_mem:
+            conn.execute(text(f"SET maintenance_work_mem = '{settings.index_maintenance_work_mem}'"))
+        with_clause = vector_index_options(max(rows, 0))
+        print(f"[REEMBED] Building {settings.vector_index.upper()} index on {expr} ({with_clause}) over ~{rows} rows...")
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {NEXT_INDEX} ON documents "
+            f"USING {settings.vector_index} ({expr} {opclass}) WITH ({with_clause})"
+        ))
+        if settings.index_maintenance_work_mem:
+            conn.execute(text("RESET maintenance_work_mem"))
+
+def _pending_rows(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM documents WHERE {_PENDING}")
+        n = cur.fetchone()[0]
+    conn.commit()
+    return n
+
+def _try_cutover(conn, emb: Embedder, vtype: str) -> Optional[int]:
+    """
+    Swap the staged vectors in, in one transaction on `conn`; returns the new
+    generation, or None while searches or ingestion runs hold EMBEDDING_LOCK
+    or more than CUTOVER_MAX_ROWS rows still need embedding.
+    """
+    with conn.cursor() as cur:
+        # Try-lock: queueing for it would stall every search behind a long ingestion run
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (EMBEDDING_LOCK,))
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("SET LOCAL lock_timeout = '10s'")
+        cur.execute("LOCK TABLE documents IN SHARE ROW EXCLUSIVE MODE")
+        # Searches wait on the lock from here on: only embed a handful of stragglers under it
+        cur.execute(f"SELECT count(*) FROM documents WHERE {_PENDING}")
+        if cur.fetchone()[0] > CUTOVER_MAX_ROWS:
+            return None
+        last_id = 0
+        while last_id is not None:
+            last_id, _ = _embed_batch(cur, emb, vtype, last_id)
+        cur.execute(f"DROP TRIGGER IF EXISTS {RESET_TRIGGER} ON documents")
+        cur.execute(f"DROP FUNCTION IF EXISTS {RESET_TRIGGER}()")
+        # Dropping the old column takes its ANN indexes (global and partial) with it
+        cur.execute("ALTER TABLE documents DROP COLUMN embedding")
+        cur.execute(f"ALTER TABLE documents RENAME COLUMN {NEXT_COLUMN} TO embedding")
+        cur.execute(f"ALTER INDEX IF EXISTS {NEXT_INDEX} RENAME TO idx_documents_embedding")
+        cur.execute(
+            """
+            UPDATE embedding_state
+            SET model = %s, dimension = %s, generation = generation + 1, next_model = NULL, updated_at = now()
+            WHERE id = 1 RETURNING generation
+            """, (emb.model_name, emb.dimension))
+        generation = cur.fetchone()[0]
+        # Every chunk now carries the new model's vector: don't make ingestion re-embed them
+        cur.execute(
+            "UPDATE ingest_manifest SET embed_model = regexp_replace(embed_model, '^[^;]*', %s)",
+            (emb.model_name,),
+        )
+    conn.commit()
+    return generation
+
+def migrate_embeddings(
+    model: str,
+    progress: Optional[Callable[[dict], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Move the corpus to embedding model `model` (an Embedder.model_name) on a
+    live system:
+
+    1. stage: add `embedding_next`, sized for the new model, next to `embedding`
+    2. backfill: re-embed the stored chunk `content` in batches of
+       `EMBED_MIGRATION_BATCH` (nothing is re-extracted), repeating until rows
+       changed by concurrent ingestion are caught up
+    3. index: build the new ANN index CONCURRENTLY
+    4. cutover: catch up without locks until at most `CUTOVER_MAX_ROWS` rows
+       are left, then in one transaction holding EMBEDDING_LOCK embed those,
+       drop the old column, rename the new one and its index into place and
+       bump `embedding_state.generation`
+
+    Until the cutover commits, /chat and ingestion keep using the old model and
+    column, and new chunks are picked up by the backfill. The cutover waits for
+    running ingestion jobs to finish; searches that raced it re-embed their
+    question (see Retriever.search).
+
+    Cancelling (or an error) drops the staged vectors and clears the
+    announcement. Only a run killed outright leaves them behind: running the
+    same migration again resumes, a different target model starts over.
+    """
+    if settings.vector_store == "local":
+        raise ValueError("Embedding migrations need VECTOR_STORE=pgvector")
+    emb = Embedder(model)
+    stats = {"model": emb.model_name, "phase": "backfill", "rows_done": 0, "rows_total": 0, "cancelled": False}
+    started = time.perf_counter()
+    last_report = started
+
+    def report(force: bool = False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if progress is None or (not force and now - last_report < 1.0):
+            return
+        last_report = now
+        elapsed = now - started
+        progress({**stats, "elapsed": elapsed, "rows_per_sec": stats["rows_done"] / elapsed if elapsed else 0.0})
+
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": EMBEDDING_MIGRATION_LOCK}).scalar():
+            raise RuntimeError("Another embedding migration is already running")
+        lock_conn.commit()
+        try:
+            state = embedding_state(lock_conn)
+            lock_conn.commit()
+            if state["model"] == emb.model_name:
+                raise ValueError(f"{emb.model_name} is already the active embedding model")
+            print(f"[REEMBED] Migrating embeddings from {state['model']} to {emb.model_name}")
+            vtype = _prepare(emb)
+            # Searches start checking embedding_state on every query within EMBEDDING_STATE_RECHECK of this
+            announced = time.monotonic()
+            conn = engine.raw_connection()
+
+            def backfill() -> Optional[int]:
+                """One pass over the pending rows; returns how many were embedded, None if cancelled."""
+                last_id, embedded = 0, 0
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    with conn.cursor() as cur:
+                        last_id, n = _embed_batch(cur, emb, vtype, last_id)
+                    conn.commit()
+                    if last_id is None:
+                        return embedded
+                    embedded += n
+                    stats["rows_done"] += n
+                    report()
+
+            def cancelled() -> dict:
+                stats["cancelled"] = True
+                report(force=True)
+                return stats
+
+            finished = False
+            try:
+                stats["rows_total"] = _pending_rows(conn)
+                # Later passes only find rows ingestion rewrote meanwhile; the cutover takes what is left
+                for _ in range(3):
+                    embedded = backfill()
+                    if embedded is None:
+                        return cancelled()
+                    if embedded < settings.embed_migration_batch:
+                        break
+
+                stats["phase"] = "index"
+                report(force=True)
+                _build_index()
+
+                stats["phase"] = "cutover"
+                report(force=True)
+                time.sleep(max(0.0, announced + 2 * EMBEDDING_STATE_RECHECK - time.monotonic()))
+                while True:
+                    # Running ingestion keeps adding rows: catch up on them without holding any lock
+                    while _pending_rows(conn) > CUTOVER_MAX_ROWS:
+                        if backfill() is None:
+                            return cancelled()
+                    try:
+                        generation = _try_cutover(conn, emb, vtype)
+                    except psycopg2.errors.LockNotAvailable:
+                        generation = None
+                    if generation is not None:
+                        finished = True
+                        break
+                    conn.rollback()
+                    if cancel is not None and cancel.is_set():
+                        return cancelled()
+                    stats["phase"] = "cutover (waiting for running ingestion)"
+                    report()
+                    time.sleep(5)
+            finally:
+                # Closed first: an open batch transaction would block the cleanup's ALTER TABLE
+                conn.close()
+                if not finished:
+                    try:
+                        _abandon(emb)
+                    except Exception as e:
+                        print(f"[REEMBED] Could not clean up the staged migration: {e}")
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": EMBEDDING_MIGRATION_LOCK})
+            lock_conn.commit()
+
+    print(f"[REEMBED] {emb.model_name} is now the active embedding model (generation {generation})")
+    # Other processes notice on their next search or ingestion run
+    registry.set_embedding_model(emb.model_name, emb)
+    # Partial indexes went with the old column
+    ensure_vector_index()
+    stats.update(phase="done", generation=generation)
+    report(force=True)
+    return stats
@@ -1,7 +1,16 @@
 
+import asyncio
+import os
+import random
+import time
+from pathlib import Path
 import httpx
+from sqlalchemy import text
+from db import metadata_session
 from settings import settings
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 class SharePointClient:
     def __init__(self):
         self.tenant = settings.tenant_id
@@ -11,9 +20,10 @@ class SharePointClient:
         self.site_path = settings.sp_site_path
         self.drive_name = settings.sp_drive_name
         self.token = None
+        self.token_expires_at = 0.0
 
     async def _get_token(self):
-        url = f"https://login.microsoftonline.com/{self.tenant}/oauth2/v2.0/token"
+        url = f"{settings.ms_login_base_url}/{self.tenant}/oauth2/v2.0/token"
         data = {
             "client_id": self.client_id,
             "client_secret": self.client_secret,
@@ -23,39 +33,225 @@ class SharePointClient:
         async with httpx.AsyncClient() as c:
             r = await c.post(url, data=data)
             r.raise_for_status()
-            self.token = r.json()["access_token"]
+            body = r.json()
+            self.token = body["access_token"]
+            # Refresh a minute early so long syncs never send an expired token
+            self.token_expires_at = time.time() + int(body.get("expires_in", 3600)) - 60
 
     async def _auth(self):
-        if not self.token:
+        if not self.token or time.time() >= self.token_expires_at:
             await self._get_token()
         return {"Authorization": f"Bearer {self.token}"}
 
-    async def iter_files(self, folder_path: str):
-        async with httpx.AsyncClient(base_url="https://graph.microsoft.com/v1.0") as c:
-            headers = await self._auth()
-            site = await c.get(f"/sites/{self.site_host}:{self.site_path}", headers=headers)
-            site.raise_for_status()
-            site_id = site.json()["id"]
-            drives = await c.get(f"/sites/{site_id}/drives", headers=headers)
-            drives.raise_for_status()
-            drive = next((d for d in drives.json()["value"] if d["name"] == self.drive_name), None)
-            if not drive:
-                raise RuntimeError("Drive not found")
-            drive_id = drive["id"]
-            root = await c.get(f"/drives/{drive_id}/root:/{folder_path}", headers=headers)
-            root.raise_for_status()
-            item_id = root.json()["id"]
-
-            async def walk(item_id):
-                children = await c.get(f"/drives/{drive_id}/items/{item_id}/children", headers=headers)
-                children.raise_for_status()
-                for it in children.json()["value"]:
-                    if "folder" in it:
-                        yield from (await walk(it["id"]))
-                    else:
-                        dl = await c.get(f"/drives/{drive_id}/items/{it['id']}/content", headers=headers)
-                        dl.raise_for_status()
-                        yield it["name"], dl.content
-
-            async for f in walk(item_id):
-                yield f
+    @staticmethod
+    def _retry_delay(r: httpx.Response, attempt: int) -> float:
+        try:
+            return float(r.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+    async def _get(self, c: httpx.AsyncClient, url: str) -> httpx.Response:
+        """GET with token refresh on 401 and Retry-After aware retries on throttling/5xx."""
+        refreshed = False
+        for attempt in range(settings.sp_max_retries + 1):
+            r = await c.get(url, headers=await self._auth())
+            if r.status_code == 401 and not refreshed:
+                self.token, refreshed = None, True
+                continue
+            if r.status_code in RETRY_STATUSES and attempt < settings.sp_max_retries:
+                await asyncio.sleep(self._retry_delay(r, attempt))
+                continue
+            r.raise_for_status()
+            return r
+        r.raise_for_status()
+        return r
+
+    async def _download(self, c: httpx.AsyncClient, drive_id: str, item_id: str, dest: Path):
+        """Stream one file to `dest` (via a temp file, so a failed download never leaves a partial file)."""
+        tmp = dest.with_name(dest.name + ".part")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        refreshed = False
+        for attempt in range(settings.sp_max_retries + 1):
+            async with c.stream(
+                "GET", f"/drives/{drive_id}/items/{item_id}/content", headers=await self._auth()
+            ) as r:
+                if r.status_code == 401 and not refreshed:
+                    self.token, refreshed = None, True
+                    continue
+                if r.status_code in RETRY_STATUSES and attempt < settings.sp_max_retries:
+                    await asyncio.sleep(self._retry_delay(r, attempt))
+                    continue
+                r.raise_for_status()
+                with tmp.open("wb") as out:
+                    async for block in r.aiter_bytes(1 << 20):
+                        out.write(block)
+            os.replace(tmp, dest)
+            return
+        raise RuntimeError(f"Download of {item_id} kept failing")
+
+    async def _drive_id(self, c: httpx.AsyncClient) -> str:
+        site = await self._get(c, f"/sites/{self.site_host}:{self.site_path}")
+        site_id = site.json()["id"]
+        drives = await self._get(c, f"/sites/{site_id}/drives")
+        drive = next((d for d in drives.json()["value"] if d["name"] == self.drive_name), None)
+        if not drive:
+            raise RuntimeError("Drive not found")
+        return drive["id"]
+
+    @staticmethod
+    def _load_state(drive_id: str, folder: str) -> tuple[str | None, dict]:
+        with metadata_session() as s:
+            link = s.execute(text(
+                "SELECT delta_link FROM sharepoint_delta WHERE drive_id = :d AND folder = :f"
+            ), {"d": drive_id, "f": folder}).scalar()
+            nodes = {
+                r["item_id"]: dict(r)
+                for r in s.execute(text(
+                    """
+                    SELECT item_id, parent_id, name, is_folder, etag, path
+                    FROM sharepoint_items WHERE drive_id = :d AND folder = :f
+                    """
+                ), {"d": drive_id, "f": folder}).mappings().all()
+            }
+        return link, nodes
+
+    @staticmethod
+    def _save_state(drive_id: str, folder: str, delta_link: str, nodes: dict):
+        rows = [
+            {"d": drive_id, "f": folder, "i": i, "pa": n["parent_id"], "n": n["name"],
+             "fo": n["is_folder"], "e": n["etag"], "p": n["path"]}
+            for i, n in nodes.items()
+        ]
+        with metadata_session() as s:
+            s.execute(text("DELETE FROM sharepoint_items WHERE drive_id = :d AND folder = :f"),
+                      {"d": drive_id, "f": folder})
+            if rows:
+                s.execute(text(
+                    """
+                    INSERT INTO sharepoint_items (drive_id, folder, item_id, parent_id, name, is_folder, etag, path)
+                    VALUES (:d, :f, :i, :pa, :n, :fo, :e, :p)
+                    """
+                ), rows)
+            s.execute(text(
+                """
+                INSERT INTO sharepoint_delta (drive_id, folder, delta_link, updated_at)
+                VALUES (:d, :f, :l, now())
+                ON CONFLICT (drive_id, folder) DO UPDATE SET delta_link = EXCLUDED.delta_link, updated_at = now()
+                """
+            ), {"d": drive_id, "f": folder, "l": delta_link})
+            s.commit()
+
+    @staticmethod
+    def _resolve_paths(nodes: dict, root_id: str) -> dict:
+        """
+        Compute each node's path relative to the synced folder by walking parent ids
+        (delta responses don't carry parentReference.path). Nodes that don't lead
+        back to `root_id` are outside the folder and are dropped.
+        """
+        paths = {root_id: ""}
+
+        def resolve(item_id):
+            chain = []
+            while item_id not in paths:
+                node = nodes.get(item_id)
+                if node is None or item_id in chain:
+                    for i in chain:
+                        paths[i] = None
+                    return None
+                chain.append(item_id)
+                item_id = node["parent_id"]
+            base = paths[item_id]
+            for i in reversed(chain):
+                base = None if base is None else f"{base}/{nodes[i]['name']}".lstrip("/")
+                paths[i] = base
+            return base
+
+        resolved = {}
+        for item_id, node in nodes.items():
+            if item_id != root_id and resolve(item_id) is not None:
+                resolved[item_id] = {**node, "path": paths[item_id]}
+        return resolved
+
+    async def sync_folder(self, folder_path: str, dest: Path) -> dict:
+        """
+        Mirror `folder_path` of the configured drive into `dest`.
+
+        Uses a Graph `delta` query: the first run enumerates the drive, later runs
+        resume from the stored delta link and only see changed items. Files whose
+        eTag is unchanged are not downloaded again; changed files are streamed to
+        disk with at most `SP_DOWNLOAD_CONCURRENCY` downloads in flight; deleted,
+        renamed or moved-away files are removed from the mirror.
+        """
+        folder = folder_path.strip("/")
+        dest.mkdir(parents=True, exist_ok=True)
+        stats = {"downloaded": 0, "unchanged": 0, "deleted": 0}
+        async with httpx.AsyncClient(
+            base_url=settings.graph_base_url, timeout=httpx.Timeout(60.0, read=300.0), follow_redirects=True
+        ) as c:
+            drive_id = await self._drive_id(c)
+            root_id = (await self._get(c, f"/drives/{drive_id}/root:/{folder}")).json()["id"]
+
+            delta_link, known = self._load_state(drive_id, folder)
+            reset = delta_link is None
+            changes: dict = {}
+            url = delta_link or f"/drives/{drive_id}/root/delta"
+            while url:
+                try:
+                    page = (await self._get(c, url)).json()
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 410 and not reset:
+                        # Delta token expired: start over with a full enumeration
+                        print("[SP] Delta token expired, resyncing folder from scratch")
+                        reset, changes, url = True, {}, f"/drives/{drive_id}/root/delta"
+                        continue
+                    raise
+                for it in page.get("value", []):
+                    changes[it["id"]] = it  # later pages supersede earlier ones
+                url = page.get("@odata.nextLink")
+                delta_link = page.get("@odata.deltaLink", delta_link)
+
+            # A full enumeration replaces the known tree; a delta is applied on top of it
+            nodes = {} if reset else {i: dict(n) for i, n in known.items()}
+            for item_id, it in changes.items():
+                if "deleted" in it:
+                    nodes.pop(item_id, None)
+                    continue
+                nodes[item_id] = {
+                    "item_id": item_id,
+                    "parent_id": (it.get("parentReference") or {}).get("id"),
+                    "name": it.get("name", ""),
+                    "is_folder": "file" not in it,
+                    "etag": it.get("eTag"),
+                }
+            nodes = self._resolve_paths(nodes, root_id)
+
+            old_files = {i: n for i, n in known.items() if not n["is_folder"]}
+            new_files = {i: n for i, n in nodes.items() if not n["is_folder"]}
+            new_paths = {n["path"] for n in new_files.values()}
+            for item_id, old in old_files.items():
+                new = new_files.get(item_id)
+                if (new is None or new["path"] != old["path"]) and old["path"] not in new_paths:
+                    (dest / old["path"]).unlink(missing_ok=True)
+                    stats["deleted"] += 1
+
+            to_download = []
+            for item_id, new in new_files.items():
+                old = old_files.get(item_id)
+                if old and old["path"] == new["path"] and old["etag"] == new["etag"] and (dest / new["path"]).exists():
+                    stats["unchanged"] += 1
+                else:
+                    to_download.append((item_id, new["path"]))
+
+            sem = asyncio.Semaphore(settings.sp_download_concurrency)
+
+            async def fetch(item_id: str, rel: str):
+                async with sem:
+                    await self._download(c, drive_id, item_id, dest / rel)
+                    stats["downloaded"] += 1
+
+            await asyncio.gather(*(fetch(i, rel) for i, rel in to_download))
+
+        # Only advance the delta link once every change has been applied locally
+        self._save_state(drive_id, folder, delta_link, nodes)
+        print(f"[SP] Synced {folder} into {dest}: {stats}")
+        return stats
@@ -0,0 +1,520 @@
+
+import io
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Dict, Iterator, Optional
+from settings import settings
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+# Form fields are small (API key, site, area); anything bigger is not a field we know.
+# Fields arrive before the authentication check, so their count and total size
+# (with the part headers sent before the first file) are capped too.
+MAX_FIELD_BYTES = 64 * 1024
+MAX_FIELDS = 16
+_END = object()
+
+class UploadError(Exception):
+    """Malformed upload (bad file name, wrong part order, unknown upload); maps to HTTP 400."""
+
+class UploadTooLarge(UploadError):
+    """Per-file or total size limit exceeded; maps to HTTP 413."""
+
+class OffsetMismatch(UploadError):
+    """A resumable chunk doesn't start where the stored file ends; maps to HTTP 409."""
+
+    def __init__(self, name: str, received: int):
+        super().__init__(f"{name}: expected offset {received}")
+        self.received = received
+
+def archive_kind(name: str) -> Optional[str]:
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return "zip"
+    if lower.endswith(TAR_SUFFIXES):
+        return "tar"
+    return None
+
+def _archive_dir(path: Path) -> Path:
+    """plant.tar.gz -> plant/, next to the archive."""
+    name = path.name
+    for suffix in (".zip",) + TAR_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    return path.with_name(name or "archive")
+
+def safe_path(base: Path, name: str) -> Path:
+    """Place an uploaded or archived relative path under `base`, refusing `..` and drive names."""
+    parts = [p for p in PurePosixPath(name.replace("\\", "/")).parts if p not in ("/", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        raise UploadError(f"Invalid file name: {name!r}")
+    return base.joinpath(*parts)
+
+class UploadBudget:
+    """
+    Byte limits of one upload: `UPLOAD_MAX_FILE_MB` per file and
+    `UPLOAD_MAX_TOTAL_MB` for everything written to disk. Archives are held
+    to the per-file limit through their members; a zip also counts itself
+    towards the total while it sits on disk waiting to be unpacked.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def check_file(self, name: str, size: int):
+        if size > settings.upload_max_file_mb << 20:
+            raise UploadTooLarge(f"{name} exceeds the {settings.upload_max_file_mb} MB per-file limit")
+
+    def add(self, name: str, n: int, file_size: Optional[int] = None):
+        """Account `n` more bytes written to `name`, which is now `file_size` bytes long (None: an archive)."""
+        if file_size is not None:
+            self.check_file(name, file_size)
+        with self._lock:
+            self.total += n
+            if self.total > settings.upload_max_total_mb << 20:
+                raise UploadTooLarge(f"Upload exceeds the {settings.upload_max_total_mb} MB total limit")
+
+class UploadFeed:
+    """
+    Files of one upload that are ready for ingestion, consumed by
+    `ingest_path(files=...)` while the rest is still arriving.
+
+    Iteration blocks until the next file lands, yielding None about twice a
+    second while idle so the pipeline can keep draining. It ends after
+    `close()`, or once nothing has arrived for `UPLOAD_IDLE_TIMEOUT` seconds
+    (a stalled folder upload then ingests what it got).
+    """
+
+    def __init__(self):
+        self.closed = False
+        self.last_activity = time.monotonic()
+        self._q: queue.Queue = queue.Queue()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def put(self, path: Path):
+        self.touch()
+        self._q.put(path)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._q.put(_END)
+
+    def __iter__(self) -> Iterator[Optional[Path]]:
+        while True:
+            try:
+                item = self._q.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() - self.last_activity > settings.upload_idle_timeout:
+                    print(f"[UPLOAD] Nothing received for {settings.upload_idle_timeout}s; ingesting what arrived")
+                    self.closed = True
+                    return
+                yield None
+                continue
+            if item is _END:
+                return
+            yield item
+
+def copy_limited(src: BinaryIO, dst: BinaryIO, name: str, budget: UploadBudget) -> int:
+    size = 0
+    while True:
+        buf = src.read(1 << 20)
+        if not buf:
+            return size
+        size += len(buf)
+        budget.add(name, len(buf), size)
+        dst.write(buf)
+
+def unpack_tar(fileobj: BinaryIO, dest: Path, budget: UploadBudget, feed: UploadFeed):
+    """Extract regular files from a tar stream, front to back, feeding each one as soon as it is written."""
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue  # directories are implied; links and devices are never extracted
+            path = safe_path(dest, member.name)
+            budget.check_file(member.name, member.size)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tar.extractfile(member) as src, path.open("wb") as out:
+                copy_limited(src, out, member.name, budget)
+            feed.put(path)
+
+def unpack_zip(archive: Path, dest: Path, budget: UploadBudget, feed: UploadFeed):
+    """Extract a landed zip member by member (its index sits at the end, so it can't be streamed)."""
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            path = safe_path(dest, info.filename)
+            budget.check_file(info.filename, info.file_size)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Sizes in the header can lie (zip bombs); the copy counts real bytes
+            with zf.open(info) as src, path.open("wb") as out:
+                copy_limited(src, out, info.filename, budget)
+            feed.put(path)
+
+def land(path: Path, budget: UploadBudget, feed: UploadFeed):
+    """A file finished arriving: queue it for ingestion, or unpack it first if it is an archive."""
+    kind = archive_kind(path.name)
+    if kind is None:
+        feed.put(path)
+        return
+    try:
+        if kind == "zip":
+            unpack_zip(path, _archive_dir(path), budget, feed)
+        else:
+            with path.open("rb") as f:
+                unpack_tar(f, _archive_dir(path), budget, feed)
+    finally:
+        path.unlink(missing_ok=True)
+
+class _Pipe(io.RawIOBase):
+    """Bounded byte pipe from the request reader to a tar reader thread."""
+
+    def __init__(self):
+        self._q: queue.Queue = queue.Queue(maxsize=16)
+        self._buf = b""
+        self._eof = False
+        self._discard = False
+
+    def readable(self) -> bool:
+        return True
+
+    def put(self, data: Optional[bytes]):
+        if not self._discard:
+            self._q.put(data)
+
+    def discard(self):
+        """Reader is gone: drop queued and future data so the writer never blocks."""
+        self._discard = True
+        while True:
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                return
+
+    def readinto(self, b) -> int:
+        while not self._buf and not self._eof:
+            chunk = self._q.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buf = chunk
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+class TarStream:
+    """Unpack a tar(.gz/.bz2/.xz) archive on a thread while it is still being received."""
+
+    def __init__(self, dest: Path, budget: UploadBudget, feed: UploadFeed):
+        self.error: Optional[Exception] = None
+        self._pipe = _Pipe()
+        self._thread = threading.Thread(target=self._run, args=(dest, budget, feed), daemon=True)
+        self._thread.start()
+
+    def _run(self, dest: Path, budget: UploadBudget, feed: UploadFeed):
+        try:
+            unpack_tar(self._pipe, dest, budget, feed)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Trailing padding after the end-of-archive marker (or everything, after an error)
+            self._pipe.discard()
+
+    def write(self, data: bytes):
+        if self.error:
+            raise self.error
+        self._pipe.put(bytes(data))
+
+    def close(self):
+        self._pipe.put(None)
+        self._thread.join()
+        if self.error:
+            raise self.error
+
+    def abort(self):
+        # A truncated archive makes the reader fail and exit; its error is moot now
+        self._pipe.put(None)
+        self._thread.join(timeout=10)
+
+class MultipartUpload:
+    """
+    Incremental multipart/form-data receiver: file parts are written straight
+    into `base` as the request body arrives (tar archives unpacked on the fly,
+    zips right after they land) and every finished file goes to `feed`, so
+    nothing is spooled and ingestion starts with the first file.
+
+    Form fields must precede the files; `start(fields)` runs when the first
+    file part begins and may reject the upload (e.g. authentication).
+    Blocking: call `write`/`finish` off the event loop.
+    """
+
+    def __init__(self, content_type: str, base: Path, budget: UploadBudget, feed: UploadFeed,
+                 start: Callable[[Dict[str, str]], None]):
+        ctype, params = parse_options_header(content_type)
+        if ctype != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadError("Expected a multipart/form-data body")
+        self.base = base
+        self.budget = budget
+        self.feed = feed
+        self.start = start
+        self.fields: Dict[str, str] = {}
+        self.files = 0
+        self._started = False
+        # Field parts, and bytes counted against MAX_FIELD_BYTES, received so far
+        self._field_parts = 0
+        self._field_bytes = 0
+        self._header_bytes = 0  # of the current part
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part = None
+        self._parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def write(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finish(self):
+        self._parser.finalize()
+        if self._part is not None:
+            raise UploadError("Upload ended in the middle of a part")
+
+    def abort(self):
+        """Release the part being written when the request fails midway."""
+        part, self._part = self._part, None
+        if part is None or part["out"] is None:
+            return
+        if part["kind"] == "tar":
+            part["out"].abort()
+        else:
+            part["out"].close()
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._header_bytes = 0
+
+    def _count_field_bytes(self, n: int):
+        self._field_bytes += n
+        if self._field_bytes > MAX_FIELD_BYTES:
+            raise UploadError(f"Form fields and part headers exceed {MAX_FIELD_BYTES} bytes")
+
+    def _count_header_bytes(self, n: int):
+        self._header_bytes += n
+        if self._header_bytes > MAX_FIELD_BYTES:
+            raise UploadError("Part headers are too large")
+        if not self._started:
+            self._count_field_bytes(n)
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._count_header_bytes(end - start)
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._count_header_bytes(end - start)
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            self._field_parts += 1
+            if self._field_parts > MAX_FIELDS:
+                raise UploadError(f"More than {MAX_FIELDS} form fields")
+            self._part = {"kind": "field", "name": name, "data": bytearray(), "out": None}
+            return
+        if not self._started:
+            self._started = True
+            self.start(self.fields)
+        path = safe_path(self.base, filename.decode("utf-8", errors="replace"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        kind = archive_kind(path.name)
+        if kind == "tar":
+            out = TarStream(_archive_dir(path), self.budget, self.feed)
+        else:
+            out = path.open("wb")
+        self._part = {"kind": kind or "file", "name": path.name, "path": path, "size": 0, "out": out}
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        part = self._part
+        if part["kind"] == "field":
+            self._count_field_bytes(end - start)
+            part["data"] += data[start:end]
+            return
+        if part["kind"] != "tar":
+            part["size"] += end - start
+            self.budget.add(part["name"], end - start, part["size"] if part["kind"] == "file" else None)
+        part["out"].write(data[start:end])
+        self.feed.touch()
+
+    def _on_part_end(self):
+        part, self._part = self._part, None
+        if part["kind"] == "field":
+            self.fields[part["name"]] = part["data"].decode("utf-8", errors="replace")
+            return
+        part["out"].close()
+        if part["kind"] == "file":
+            self.feed.put(part["path"])
+        elif part["kind"] == "zip":
+            land(part["path"], self.budget, self.feed)
+        self.files += 1
+
+class UploadSession:
+    """
+    A resumable upload: files arrive as sequences of raw chunks (`PUT` with an
+    offset), so a client on a flaky link asks for `status()` and continues
+    where the stored file ends. A file is queued (archives unpacked) once its
+    final chunk lands; after `finish()` the queue is ingested.
+    """
+
+    def __init__(self, site: Optional[str] = None, area: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.site = site
+        self.area = area
+        self.dir = Path(tempfile.mkdtemp(prefix="tauon-upload-")).resolve()
+        self.feed = UploadFeed()
+        self.budget = UploadBudget()
+        self.job_id: Optional[str] = None
+        self.complete: set = set()
+        self.received: Dict[str, int] = {}
+        self._writing: set = set()
+        self._lock = threading.Lock()
+
+    def open_chunk(self, name: str, offset: int) -> tuple[Path, BinaryIO, int]:
+        """Open `name` for appending a chunk that must start at `offset`; returns (path, file, size)."""
+        path = safe_path(self.dir, name)
+        with self._lock:
+            if self.feed.closed:
+                raise UploadError("Upload already finished")
+            if name in self.complete:
+                raise UploadError(f"{name} was already uploaded")
+            if name in self._writing:
+                raise UploadError(f"{name} is being written by another request")
+            size = path.stat().st_size if path.exists() else 0
+            if offset != size:
+                raise OffsetMismatch(name, size)
+            self._writing.add(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path, path.open("ab"), size
+
+    def close_chunk(self, name: str, path: Path, out: BinaryIO, final: bool):
+        out.close()
+        with self._lock:
+            self._writing.discard(name)
+            self.received[name] = path.stat().st_size
+            if final:
+                self.complete.add(name)
+        if final:
+            land(path, self.budget, self.feed)
+        else:
+            self.feed.touch()
+
+    def status(self) -> Dict:
+        """Bytes stored per unfinished file (the offset to resume from) and the files already complete."""
+        with self._lock:
+            partial = {name: size for name, size in self.received.items() if name not in self.complete}
+        return {
+            "upload_id": self.id,
+            "job_id": self.job_id,
+            "finished": self.feed.closed,
+            "files": partial,
+            "complete": sorted(self.complete),
+            "total_bytes": self.budget.total,
+        }
+
+    def finish(self) -> bool:
+        """Accept no more files; False if already finished."""
+        with self._lock:
+            if self._writing:
+                raise UploadError(f"{', '.join(sorted(self._writing))} still being uploaded")
+            if self.feed.closed:
+                return False
+            self.feed.close()
+            return True
+
+class UploadSessions:
+    """
+    Resumable uploads in progress, in memory: a server restart ends them.
+
+    A session's ingestion job is only queued by `start(session)` when the
+    session is finished, by the client or after `UPLOAD_IDLE_TIMEOUT` seconds
+    without a byte arriving, so an open session holds neither a job slot nor
+    the embedding lock while its client is away.
+    """
+
+    def __init__(self, start: Callable[[UploadSession], str]):
+        self._start = start
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, site: Optional[str] = None, area: Optional[str] = None) -> UploadSession:
+        self._expire()
+        session = UploadSession(site, area)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def finish(self, session: UploadSession):
+        """Close `session` and queue the ingestion of its complete files."""
+        if session.finish():
+            session.job_id = self._start(session)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            idle = now - session.feed.last_activity
+            if session.job_id is None and idle > settings.upload_idle_timeout:
+                if not session.complete:
+                    self.discard(session.id)
+                    continue
+                print(f"[UPLOAD] Upload {session.id} idle for {int(idle)}s; ingesting the files that completed")
+                try:
+                    self.finish(session)
+                except UploadError:
+                    pass  # a chunk is being written after all
+            elif session.job_id is not None and idle > 2 * settings.upload_idle_timeout:
+                # Its job owns the directory now (and removes it when done); just stop tracking the session
+                with self._lock:
+                    self._sessions.pop(session.id, None)
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        self._expire()
+        with self._lock:
+            return self._sessions.get(upload_id)
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            session = self._sessions.pop(upload_id, None)
+        if session is not None:
+            session.feed.close()
+            shutil.rmtree(session.dir, ignore_errors=True)
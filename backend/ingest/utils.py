@@ -1,12 +1,112 @@
 
-from typing import List
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterator, List
+from rag.tokens import count_tokens, split_tokens
+
+# Bump when chunk boundaries change so the manifest reprocesses existing files
+CHUNKER_VERSION = "v5"
+
+# Markdown headings, numbered section titles ("4.2 Startup"), or short ALL-CAPS lines.
+# A section number needs a sub-level and a short title without pipes or sentence
+# punctuation, so table rows ("1 | P-101 | ok") and procedure steps
+# ("3. Open valve V-12 and ...") stay ordinary lines.
+_HEADING = re.compile(r"^(#{1,6}\s|\d+(\.\d+)+\.?\s+[^\W\d_][^|.;:!?]{0,60}$|[A-Z0-9][A-Z0-9 \-/&:]{3,60}$)")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+def _split_long_line(line: str, max_tokens: int) -> List[tuple[str, int]]:
+    """Break a line that alone exceeds the budget at sentence ends, then at token boundaries."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(line):
+        n = count_tokens(sentence)
+        if n <= max_tokens:
+            pieces.append((sentence, n))
+        else:
+            pieces += [(p, count_tokens(p)) for p in split_tokens(sentence, max_tokens)]
+    return pieces
+
+def _units(text: str, max_tokens: int) -> Iterator[tuple[str, int, bool, bool]]:
+    """
+    Yield (line, tokens, is_heading, starts_paragraph) for each non-empty line.
+    Lines are the atomic unit so table rows, list items and procedure steps are
+    never cut; each line is tokenized exactly once.
+    """
+    new_para = True
+    for raw in text.split("\n"):
+        line = raw.rstrip()
+        if not line.strip():
+            new_para = True
+            continue
+        n = count_tokens(line)
+        heading = n < 30 and bool(_HEADING.match(line.strip()))
+        if n <= max_tokens:
+            yield line, n, heading, new_para
+        else:
+            for i, (piece, pn) in enumerate(_split_long_line(line, max_tokens)):
+                yield piece, pn, False, new_para and i == 0
+        new_para = False
 
 def split_into_chunks(text: str, max_tokens: int = 800, overlap: int = 100) -> List[str]:
+    """
+    Split `text` into chunks of at most `max_tokens` real tokens (tiktoken).
+
+    Chunks are packed from whole lines in a single pass. A heading starts a new
+    chunk once the current one is half full, and an overflowing chunk is cut at
+    its last paragraph break when that break is past the halfway mark. Up to
+    `overlap` tokens of trailing whole lines are repeated at the start of the
+    next chunk.
+    """
     text = (text or "").strip()
     if not text:
         return []
-    step = max_tokens - overlap
-    chunks = []
-    for i in range(0, len(text), step):
-        chunks.append(text[i:i+max_tokens])
+    overlap = min(overlap, max_tokens // 4)
+    chunks: List[str] = []
+    lines: List[tuple[str, int, bool]] = []  # (line, tokens, starts_paragraph)
+    size = 0
+    carried = 0  # leading entries of `lines` repeated from the previous chunk
+
+    def emit(upto: int):
+        nonlocal lines, size, carried
+        chunks.append("\n".join(l for l, _, _ in lines[:upto]))
+        keep: List[tuple[str, int, bool]] = []
+        budget = overlap
+        for line in reversed(lines[:upto]):
+            if line[1] + 1 > budget:
+                break
+            keep.insert(0, line)
+            budget -= line[1] + 1
+        lines = keep + lines[upto:]
+        carried = len(keep)
+        size = sum(n + 1 for _, n, _ in lines)
+
+    for line, n, heading, para in _units(text, max_tokens):
+        if heading and size >= max_tokens // 2:
+            emit(len(lines))
+            lines, size, carried = [], 0, 0  # a new section doesn't need the old one's tail
+        while lines and size + n + 1 > max_tokens:
+            if carried == len(lines):
+                # Only the overlap is left and it doesn't leave room for the new line: drop repeated lines
+                size -= lines[0][1] + 1
+                lines.pop(0)
+                carried -= 1
+                continue
+            # Cut after the overlap, or the chunk would hold nothing new
+            cut = next((i for i in range(len(lines) - 1, carried, -1) if lines[i][2]), 0)
+            covered = sum(x[1] + 1 for x in lines[:cut])
+            emit(cut if cut and covered >= max_tokens // 2 else len(lines))
+        lines.append((line, n, para))
+        size += n + 1
+    if len(lines) > carried:
+        chunks.append("\n".join(l for l, _, _ in lines))
     return chunks
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,64 @@
+
+from typing import Callable, Dict
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+# LLM calls routinely take several seconds; keep resolution up to a minute
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+HTTP_SECONDS = Histogram(
+    "tauon_http_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+CHAT_STAGE_SECONDS = Histogram(
+    "tauon_chat_stage_seconds",
+    "Time spent per /chat stage (embed, retrieve, rerank, llm, llm_first_token)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+INGEST_FILES = Counter("tauon_ingest_files_total", "Files seen by ingestion", ["result"])
+INGEST_BYTES = Counter("tauon_ingest_bytes_total", "Bytes of files (re)processed by ingestion")
+INGEST_PAGES = Counter("tauon_ingest_pages_total", "Pages/segments extracted")
+INGEST_OCR_PAGES = Counter("tauon_ingest_ocr_pages_total", "Pages or images run through OCR")
+INGEST_OCR_SECONDS = Counter("tauon_ingest_ocr_seconds_total", "Time spent in OCR")
+INGEST_STAGE_ITEMS = Counter(
+    "tauon_ingest_stage_items_total", "Items handled per ingestion stage (files, chunks or rows)", ["stage"]
+)
+INGEST_STAGE_SECONDS = Counter("tauon_ingest_stage_seconds_total", "Busy time per ingestion stage", ["stage"])
+
+class _Collector:
+    """Reads cache and pool statistics from live objects at scrape time."""
+
+    def __init__(self):
+        self.caches: Dict[str, Callable[[], dict]] = {}
+        self.pool = None
+
+    def collect(self):
+        hits = CounterMetricFamily("tauon_cache_hits", "Cache hits", labels=["cache", "tier"])
+        misses = CounterMetricFamily("tauon_cache_misses", "Cache misses", labels=["cache"])
+        items = GaugeMetricFamily("tauon_cache_items", "Entries held in memory", labels=["cache"])
+        for name, stats_fn in self.caches.items():
+            stats = stats_fn()
+            for key, value in stats.items():
+                if key.endswith("hits"):
+                    hits.add_metric([name, key[: -len("_hits")]], value)
+            misses.add_metric([name], stats.get("misses", 0))
+            items.add_metric([name], stats.get("items", stats.get("memory_items", 0)))
+        yield from (hits, misses, items)
+        if self.pool is not None:
+            pool = GaugeMetricFamily("tauon_db_pool_connections", "SQLAlchemy pool connections", labels=["state"])
+            pool.add_metric(["size"], self.pool.size())
+            pool.add_metric(["checked_out"], self.pool.checkedout())
+            pool.add_metric(["overflow"], max(0, self.pool.overflow()))
+            pool.add_metric(["idle"], self.pool.checkedin())
+            yield pool
+
+_collector = _Collector()
+REGISTRY.register(_collector)
+
+def register_cache(name: str, stats_fn: Callable[[], dict]):
+    """Expose a cache's `stats()` (`*_hits`, `misses`, `items`) as metrics."""
+    _collector.caches[name] = stats_fn
+
+def register_pool(pool):
+    _collector.pool = pool
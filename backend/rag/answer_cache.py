@@ -0,0 +1,94 @@
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from settings import settings
+
+def context_fingerprint(hits: List[Dict], embed_model: str = "") -> str:
+    """
+    Identify the exact retrieved context: chunk ids plus their content hashes,
+    so re-ingestion that changes any of those chunks invalidates the answer,
+    and the embedding model the question was embedded with, so near hits only
+    compare vectors from the same space.
+    """
+    parts = sorted(f"{h['id']}:{h.get('content_hash') or ''}" for h in hits)
+    return hashlib.sha256("|".join([embed_model] + parts).encode()).hexdigest()
+
+def _normalize(question: str) -> str:
+    return " ".join(question.lower().split())
+
+class AnswerCache:
+    """
+    In-process cache of LLM answers for repeated /chat questions.
+
+    An entry matches when the retrieved context fingerprint is identical and
+    either the normalized question text is the same (exact hit) or the question
+    embeddings' cosine similarity is at least `ANSWER_CACHE_SIMILARITY` (near hit).
+    Entries expire after `ANSWER_CACHE_TTL` seconds; beyond
+    `ANSWER_CACHE_MAX_ITEMS` the least recently used entry is evicted.
+    """
+
+    def __init__(self):
+        self.ttl = settings.answer_cache_ttl
+        self.max_items = settings.answer_cache_max_items
+        self.threshold = settings.answer_cache_similarity
+        # (fingerprint, normalized question) -> (unit question vector, answer, stored_at)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict:
+        total = self.exact_hits + self.near_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.near_hits) / total if total else 0.0,
+            "items": len(self._entries),
+        }
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def _expire(self, now: float):
+        for key in [k for k, (_, _, t) in self._entries.items() if now - t > self.ttl]:
+            del self._entries[key]
+
+    def get(self, question: str, q_emb, fingerprint: str) -> Optional[str]:
+        now = time.time()
+        key = (fingerprint, _normalize(question))
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+            q = self._unit(q_emb)
+            # The fingerprint includes the embedding model, so candidates share q's vector space
+            candidates = [(k, e) for k, e in self._entries.items() if k[0] == fingerprint]
+            if candidates:
+                sims = np.stack([e[0] for _, e in candidates]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._entries.move_to_end(candidates[best][0])
+                    self.near_hits += 1
+                    return candidates[best][1][1]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, q_emb, fingerprint: str, answer: str):
+        key = (fingerprint, _normalize(question))
+        with self._lock:
+            self._entries[key] = (self._unit(q_emb), answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
@@ -1,26 +1,29 @@
 
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 from settings import settings
 
 class ChatLLM:
     def __init__(self):
         self.mode = None
         if settings.azure_base and settings.azure_key:
-            from openai import AzureOpenAI
-            self.client = AzureOpenAI(
+            from openai import AzureOpenAI, AsyncAzureOpenAI
+            azure_kwargs = dict(
                 api_key=settings.azure_key,
                 api_version=settings.azure_version,
                 azure_endpoint=settings.azure_base,
             )
+            self.client = AzureOpenAI(**azure_kwargs)
+            self.aclient = AsyncAzureOpenAI(**azure_kwargs)
             self.model = settings.azure_chat
             self.mode = "azure"
         else:
-            from openai import OpenAI
+            from openai import OpenAI, AsyncOpenAI
             self.client = OpenAI(api_key=settings.openai_key)
+            self.aclient = AsyncOpenAI(api_key=settings.openai_key)
             self.model = settings.openai_chat_model
             self.mode = "openai"
 
-    def answer(self, question: str, contexts: List[Dict]):
+    def _messages(self, question: str, contexts: List[Dict]) -> List[Dict]:
         sys = (
             "You are TauON PlantAI, an industrial RAG assistant. Answer using only the provided context."
             " If unsure, say you don't know. Always cite sources as [filename p.X] inline."
@@ -29,15 +32,28 @@ class ChatLLM:
         for i, c in enumerate(contexts, start=1):
             src = c.get("source") or c.get("uri")
             page = c.get("page") or 1
-            ctx_blocks.append(f"[DOC{i}] {src} (p.{page})\\n{c['content'][:2000]}")
-        prompt = "\\n\\n".join(ctx_blocks) + f"\\n\\nQuestion: {question}"
-        msgs = [
+            ctx_blocks.append(f"[DOC{i}] {src} (p.{page})\n{c['content']}")
+        prompt = "\n\n".join(ctx_blocks) + f"\n\nQuestion: {question}"
+        return [
             {"role": "system", "content": sys},
             {"role": "user", "content": prompt},
         ]
-        if self.mode == "azure":
-            resp = self.client.chat.completions.create(model=self.model, messages=msgs)
-            return resp.choices[0].message.content
-        else:
-            resp = self.client.chat.completions.create(model=self.model, messages=msgs)
-            return resp.choices[0].message.content
+
+    def answer(self, question: str, contexts: List[Dict]):
+        msgs = self._messages(question, contexts)
+        resp = self.client.chat.completions.create(model=self.model, messages=msgs)
+        return resp.choices[0].message.content
+
+    async def aanswer(self, question: str, contexts: List[Dict]):
+        msgs = self._messages(question, contexts)
+        resp = await self.aclient.chat.completions.create(model=self.model, messages=msgs)
+        return resp.choices[0].message.content
+
+    async def astream(self, question: str, contexts: List[Dict]) -> AsyncIterator[str]:
+        """Yield answer tokens as the model produces them."""
+        msgs = self._messages(question, contexts)
+        stream = await self.aclient.chat.completions.create(model=self.model, messages=msgs, stream=True)
+        async for chunk in stream:
+            # Azure sends an initial chunk with no choices (content filter results)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,56 @@
+
+import re
+from typing import Dict, List
+from .tokens import count_tokens, split_tokens
+
+_WORD = re.compile(r"\w+")
+# Word overlap above which two chunks count as the same passage (e.g. chunk overlap, repeated boilerplate)
+NEAR_DUPLICATE = 0.8
+
+def _words(text: str) -> set:
+    return set(_WORD.findall(text.lower()))
+
+def mmr(hits: List[Dict], k: int, lambda_: float, key: str = "rerank_score") -> List[Dict]:
+    """
+    Maximal marginal relevance: pick `k` hits balancing relevance (`key`,
+    min-max normalized) against word overlap (Jaccard) with hits already
+    picked, so overlapping or repeated chunks don't crowd out other evidence.
+    Candidates that are near-duplicates of a picked hit are dropped outright.
+    """
+    if len(hits) <= 1:
+        return hits[:k]
+    rel = [h.get(key, h.get("score")) or 0.0 for h in hits]
+    lo, hi = min(rel), max(rel)
+    rel = [(r - lo) / (hi - lo) if hi > lo else 1.0 for r in rel]
+    words = [_words(h["content"]) for h in hits]
+    picked: List[int] = []
+    left = list(range(len(hits)))
+
+    def jaccard(i, j):
+        return len(words[i] & words[j]) / (len(words[i] | words[j]) or 1)
+
+    while left and len(picked) < k:
+        best = max(left, key=lambda i: lambda_ * rel[i] - (1 - lambda_) * max(
+            (jaccard(i, j) for j in picked), default=0.0
+        ))
+        picked.append(best)
+        left = [i for i in left if i != best and jaccard(i, best) < NEAR_DUPLICATE]
+    return [hits[i] for i in picked]
+
+def pack_context(hits: List[Dict], budget: int) -> List[Dict]:
+    """
+    Keep hits in order until `budget` prompt tokens are used. The first hit
+    that doesn't fit is truncated when a useful part of it still fits;
+    everything after it is dropped.
+    """
+    packed, used = [], 0
+    for h in hits:
+        n = count_tokens(h["content"])
+        if used + n <= budget:
+            packed.append(h)
+            used += n
+            continue
+        if budget - used >= 100:
+            packed.append({**h, "content": split_tokens(h["content"], budget - used)[0]})
+        break
+    return packed
@@ -0,0 +1,161 @@
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from psycopg2.extras import execute_values
+from db import engine
+from settings import settings
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embeddings keyed by (embedding model, sha256 of text).
+
+    The front tier is an in-process LRU of `EMBED_CACHE_MEMORY_ITEMS` vectors; the
+    back tier is the `embedding_cache` table in Postgres, trimmed to
+    `EMBED_CACHE_MAX_ROWS` least-recently-used rows (memory only with
+    VECTOR_STORE=local). Cache failures are logged and treated as misses,
+    never as embedding failures.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.memory_items = settings.embed_cache_memory_items
+        self.max_rows = settings.embed_cache_max_rows
+        self.db_tier = settings.vector_store != "local"
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts_since_evict = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+    def stats(self) -> Dict:
+        total = self.memory_hits + self.db_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / total if total else 0.0,
+            "memory_items": len(self._lru),
+        }
+
+    def _remember(self, key: str, vec: List[float]):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for k in keys:
+                vec = self._lru.get(k)
+                if vec is not None:
+                    self._lru.move_to_end(k)
+                    found[k] = vec
+        in_memory = set(found)
+        missing = list({k for k in keys if k not in found})
+        if missing and self.db_tier:
+            try:
+                with engine.begin() as conn:
+                    rows = conn.exec_driver_sql(
+                        "UPDATE embedding_cache SET last_used = now() "
+                        "WHERE model = %s AND text_hash = ANY(%s) RETURNING text_hash, embedding",
+                        (self.model_name, missing),
+                    ).fetchall()
+            except Exception as e:
+                print(f"[CACHE] Embedding cache lookup failed: {e}")
+                rows = []
+            with self._lock:
+                for k, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[k] = vec
+                    self._remember(k, vec)
+        # Per occurrence, all three: a text repeated in the batch counts once per repeat
+        with self._lock:
+            for k in keys:
+                if k in in_memory:
+                    self.memory_hits += 1
+                elif k in found:
+                    self.db_hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(k, vec)
+            self._inserts_since_evict += len(items)
+            evict = self._inserts_since_evict >= max(1000, self.max_rows // 100)
+            if evict:
+                self._inserts_since_evict = 0
+        if not self.db_tier:
+            return
+        rows = [(self.model_name, k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()]
+        try:
+            with engine.begin() as conn:
+                with conn.connection.cursor() as cur:
+                    execute_values(
+                        cur,
+                        "INSERT INTO embedding_cache (model, text_hash, embedding) VALUES %s "
+                        "ON CONFLICT (model, text_hash) DO NOTHING",
+                        rows,
+                    )
+                if evict:
+                    self._evict(conn)
+        except Exception as e:
+            print(f"[CACHE] Embedding cache write failed: {e}")
+
+    def _evict(self, conn):
+        """Trim the table to `max_rows`, dropping the least recently used entries."""
+        excess = conn.exec_driver_sql("SELECT count(*) FROM embedding_cache").scalar() - self.max_rows
+        if excess > 0:
+            conn.exec_driver_sql(
+                "DELETE FROM embedding_cache WHERE ctid IN "
+                "(SELECT ctid FROM embedding_cache ORDER BY last_used LIMIT %s)",
+                (excess,),
+            )
+            print(f"[CACHE] Evicted {excess} embedding cache rows")
+
+def cached_embed(cache: Optional[EmbeddingCache], texts: List[str], embed_fn) -> List[List[float]]:
+    """Serve `texts` from `cache` where possible and embed only the misses (once per distinct text)."""
+    if cache is None:
+        return embed_fn(texts)
+    keys = [cache.key(t) for t in texts]
+    found = cache.get_many(keys)
+    todo: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in todo:
+            todo[k] = t
+    if todo:
+        fresh = dict(zip(todo.keys(), embed_fn(list(todo.values()))))
+        cache.put_many(fresh)
+        found.update(fresh)
+    return [found[k] for k in keys]
+
+async def acached_embed(cache: Optional[EmbeddingCache], texts: List[str], aembed_fn) -> List[List[float]]:
+    """Async counterpart of `cached_embed`; cache I/O runs in a worker thread."""
+    if cache is None:
+        return await aembed_fn(texts)
+    keys = [cache.key(t) for t in texts]
+    found = await asyncio.to_thread(cache.get_many, keys)
+    todo: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in todo:
+            todo[k] = t
+    if todo:
+        fresh = dict(zip(todo.keys(), await aembed_fn(list(todo.values()))))
+        await asyncio.to_thread(cache.put_many, fresh)
+        found.update(fresh)
+    return [found[k] for k in keys]
@@ -1,29 +1,108 @@
 
-from typing import List
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import numpy as np
 from settings import settings
+from .embed_cache import EmbeddingCache, cached_embed, acached_embed
+from .tokens import count_tokens
+
+# Provider limits per embeddings request (OpenAI / Azure OpenAI)
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+
+def pack_batches(texts: List[str], max_tokens: int, max_items: int = MAX_INPUTS_PER_REQUEST) -> List[List[int]]:
+    """Group text indices into consecutive batches that stay under both request limits."""
+    batches, current, budget = [], [], 0
+    for i, t in enumerate(texts):
+        n = min(count_tokens(t), MAX_TOKENS_PER_INPUT)
+        if current and (budget + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, budget = [], 0
+        current.append(i)
+        budget += n
+    if current:
+        batches.append(current)
+    return batches
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    """Honor Retry-After / retry-after-ms when the provider sends them, else exponential backoff."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+def supports_dimensions(model: str) -> bool:
+    """Whether an OpenAI/Azure embedding model accepts `dimensions=` (ada-002 rejects it with a 400)."""
+    return "text-embedding-3" in model
+
+def _azure_model(deployment: str) -> str:
+    return settings.azure_embed_model if settings.azure_embed_model and deployment == settings.azure_embed else deployment
+
+def configured_model() -> str:
+    """
+    Embedding model selected by the environment, in `Embedder.model_name` form
+    (e.g. "openai:text-embedding-3-large@1024"), without loading it.
+    """
+    if settings.azure_base and settings.azure_key:
+        model, truncatable = f"azure:{settings.azure_embed}", supports_dimensions(_azure_model(settings.azure_embed))
+    elif settings.openai_key:
+        model, truncatable = f"openai:{settings.openai_embed_model}", supports_dimensions(settings.openai_embed_model)
+    else:
+        model, truncatable = f"st:{settings.st_model}", True
+    return f"{model}@{settings.embed_dimensions}" if settings.embed_dimensions and truncatable else model
 
 class Embedder:
-    def __init__(self):
-        self.mode = None
+    def __init__(self, model: Optional[str] = None):
+        """
+        `model` is a `model_name` ("azure:<deployment>", "openai:<model>" or
+        "st:<sentence-transformers model>", optionally with "@<dimensions>");
+        the default is the one configured in the environment. API providers use
+        the credentials from the environment.
+        """
+        model = model or configured_model()
+        self.mode, _, name = model.partition(":")
+        name, _, dims = name.rpartition("@") if "@" in name else (name, "", "")
+        dimensions = int(dims) if dims else None
+        if dimensions and self.mode == "azure" and not supports_dimensions(_azure_model(name)):
+            raise ValueError(f"{model}: the deployment's model doesn't accept dimensions (set AZURE_OPENAI_EMBED_MODEL)")
+        if dimensions and self.mode == "openai" and not supports_dimensions(name):
+            raise ValueError(f"{model}: {name} doesn't accept dimensions")
+        # Sent as `dimensions=` to the API; validated above so ada-002 never sees it
+        self.dimensions = dimensions
+        self.model_name = model  # Identifies the embedding space (stored in the ingest manifest)
         self.dimension = 1536  # Default dimension
-        
-        if settings.azure_base and settings.azure_key:
-            from openai import AzureOpenAI
-            self.client = AzureOpenAI(
+
+        if self.mode == "azure":
+            if not (settings.azure_base and settings.azure_key):
+                raise ValueError(f"{model} needs AZURE_OPENAI_API_BASE and AZURE_OPENAI_API_KEY")
+            from openai import AzureOpenAI, AsyncAzureOpenAI
+            azure_kwargs = dict(
                 api_key=settings.azure_key,
                 api_version=settings.azure_version,
                 azure_endpoint=settings.azure_base,
+                max_retries=0,  # retries are handled in _create / _acreate
             )
-            self.deployment = settings.azure_embed
-            self.mode = "azure"
+            self.client = AzureOpenAI(**azure_kwargs)
+            self.aclient = AsyncAzureOpenAI(**azure_kwargs)
+            self.deployment = name
             # Azure embeddings are typically 1536 dimensions
-            self.dimension = 1536
-        elif settings.openai_key:
-            from openai import OpenAI
-            self.client = OpenAI(api_key=settings.openai_key)
-            self.model = settings.openai_embed_model
-            self.mode = "openai"
+            self.dimension = dimensions or 1536
+        elif self.mode == "openai":
+            if not settings.openai_key:
+                raise ValueError(f"{model} needs OPENAI_API_KEY")
+            from openai import OpenAI, AsyncOpenAI
+            self.client = OpenAI(api_key=settings.openai_key, max_retries=0)
+            self.aclient = AsyncOpenAI(api_key=settings.openai_key, max_retries=0)
+            self.model = name
             # Detect dimension based on model
             if "text-embedding-3-large" in self.model:
                 self.dimension = 3072
@@ -34,19 +113,90 @@ class Embedder:
             else:
                 # Default for unknown models
                 self.dimension = 1536
-        else:
+            if dimensions:
+                self.dimension = dimensions
+        elif self.mode == "st":
             from sentence_transformers import SentenceTransformer
-            self.st = SentenceTransformer(settings.st_model)
-            self.mode = "st"
+            self.st = SentenceTransformer(name, truncate_dim=dimensions)
             # Get dimension from the model
             self.dimension = self.st.get_sentence_embedding_dimension()
+            if dimensions:
+                self.model_name = f"st:{name}@{self.dimension}"
+        else:
+            raise ValueError(f"Unknown embedding provider in {model!r}; expected azure:, openai: or st:")
+
+        self.cache = EmbeddingCache(self.model_name) if settings.embed_cache_enabled else None
+
+    def _create(self, texts: List[str]) -> List[List[float]]:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        model = self.deployment if self.mode == "azure" else self.model
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        for attempt in range(settings.embed_max_retries + 1):
+            try:
+                res = self.client.embeddings.create(input=texts, model=model, **extra)
+                return [d.embedding for d in sorted(res.data, key=lambda d: d.index)]
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == settings.embed_max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[EMBED] {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{settings.embed_max_retries})")
+                time.sleep(delay)
+
+    async def _acreate(self, texts: List[str]) -> List[List[float]]:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        model = self.deployment if self.mode == "azure" else self.model
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        for attempt in range(settings.embed_max_retries + 1):
+            try:
+                res = await self.aclient.embeddings.create(input=texts, model=model, **extra)
+                return [d.embedding for d in sorted(res.data, key=lambda d: d.index)]
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == settings.embed_max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[EMBED] {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{settings.embed_max_retries})")
+                await asyncio.sleep(delay)
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of `embed` for request handlers; never blocks the event loop."""
+        return await acached_embed(self.cache, texts, self._aembed_uncached)
+
+    async def _aembed_uncached(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if self.mode in ("azure", "openai"):
+            payloads = [[texts[i] for i in b] for b in pack_batches(texts, settings.embed_batch_tokens)]
+            sem = asyncio.Semaphore(settings.embed_concurrency)
+
+            async def run(batch):
+                async with sem:
+                    return await self._acreate(batch)
+
+            results = await asyncio.gather(*(run(b) for b in payloads))
+            return [vec for res in results for vec in res]
+        # SentenceTransformer inference is CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self._embed_uncached, texts)
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        if self.mode == "azure":
-            res = self.client.embeddings.create(input=texts, model=self.deployment)
-            return [d.embedding for d in res.data]
-        if self.mode == "openai":
-            res = self.client.embeddings.create(input=texts, model=self.model)
-            return [d.embedding for d in res.data]
-        embs = self.st.encode(texts, normalize_embeddings=True)
+        """Embed `texts`, serving repeated texts from the embedding cache."""
+        return cached_embed(self.cache, texts, self._embed_uncached)
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed `texts`, preserving order.
+        API modes pack the input into token-budgeted requests and send up to
+        `EMBED_CONCURRENCY` of them at once; SentenceTransformer mode encodes
+        with a large batch size.
+        """
+        if not texts:
+            return []
+        if self.mode in ("azure", "openai"):
+            batches = pack_batches(texts, settings.embed_batch_tokens)
+            payloads = [[texts[i] for i in b] for b in batches]
+            if len(payloads) == 1:
+                return self._create(payloads[0])
+            with ThreadPoolExecutor(max_workers=min(settings.embed_concurrency, len(payloads))) as pool:
+                results = list(pool.map(self._create, payloads))
+            return [vec for res in results for vec in res]
+        embs = self.st.encode(texts, batch_size=settings.st_batch_size, normalize_embeddings=True)
         return [e.tolist() for e in embs]
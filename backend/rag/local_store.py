@@ -0,0 +1,663 @@
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from settings import settings
+
+_WORD = re.compile(r"\w+")
+# Rows scored per matrix product; bounds the float32 temporaries of a scan
+SCAN_BLOCK = 65536
+INITIAL_CAPACITY = 1024
+# Metadata columns that can be filtered on by equality (same as rag.retriever.FILTERS)
+FILTERS = ("source", "site", "area", "doc_type")
+COLUMNS = "id, source, uri, page, chunk_id, content, content_hash, site, area, doc_type"
+# How often a process re-checks whether another one has written to the store
+REFRESH_SECONDS = 1.0
+
+def rrf_fuse(ranked: List[List[int]], rrf_k: int) -> Dict[int, float]:
+    """
+    Reciprocal rank fusion of best-first id lists: each id scores
+    sum(1 / (rrf_k + rank)) over the lists it appears in. Returned best first;
+    ties keep the order in which ids were first seen.
+    """
+    fused: Dict[int, float] = {}
+    for ids in ranked:
+        for rank, row_id in enumerate(ids, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (rrf_k + rank)
+    return dict(sorted(fused.items(), key=lambda kv: kv[1], reverse=True))
+
+# Same tables and column names as the Postgres schema in db.init_db, so the
+# manifest, job and SharePoint SQL runs unchanged on either database.
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+      id INTEGER PRIMARY KEY,
+      source TEXT,
+      uri TEXT,
+      page INTEGER,
+      chunk_id TEXT,
+      content TEXT,
+      content_hash TEXT,
+      site TEXT,
+      area TEXT,
+      doc_type TEXT,
+      ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_documents_uri ON documents(uri)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_site_area ON documents(site, area)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_doc_type ON documents(doc_type)",
+    # Lexical side of hybrid retrieval, kept in sync with documents by triggers
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(content, content='documents', content_rowid='id')",
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+      INSERT INTO documents_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+      INSERT INTO documents_fts(documents_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF content ON documents BEGIN
+      INSERT INTO documents_fts(documents_fts, rowid, content) VALUES ('delete', old.id, old.content);
+      INSERT INTO documents_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+      uri TEXT PRIMARY KEY,
+      source TEXT,
+      size INTEGER,
+      mtime REAL,
+      content_hash TEXT,
+      embed_model TEXT,
+      site TEXT,
+      area TEXT,
+      updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+      id TEXT PRIMARY KEY,
+      kind TEXT NOT NULL,
+      target TEXT,
+      status TEXT NOT NULL,
+      progress TEXT,
+      error TEXT,
+      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      started_at TEXT,
+      finished_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_created_at ON ingest_jobs(created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS sharepoint_delta (
+      drive_id TEXT NOT NULL,
+      folder TEXT NOT NULL,
+      delta_link TEXT,
+      updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (drive_id, folder)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sharepoint_items (
+      drive_id TEXT NOT NULL,
+      folder TEXT NOT NULL,
+      item_id TEXT NOT NULL,
+      parent_id TEXT,
+      name TEXT,
+      is_folder BOOLEAN NOT NULL,
+      etag TEXT,
+      path TEXT,
+      PRIMARY KEY (drive_id, folder, item_id)
+    )
+    """,
+]
+
+class LocalStoreMismatch(RuntimeError):
+    """The store on disk was built for another embedding dimension; retrying can't fix it."""
+
+def _now() -> str:
+    # Postgres' now(), in SQLite's CURRENT_TIMESTAMP format
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+class LocalVectorStore:
+    """
+    Embedded alternative to pgvector for plants without a Postgres server
+    (`VECTOR_STORE=local`). Everything lives under `LOCAL_STORE_DIR`:
+
+    - store.db: SQLite with the chunk metadata, the ingestion manifest, jobs
+      and an FTS5 index for lexical/hybrid retrieval
+    - vectors.bin: unit-normalized embeddings as a memory-mapped float16 or
+      int8 matrix (`LOCAL_STORE_DTYPE`; int8 adds a per-row scale in
+      scales.bin), one row per documents.id
+    - ivf_centroids.npy / ivf_lists.bin: an IVF index (spherical k-means),
+      trained by `ensure_index()` once the store holds `LOCAL_INDEX_MIN_ROWS`
+      vectors and searched with `IVFFLAT_PROBES` lists; smaller stores are
+      scanned exactly
+
+    Searches score blocks of rows with one matrix product for all queries at
+    once (`search_vectors`). Writes must come from a single process; other
+    processes (e.g. more uvicorn workers) serve searches and pick up its
+    writes within `REFRESH_SECONDS`, via a version counter in store_meta.
+    """
+
+    def __init__(self, path: str):
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.engine = create_engine(
+            f"sqlite:///{self.dir / 'store.db'}", connect_args={"check_same_thread": False, "timeout": 30}
+        )
+        event.listen(self.engine, "connect", self._on_connect)
+        self.session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._lock = threading.RLock()
+        self.dim: Optional[int] = None
+        self.dtype: Optional[str] = None
+        self._vectors = None
+        self._scales = None
+        self._alive = np.zeros(0, dtype=bool)
+        # (centroids, lists) swapped together so searches see a consistent index
+        self._ivf: Optional[tuple] = None
+        # store_meta 'version' the arrays above reflect, and when it was last compared
+        self._version = None
+        self._checked = 0.0
+
+    @staticmethod
+    def _on_connect(dbapi_conn, _record):
+        dbapi_conn.create_function("now", 0, _now)
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode = WAL")  # readers don't block the ingestion writer
+        cur.execute("PRAGMA synchronous = NORMAL")
+        cur.close()
+
+    # ---- lifecycle ------------------------------------------------------
+
+    def init(self, dimension: int):
+        """Create the schema (idempotent) and open the vector files for `dimension`-d embeddings."""
+        with self._lock, self.engine.begin() as conn:
+            for statement in _SCHEMA:
+                conn.execute(text(statement))
+            meta = dict(conn.execute(text("SELECT key, value FROM store_meta")).fetchall())
+            if not meta:
+                meta = {"dimension": str(dimension), "dtype": settings.local_store_dtype}
+                conn.execute(text("INSERT INTO store_meta (key, value) VALUES (:key, :value)"),
+                             [{"key": k, "value": v} for k, v in meta.items()])
+                print(f"[STORE] Created local vector store in {self.dir} ({meta['dtype']}, dim={dimension})")
+            if int(meta["dimension"]) != dimension:
+                raise LocalStoreMismatch(
+                    f"Local vector store {self.dir} holds {meta['dimension']}-d embeddings but the model "
+                    f"produces {dimension}-d; remove the directory to re-ingest with the new model"
+                )
+            if meta["dtype"] != settings.local_store_dtype:
+                print(f"[STORE] Store was created as {meta['dtype']}; ignoring LOCAL_STORE_DTYPE={settings.local_store_dtype}")
+            self._open(conn, int(meta["dimension"]), meta["dtype"])
+
+    def _ensure_open(self):
+        if self.dim is not None:
+            return
+        with self._lock, self.engine.connect() as conn:
+            if self.dim is not None:
+                return
+            try:
+                meta = dict(conn.execute(text("SELECT key, value FROM store_meta")).fetchall())
+            except Exception:
+                meta = {}
+            if not meta:
+                raise RuntimeError(f"Local vector store {self.dir} is not initialized")
+            self._open(conn, int(meta["dimension"]), meta["dtype"])
+
+    def _open(self, conn, dim: int, dtype: str):
+        first = self.dim is None
+        self.dim, self.dtype = dim, dtype
+        self._version = self._read_version(conn)
+        self._checked = time.monotonic()
+        capacity = max(INITIAL_CAPACITY, self._file_rows("vectors.bin", self._row_bytes()))
+        self._vectors = self._map("vectors.bin", np.float16 if dtype == "float16" else np.int8, capacity, dim)
+        if dtype == "int8":
+            self._scales = self._map("scales.bin", np.float32, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        ids = np.fromiter((r[0] for r in conn.execute(text("SELECT id FROM documents"))), dtype=np.int64)
+        if len(ids) and ids.max() >= capacity:
+            raise RuntimeError(f"{self.dir / 'vectors.bin'} is shorter than the documents table; re-ingest")
+        alive[ids] = True
+        self._alive = alive
+        centroids = self.dir / "ivf_centroids.npy"
+        self._ivf = (np.load(centroids), self._map("ivf_lists.bin", np.int32, capacity)) if centroids.exists() else None
+        if first:
+            print(f"[STORE] Opened local vector store: {len(ids)} vectors, "
+                  f"{'IVF lists=%d' % len(self._ivf[0]) if self._ivf else 'exact scan'}")
+
+    @staticmethod
+    def _read_version(conn) -> str:
+        return conn.execute(text("SELECT value FROM store_meta WHERE key = 'version'")).scalar() or "0"
+
+    def _bump_version(self, conn):
+        """Tell other processes (inside the writing transaction) that their arrays are stale."""
+        conn.execute(text(
+            "INSERT INTO store_meta (key, value) VALUES ('version', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        ))
+        self._version = self._read_version(conn)
+
+    def _refresh(self, conn):
+        """Reopen the vector files if another process wrote since we last looked."""
+        now = time.monotonic()
+        if now - self._checked < REFRESH_SECONDS:
+            return
+        self._checked = now
+        if self._read_version(conn) == self._version:
+            return
+        with self._lock:
+            self._open(conn, self.dim, self.dtype)
+
+    def close(self):
+        with self._lock:
+            for arr in (self._vectors, self._scales, self._ivf[1] if self._ivf else None):
+                if arr is not None:
+                    arr.flush()
+        self.engine.dispose()
+
+    # ---- vector files ---------------------------------------------------
+
+    def _row_bytes(self) -> int:
+        return self.dim * (2 if self.dtype == "float16" else 1)
+
+    def _file_rows(self, name: str, row_bytes: int) -> int:
+        path = self.dir / name
+        return path.stat().st_size // row_bytes if path.exists() else 0
+
+    def _map(self, name: str, dtype, rows: int, dim: Optional[int] = None):
+        """Memory-map `name` as a (rows[, dim]) array, growing the file (zero-filled) if needed."""
+        path = self.dir / name
+        shape = (rows, dim) if dim else (rows,)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _reserve(self, max_id: int):
+        """Grow the vector files (doubling) so row `max_id` exists."""
+        capacity = len(self._alive)
+        if max_id < capacity:
+            return
+        capacity = max(max_id + 1, capacity * 2)
+        for arr in (self._vectors, self._scales, self._ivf[1] if self._ivf else None):
+            if arr is not None:
+                arr.flush()
+        self._vectors = self._map("vectors.bin", self._vectors.dtype, capacity, self.dim)
+        if self._scales is not None:
+            self._scales = self._map("scales.bin", np.float32, capacity)
+        if self._ivf:
+            self._ivf = (self._ivf[0], self._map("ivf_lists.bin", np.int32, capacity))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _encode(self, vecs) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Return (normalized float32, stored rows, int8 scales or None)."""
+        v = np.asarray(vecs, dtype=np.float32)
+        norms = np.linalg.norm(v, axis=1, keepdims=True)
+        v = v / np.where(norms > 0, norms, 1.0)
+        if self.dtype == "float16":
+            return v, v.astype(np.float16), None
+        scales = np.abs(v).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return v, np.rint(v / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _put_vectors(self, ids: List[int], vecs):
+        if not ids:
+            return
+        idx = np.asarray(ids, dtype=np.int64)
+        self._reserve(int(idx.max()))
+        normalized, rows, scales = self._encode(vecs)
+        self._vectors[idx] = rows
+        if scales is not None:
+            self._scales[idx] = scales
+        if self._ivf:
+            centroids, lists = self._ivf
+            lists[idx] = np.argmax(normalized @ centroids.T, axis=1)
+            lists.flush()
+        self._vectors.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    @staticmethod
+    def _scores(vectors, scales, rows, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores (len(rows), n_queries) of stored `rows` (slice or id array) against unit queries."""
+        scores = vectors[rows].astype(np.float32) @ queries.T
+        if scales is not None:
+            scores *= scales[rows][:, None]
+        return scores
+
+    # ---- search ---------------------------------------------------------
+
+    def search_vectors(self, query_embs, k: int, candidates: Optional[np.ndarray] = None,
+                       probes: Optional[int] = None) -> List[tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-`k` (ids, cosine scores) for each query embedding, best first.
+
+        `candidates` restricts the search to those ids (exact scan over them).
+        Otherwise the IVF index, when trained, narrows each query to its
+        `probes` nearest lists; without one all rows are scanned, with every
+        block scored against all queries in a single matrix product.
+        """
+        self._ensure_open()
+        queries, _, _ = self._encode(np.atleast_2d(np.asarray(query_embs, dtype=np.float32)))
+        # Snapshot: a concurrent write may swap in grown arrays
+        vectors, scales, alive, ivf = self._vectors, self._scales, self._alive, self._ivf
+        if candidates is not None:
+            ids = candidates[alive[candidates]]
+            return self._topk(vectors, scales, queries, k, [ids[i:i + SCAN_BLOCK] for i in range(0, len(ids), SCAN_BLOCK)])
+        if ivf is None:
+            n = int(np.flatnonzero(alive)[-1]) + 1 if alive.any() else 0
+            blocks = [slice(i, min(n, i + SCAN_BLOCK)) for i in range(0, n, SCAN_BLOCK)]
+            return self._topk(vectors, scales, queries, k, blocks, alive)
+        centroids, lists = ivf
+        nprobe = min(probes or settings.ivfflat_probes, len(centroids))
+        nearest = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for q, probe in zip(queries, nearest):
+            wanted = np.zeros(len(centroids), dtype=bool)
+            wanted[probe] = True
+            ids = np.flatnonzero(wanted[lists[:len(alive)]] & alive)
+            blocks = [ids[i:i + SCAN_BLOCK] for i in range(0, len(ids), SCAN_BLOCK)]
+            results += self._topk(vectors, scales, q[None, :], k, blocks)
+        return results
+
+    def _topk(self, vectors, scales, queries: np.ndarray, k: int, blocks: list, alive=None):
+        nq = len(queries)
+        best_ids = np.empty((nq, 0), dtype=np.int64)
+        best = np.empty((nq, 0), dtype=np.float32)
+        for rows in blocks:
+            ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+            if not len(ids):
+                continue
+            scores = self._scores(vectors, scales, rows, queries).T
+            if alive is not None:
+                scores[:, ~alive[rows]] = -np.inf
+            best = np.concatenate([best, scores], axis=1)
+            best_ids = np.concatenate([best_ids, np.broadcast_to(ids, (nq, len(ids)))], axis=1)
+            if best.shape[1] > k:
+                top = np.argpartition(-best, k - 1, axis=1)[:, :k]
+                best = np.take_along_axis(best, top, axis=1)
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+        results = []
+        for ids, scores in zip(best_ids, best):
+            order = np.argsort(-scores)
+            order = order[np.isfinite(scores[order])]
+            results.append((ids[order], scores[order]))
+        return results
+
+    @staticmethod
+    def _where(values: Dict[str, Optional[str]], uri_prefix: Optional[str],
+               ingested_after: Optional[str]) -> tuple[str, dict]:
+        where, params = [], {}
+        for f in FILTERS:
+            if values.get(f):
+                where.append(f"d.{f} = :{f}")
+                params[f] = values[f]
+        if uri_prefix:
+            where.append("d.uri LIKE :uri_prefix ESCAPE '\\'")
+            params["uri_prefix"] = uri_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        if ingested_after:
+            where.append("d.ingested_at >= datetime(:ingested_after)")
+            params["ingested_after"] = ingested_after
+        return " AND ".join(where), params
+
+    def search(
+        self,
+        query_emb: list[float],
+        query_text: Optional[str] = None,
+        mode: str = "vector",
+        k: int = 8,
+        source: Optional[str] = None,
+        uri_prefix: Optional[str] = None,
+        probes: Optional[int] = None,
+        site: Optional[str] = None,
+        area: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        ingested_after: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Same contract as `Retriever.search`: vector, lexical (FTS5 bm25, any
+        term may match) or hybrid (reciprocal rank fusion of both) retrieval
+        with the same metadata filters, returning rows with `score` (cosine)
+        and, outside vector mode, `rrf`.
+        """
+        self._ensure_open()
+        where, params = self._where(
+            {"source": source, "site": site, "area": area, "doc_type": doc_type}, uri_prefix, ingested_after
+        )
+        candidates = max(k * settings.hybrid_candidates_factor, k)
+        with self.engine.connect() as conn:
+            self._refresh(conn)
+            # Snapshot: a concurrent write or refresh may swap in new arrays
+            vectors, scales, alive = self._vectors, self._scales, self._alive
+            allowed = None
+            if where:
+                allowed = np.fromiter(
+                    (r[0] for r in conn.execute(text(f"SELECT d.id FROM documents d WHERE {where}"), params)),
+                    dtype=np.int64,
+                )
+            ranked: List[List[int]] = []
+            scores: Dict[int, float] = {}
+            if mode != "lexical":
+                ids, sims = self.search_vectors(query_emb, k if mode == "vector" else candidates, allowed, probes)[0]
+                ranked.append(ids.tolist())
+                scores.update(zip(ids.tolist(), sims.tolist()))
+            terms = list(dict.fromkeys(_WORD.findall((query_text or "").lower())))
+            if mode != "vector" and terms:
+                # Rows committed after our arrays were loaded have no vector we can read yet
+                ranked.append([r[0] for r in conn.execute(text(
+                    f"""
+                    SELECT d.id FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                    WHERE documents_fts MATCH :match {"AND " + where if where else ""}
+                    ORDER BY bm25(documents_fts) LIMIT :candidates
+                    """
+                ), {**params, "match": " OR ".join(f'"{t}"' for t in terms), "candidates": candidates})
+                    if r[0] < len(alive) and alive[r[0]]])
+            if mode == "vector":
+                top = ranked[0]
+                rrf = None
+            else:
+                rrf = rrf_fuse(ranked, settings.rrf_k)
+                top = list(rrf)[:k]
+                missing = [i for i in top if i not in scores]
+                if missing:
+                    # Lexical-only hits still report their cosine score
+                    q, _, _ = self._encode([query_emb])
+                    idx = np.asarray(missing, dtype=np.int64)
+                    scores.update(zip(missing, self._scores(vectors, scales, idx, q)[:, 0].tolist()))
+            if not top:
+                return []
+            rows = {
+                r["id"]: dict(r)
+                for r in conn.execute(
+                    text(f"SELECT {COLUMNS} FROM documents WHERE id IN ({','.join(str(int(i)) for i in top)})")
+                ).mappings().all()
+            }
+        hits = []
+        for row_id in top:
+            row = rows.get(row_id)
+            if row is None:
+                continue  # deleted since it was scored
+            row["score"] = float(scores[row_id])
+            if rrf is not None:
+                row["rrf"] = rrf[row_id]
+            hits.append(row)
+        return hits
+
+    # ---- writes ---------------------------------------------------------
+
+    def write(self, batch: list, embed_model: str):
+        """
+        Store a batch of ingestion `FileWork`s in one SQLite transaction:
+        new and changed chunks with their vectors, deletion of stale chunks,
+        site/area/doc_type refreshes and (for complete files) manifest rows.
+        """
+        self._ensure_open()
+        with self._lock:
+            with self.engine.begin() as conn:
+                next_id = conn.execute(text("SELECT coalesce(max(id), 0) + 1 FROM documents")).scalar()
+                inserts, updates, stale, manifest, metadata = [], [], [], [], []
+                vec_ids, vecs = [], []
+                for work in batch:
+                    for (row_id, page_num, chunk_id, chunk, h), vec in zip(work.pending, work.vectors):
+                        row = {"source": work.source, "page": page_num, "content": chunk, "content_hash": h}
+                        if row_id is None:
+                            row_id = next_id
+                            next_id += 1
+                            inserts.append({**row, "id": row_id, "uri": work.uri, "chunk_id": chunk_id,
+                                            "site": work.site, "area": work.area, "doc_type": work.doc_type})
+                        else:
+                            updates.append({**row, "id": row_id})
+                        vec_ids.append(row_id)
+                        vecs.append(vec)
+                    stale += work.stale_ids
+                    if not work.partial:
+                        manifest.append({"uri": work.uri, "source": work.source, "size": work.size,
+                                         "mtime": work.mtime, "content_hash": work.content_hash,
+                                         "embed_model": embed_model, "site": work.site, "area": work.area})
+                        metadata.append({"uri": work.uri, "site": work.site, "area": work.area,
+                                         "doc_type": work.doc_type})
+                # Vectors first: a crash before commit leaves unused rows in vectors.bin, never a chunk without one
+                self._put_vectors(vec_ids, vecs)
+                if inserts:
+                    conn.execute(text(
+                        """
+                        INSERT INTO documents (id, source, uri, page, chunk_id, content, content_hash, site, area, doc_type)
+                        VALUES (:id, :source, :uri, :page, :chunk_id, :content, :content_hash, :site, :area, :doc_type)
+                        """
+                    ), inserts)
+                if updates:
+                    conn.execute(text(
+                        """
+                        UPDATE documents SET source = :source, page = :page, content = :content,
+                          content_hash = :content_hash, ingested_at = now()
+                        WHERE id = :id
+                        """
+                    ), updates)
+                if stale:
+                    conn.execute(text("DELETE FROM documents WHERE id = :id"), [{"id": i} for i in stale])
+                if metadata:
+                    conn.execute(text(
+                        """
+                        UPDATE documents SET site = :site, area = :area, doc_type = :doc_type
+                        WHERE uri = :uri AND (site IS NOT :site OR area IS NOT :area OR doc_type IS NOT :doc_type)
+                        """
+                    ), metadata)
+                self._bump_version(conn)
+                if manifest:
+                    conn.execute(text(
+                        """
+                        INSERT INTO ingest_manifest (uri, source, size, mtime, content_hash, embed_model, site, area)
+                        VALUES (:uri, :source, :size, :mtime, :content_hash, :embed_model, :site, :area)
+                        ON CONFLICT (uri) DO UPDATE SET
+                          source = excluded.source, size = excluded.size, mtime = excluded.mtime,
+                          content_hash = excluded.content_hash, embed_model = excluded.embed_model,
+                          site = excluded.site, area = excluded.area, updated_at = now()
+                        """
+                    ), manifest)
+            self._alive[np.asarray(stale, dtype=np.int64)] = False
+            self._alive[np.asarray(vec_ids, dtype=np.int64)] = True
+
+    def delete_file(self, uri: str):
+        """Remove every chunk and the manifest row of `uri`."""
+        self._ensure_open()
+        with self._lock:
+            with self.engine.begin() as conn:
+                ids = [r[0] for r in conn.execute(text("SELECT id FROM documents WHERE uri = :uri"), {"uri": uri})]
+                conn.execute(text("DELETE FROM documents WHERE uri = :uri"), {"uri": uri})
+                conn.execute(text("DELETE FROM ingest_manifest WHERE uri = :uri"), {"uri": uri})
+                self._bump_version(conn)
+            self._alive[np.asarray(ids, dtype=np.int64)] = False
+
+    # ---- index ----------------------------------------------------------
+
+    def ensure_index(self, rebuild: bool = False):
+        """
+        Train (or retrain) the IVF index once the store is big enough for it to
+        beat an exact scan. Like pgvector's IVFFLAT, lists default to rows/1000
+        (sqrt(rows) past 1M) and are retrained when the row count drifts 2x.
+        """
+        self._ensure_open()
+        if settings.vector_index == "none":
+            return
+        with self._lock:
+            ids = np.flatnonzero(self._alive)
+            rows = len(ids)
+            if rows < settings.local_index_min_rows:
+                return
+            n_lists = settings.ivfflat_lists or (max(10, rows // 1000) if rows <= 1_000_000 else int(rows ** 0.5))
+            if self._ivf and not rebuild and n_lists / 2 <= len(self._ivf[0]) <= n_lists * 2:
+                return
+            print(f"[STORE] Training IVF index: lists={n_lists} over {rows} vectors...")
+            rng = np.random.default_rng(0)
+            # Cap the float32 training sample at ~256 MB
+            n_sample = min(rows, max(n_lists * 40, 10000), (256 << 20) // (4 * self.dim))
+            sample = np.sort(rng.choice(ids, n_sample, replace=False))
+            x = self._vectors[sample].astype(np.float32)
+            if self._scales is not None:
+                x *= self._scales[sample][:, None]
+            centroids = x[rng.choice(n_sample, min(n_lists, n_sample), replace=False)].copy()
+            for _ in range(10):
+                assign = np.argmax(x @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, x)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # Empty lists keep their previous centroid
+                centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1.0), centroids)
+            lists = np.zeros(len(self._alive), dtype=np.int32)
+            for start in range(0, len(lists), SCAN_BLOCK):
+                block = slice(start, min(len(lists), start + SCAN_BLOCK))
+                scores = self._scores(self._vectors, self._scales, block, centroids)
+                lists[block] = np.argmax(scores, axis=1)
+            tmp = self.dir / "ivf_lists.bin.tmp"
+            lists.tofile(tmp)
+            os.replace(tmp, self.dir / "ivf_lists.bin")
+            np.save(self.dir / "ivf_centroids.tmp.npy", centroids)
+            os.replace(self.dir / "ivf_centroids.tmp.npy", self.dir / "ivf_centroids.npy")
+            self._ivf = (centroids, self._map("ivf_lists.bin", np.int32, len(lists)))
+            with self.engine.begin() as conn:
+                self._bump_version(conn)
+            print(f"[STORE] IVF index ready ({len(centroids)} lists)")
+
+    def stats(self) -> Dict:
+        self._ensure_open()
+        files = {p.name: p.stat().st_size for p in self.dir.iterdir() if p.is_file()}
+        return {
+            "backend": "local",
+            "rows": int(self._alive.sum()),
+            "dimension": self.dim,
+            "dtype": self.dtype,
+            "index": f"ivf lists={len(self._ivf[0])}" if self._ivf else "exact",
+            "vector_bytes": files.get("vectors.bin", 0) + files.get("scales.bin", 0),
+            "index_bytes": files.get("ivf_lists.bin", 0) + files.get("ivf_centroids.npy", 0),
+            "metadata_bytes": sum(v for k, v in files.items() if k.startswith("store.db")),
+        }
+
+_store: Optional[LocalVectorStore] = None
+_store_lock = threading.Lock()
+
+def local_store() -> LocalVectorStore:
+    """The process-wide store in `LOCAL_STORE_DIR`, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocalVectorStore(settings.local_store_dir)
+    return _store
@@ -0,0 +1,71 @@
+
+import threading
+from typing import Callable, Dict, Optional
+from settings import settings
+
+class ModelRegistry:
+    """
+    Process-wide home of the heavy models: the embedder (a SentenceTransformer
+    in local mode), the chat LLM client and the optional cross-encoder.
+
+    Each is built on first use, exactly once even under concurrent callers, and
+    then shared by /chat and every ingestion job. `warm()` builds them ahead of
+    the first request.
+
+    The embedder serves the active embedding model, which is the configured one
+    until `set_embedding_model` says otherwise (see ingest/reembed.py).
+    """
+
+    def __init__(self):
+        self._models: Dict[str, object] = {}
+        self._locks = {name: threading.Lock() for name in ("embedder", "llm", "reranker")}
+        self.embedding_model: Optional[str] = None  # None = configured in the environment
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        model = self._models.get(name)
+        if model is None:
+            with self._locks[name]:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = factory()
+        return model
+
+    def embedder(self):
+        from .embedder import Embedder
+        return self._get("embedder", lambda: Embedder(self.embedding_model))
+
+    def set_embedding_model(self, model: str, embedder: Optional[object] = None):
+        """
+        Make `model` (an `Embedder.model_name`) the one served from now on,
+        loading it right away unless it is already current or `embedder` is a
+        ready instance of it.
+        """
+        from .embedder import Embedder
+        with self._locks["embedder"]:
+            current = self._models.get("embedder")
+            self.embedding_model = model
+            if current is None or current.model_name != model:
+                self._models["embedder"] = embedder or Embedder(model)
+
+    def llm(self):
+        from .chat import ChatLLM
+        return self._get("llm", ChatLLM)
+
+    def reranker(self) -> Optional[object]:
+        if not settings.rerank_enabled:
+            return None
+        from .reranker import Reranker
+        return self._get("reranker", Reranker)
+
+    def warm(self):
+        """Load every configured model now (including the cross-encoder weights)."""
+        self.embedder()
+        self.llm()
+        reranker = self.reranker()
+        if reranker is not None:
+            reranker.model
+
+    def loaded(self) -> Dict[str, bool]:
+        return {name: name in self._models for name in self._locks}
+
+registry = ModelRegistry()
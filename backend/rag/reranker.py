@@ -0,0 +1,53 @@
+
+import threading
+from typing import Dict, List
+import numpy as np
+from settings import settings
+
+class Reranker:
+    """
+    Local CPU cross-encoder that re-scores retrieval candidates against the question.
+
+    The model is loaded on first use (optionally int8 dynamically quantized,
+    which roughly halves CPU latency for BERT-style encoders). Candidates are
+    scored in batches of `RERANK_BATCH_SIZE` in retrieval order; once a whole
+    batch fails to beat the current k-th best score, the remaining (lower
+    ranked) candidates are skipped, so easy questions cost one batch.
+    """
+
+    def __init__(self):
+        self.model_name = settings.rerank_model
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                model = CrossEncoder(self.model_name, max_length=settings.rerank_max_length, device="cpu")
+                if settings.rerank_quantize:
+                    import torch
+                    model.model = torch.quantization.quantize_dynamic(
+                        model.model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                self._model = model
+                print(f"[RERANK] Loaded {self.model_name} (quantized={settings.rerank_quantize})")
+            return self._model
+
+    def rerank(self, question: str, hits: List[Dict], k: int) -> List[Dict]:
+        """Return the scored hits, best first, each with a `rerank_score`."""
+        if not hits:
+            return []
+        batch_size = settings.rerank_batch_size
+        scored: List[Dict] = []
+        for start in range(0, len(hits), batch_size):
+            batch = hits[start:start + batch_size]
+            scores = self.model.predict(
+                [(question, h["content"]) for h in batch], batch_size=batch_size, show_progress_bar=False
+            )
+            floor = sorted((h["rerank_score"] for h in scored), reverse=True)[k - 1] if len(scored) >= k else None
+            scored += [{**h, "rerank_score": float(s)} for h, s in zip(batch, np.atleast_1d(scores))]
+            if floor is not None and float(np.max(scores)) <= floor:
+                break
+        return sorted(scored, key=lambda h: h["rerank_score"], reverse=True)
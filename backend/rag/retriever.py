@@ -1,22 +1,267 @@
 
+import re
+import threading
+import time
 from sqlalchemy import text
-from db import SessionLocal
-from typing import List, Dict
+from db import (
+    EMBEDDING_LOCK, EMBEDDING_STATE_RECHECK, engine, embedding_column, embedding_search_sql, run_db, vector_literal,
+)
+from .local_store import local_store
+from settings import settings
+from typing import List, Dict, Optional
+
+MODES = ("vector", "lexical", "hybrid")
+# Metadata columns that can be filtered on by equality
+FILTERS = ("source", "site", "area", "doc_type")
+
+# How long a search waits for a running cutover to release EMBEDDING_LOCK
+SEARCH_LOCK_TIMEOUT = "10s"
+
+# ":name" bind parameters, but not "::type" casts
+_PARAM = re.compile(r"(?<![:\w]):([a-z_]+)")
+
+class EmbeddingModelChanged(Exception):
+    """The query was embedded with a model an embedding migration has since replaced."""
+
+    def __init__(self, model: str):
+        super().__init__(f"The active embedding model is now {model}")
+        self.model = model
+
+class _Plans:
+    """Search SQL built for one embedding_state.generation; replaced whole when the generation changes."""
+
+    def __init__(self, generation: Optional[int]):
+        self.generation = generation
+        self.vec = None
+        self.sql = {}
 
 class Retriever:
+    """
+    Retrieval over `documents` in one of three modes:
+
+    - vector: cosine ANN search on the embedding
+    - lexical: full-text search on `content_tsv` (exact tag numbers, part
+      numbers and alarm codes such as "PT-1043" or "E217")
+    - hybrid: both, fused server-side with reciprocal rank fusion in one query
+
+    Results can be restricted by metadata (`source`, `site`, `area`,
+    `doc_type`), a `uri` prefix and/or a minimum ingestion time.
+
+    Each query shape is PREPAREd once per pooled connection and run with
+    EXECUTE, so the hot path skips parsing and planning (unless
+    `DB_PREPARED_STATEMENTS=0`).
+
+    With `VECTOR_STORE=local` the same search runs on the embedded store
+    (see rag/local_store.py) instead of Postgres.
+    """
+
     def __init__(self, k: int = 8):
         self.k = k
+        # One retriever serves every db_executor thread: the shared caches below are swapped under this lock
+        self._lock = threading.Lock()
+        # SQL for the newest generation seen; a cutover can change the column type
+        self._plans = _Plans(None)
+        # (model, generation, next_model) as last read, and when
+        self._state = None
+        self._state_read = 0.0
 
-    def search(self, query_emb: list[float]) -> List[Dict]:
-        with SessionLocal() as s:
-            sql = text(
+    def _plans_for(self, generation: int) -> _Plans:
+        """The SQL cache of `generation`; a search keeps using the one it got even if a cutover swaps it."""
+        with self._lock:
+            plans = self._plans
+            if plans.generation == generation:
+                return plans
+            plans = _Plans(generation)
+            # A search still on a state read before the cutover must not evict the newer cache
+            if self._plans.generation is None or (generation or 0) > self._plans.generation:
+                self._plans = plans
+            return plans
+
+    @staticmethod
+    def _vector_exprs(s, plans: _Plans):
+        # Order by the exact expression the ANN index was built on (cosine
+        # distance, halfvec-cast for >2000-dim vector columns) so the planner
+        # can use it; the score uses the same metric.
+        if plans.vec is None:
+            col_type, dim = embedding_column(s)
+            expr, qtype, _ = embedding_search_sql(col_type, dim)
+            plans.vec = (expr, f"CAST(:q AS {qtype})")
+        return plans.vec
+
+    def _search_sql(self, s, plans: _Plans, mode: str, filters: tuple, uri_prefix: bool, ingested_after: bool):
+        key = (mode, filters, uri_prefix, ingested_after)
+        cached = plans.sql.get(key)
+        if cached is not None:
+            return cached
+        expr, q = self._vector_exprs(s, plans)
+        where = ["TRUE"] + [f"{f} = :{f}" for f in filters]
+        if uri_prefix:
+            where.append("uri LIKE :uri_prefix")
+        if ingested_after:
+            where.append("ingested_at >= CAST(:ingested_after AS timestamptz)")
+        where = " AND ".join(where)
+        # Any term may match (OR), ranked by cover density
+        tsq = f"replace(plainto_tsquery('{settings.text_search_config}', :query_text)::text, '&', '|')::tsquery"
+        # The window gets its own ORDER BY: a subquery's order is not guaranteed to reach OVER ()
+        vec_cte = f"""
+            SELECT id, row_number() OVER (ORDER BY dist) AS rnk FROM (
+              SELECT id, {expr} <=> {q} AS dist FROM documents WHERE {where}
+              ORDER BY {expr} <=> {q} LIMIT :candidates
+            ) v"""
+        lex_cte = f"""
+            SELECT id, row_number() OVER (ORDER BY rank DESC) AS rnk FROM (
+              SELECT id, ts_rank_cd(content_tsv, tsq) AS rank FROM documents, {tsq} AS tsq
+              WHERE content_tsv @@ tsq AND {where}
+              ORDER BY ts_rank_cd(content_tsv, tsq) DESC LIMIT :candidates
+            ) l"""
+        if mode == "vector":
+            sql = f"""
+                SELECT id, source, uri, page, chunk_id, content, content_hash, site, area, doc_type,
+                       1 - ({expr} <=> {q})::float AS score
+                FROM documents WHERE {where}
+                ORDER BY {expr} <=> {q}
+                LIMIT :k
                 """
-                SELECT id, source, uri, page, chunk_id, content,
-                       1 - (embedding <=> :q)::float AS score
-                FROM documents
-                ORDER BY embedding <-> :q
+        else:
+            ranked = (
+                f"vec AS ({vec_cte}), lex AS ({lex_cte}), "
+                "ranked AS (SELECT * FROM vec UNION ALL SELECT * FROM lex)"
+                if mode == "hybrid" else f"lex AS ({lex_cte}), ranked AS (SELECT * FROM lex)"
+            )
+            sql = f"""
+                WITH {ranked},
+                fused AS (
+                  SELECT id, sum(1.0 / (:rrf_k + rnk)) AS rrf FROM ranked GROUP BY id
+                )
+                SELECT id, source, uri, page, chunk_id, content, content_hash, site, area, doc_type,
+                       1 - ({expr} <=> {q})::float AS score, fused.rrf::float AS rrf
+                FROM fused JOIN documents USING (id)
+                ORDER BY fused.rrf DESC
                 LIMIT :k
                 """
+        names = list(dict.fromkeys(_PARAM.findall(sql)))
+        positional = _PARAM.sub(lambda m: f"${names.index(m.group(1)) + 1}", sql)
+        flags = "".join(str(int(f in filters)) for f in FILTERS) + f"{int(uri_prefix)}{int(ingested_after)}"
+        # Named after the generation the SQL was built for, never a newer one
+        name = f"tauon_search_{mode}_{flags}_g{plans.generation}"
+        # Threads racing on the same key build identical entries, so the last write wins harmlessly
+        plans.sql[key] = (text(sql), name, positional, names)
+        return plans.sql[key]
+
+    def _embedding_state(self, conn) -> tuple:
+        """
+        (model, generation) to search with. While a migration is announced,
+        every search takes EMBEDDING_LOCK shared, which a cutover swaps the
+        embedding column under, and re-reads the state; otherwise the state is
+        reused for EMBEDDING_STATE_RECHECK seconds, which is why a cutover
+        waits that long (twice over) after the announcement.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state
+            fresh = state is not None and not state[2] and now - self._state_read < EMBEDDING_STATE_RECHECK
+        if fresh:
+            return state[:2]
+        # Read outside the thread lock: the advisory lock can wait up to SEARCH_LOCK_TIMEOUT
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SEARCH_LOCK_TIMEOUT}'"))
+        # Separate statement: the state must be read with a snapshot taken after the lock
+        conn.execute(text("SELECT pg_advisory_xact_lock_shared(:k)"), {"k": EMBEDDING_LOCK})
+        state = tuple(conn.execute(text(
+            "SELECT model, generation, next_model FROM embedding_state WHERE id = 1"
+        )).one())
+        with self._lock:
+            if now >= self._state_read:
+                self._state, self._state_read = state, now
+        return state[:2]
+
+    @staticmethod
+    def _execute_prepared(conn, name: str, positional: str, names: list[str], params: dict):
+        # Prepared statements live as long as the DBAPI connection; connection.info does too
+        prepared = conn.connection.info.setdefault("prepared", set())
+        if name not in prepared:
+            conn.exec_driver_sql(f"PREPARE {name} AS {positional}")
+            prepared.add(name)
+        args = ", ".join(f"%({n})s" for n in names)
+        return conn.exec_driver_sql(f"EXECUTE {name}({args})", params)
+
+    def search(
+        self,
+        query_emb: list[float],
+        query_text: Optional[str] = None,
+        mode: Optional[str] = None,
+        k: Optional[int] = None,
+        source: Optional[str] = None,
+        uri_prefix: Optional[str] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        site: Optional[str] = None,
+        area: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        ingested_after: Optional[str] = None,
+        embed_model: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        `ef_search`/`probes` override HNSW_EF_SEARCH/IVFFLAT_PROBES for this
+        request only; ef_search is never below the number of ANN candidates
+        requested, or HNSW would silently return fewer. `ingested_after` is an
+        ISO timestamp. `k` defaults to the retriever's own.
+
+        `embed_model` names the model `query_emb` came from; if an embedding
+        migration has made another model active, EmbeddingModelChanged is
+        raised so the caller can re-embed the query.
+        """
+        k = k or self.k
+        mode = mode or (settings.retrieval_mode if query_text else "vector")
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {MODES}")
+        if settings.vector_store == "local":
+            return local_store().search(
+                query_emb, query_text, mode, k=k, source=source, uri_prefix=uri_prefix, probes=probes,
+                site=site, area=area, doc_type=doc_type, ingested_after=ingested_after,
+            )
+        candidates = max(k * settings.hybrid_candidates_factor, k)
+        params = {
+            "q": vector_literal(query_emb),
+            "k": k,
+            "query_text": query_text or "",
+            "candidates": candidates,
+            "rrf_k": settings.rrf_k,
+        }
+        values = {"source": source, "site": site, "area": area, "doc_type": doc_type}
+        filters = tuple(f for f in FILTERS if values[f])
+        params.update((f, values[f]) for f in filters)
+        if ingested_after:
+            params["ingested_after"] = ingested_after
+        if uri_prefix:
+            params["uri_prefix"] = uri_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        limit = k if mode == "vector" else candidates
+        with engine.connect() as conn, conn.begin():
+            model, generation = self._embedding_state(conn)
+            if embed_model and model and embed_model != model:
+                raise EmbeddingModelChanged(model)
+            sql, name, positional, names = self._search_sql(
+                conn, self._plans_for(generation), mode, filters, bool(uri_prefix), bool(ingested_after)
             )
-            rows = s.execute(sql, {"q": query_emb, "k": self.k}).mappings().all()
-            return [dict(r) for r in rows]
+            # Transaction-local, so pooled connections go back with default settings
+            tuning = {
+                "hnsw.ef_search": str(max(ef_search or settings.hnsw_ef_search, limit)),
+                "ivfflat.probes": str(probes or settings.ivfflat_probes),
+            }
+            if filters or uri_prefix or ingested_after:
+                if settings.vector_index_partition_by in filters:
+                    # A generic plan can't prove `site = $1` matches a partial index predicate
+                    tuning["plan_cache_mode"] = "force_custom_plan"
+                if settings.hnsw_iterative_scan:
+                    tuning["hnsw.iterative_scan"] = settings.hnsw_iterative_scan
+            conn.exec_driver_sql(
+                "SELECT " + ", ".join(f"set_config('{guc}', %s, true)" for guc in tuning),
+                tuple(tuning.values()),
+            )
+            if settings.db_prepared_statements:
+                rows = self._execute_prepared(conn, name, positional, names, params)
+            else:
+                rows = conn.execute(sql, params)
+            return [dict(r) for r in rows.mappings().all()]
+
+    async def asearch(self, query_emb: list[float], **kwargs) -> List[Dict]:
+        return await run_db(lambda: self.search(query_emb, **kwargs))
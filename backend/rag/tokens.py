@@ -0,0 +1,30 @@
+
+from typing import List
+
+_ENCODING = False  # resolved lazily: tiktoken may need to download its BPE file
+
+def _encoding():
+    global _ENCODING
+    if _ENCODING is False:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # tiktoken missing or its BPE file unavailable offline
+            _ENCODING = None
+    return _ENCODING
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # ~4 characters per token for English/Portuguese prose
+    return len(text) // 4 + 1
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Hard-split `text` into pieces of at most `max_tokens` tokens (last resort for unbroken text)."""
+    enc = _encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return [enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    step = max_tokens * 4
+    return [text[i:i + step] for i in range(0, len(text), step)]
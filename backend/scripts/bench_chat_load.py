@@ -0,0 +1,196 @@
+"""
+Concurrent /chat throughput against a stub OpenAI-compatible server.
+
+    cd backend && python -m scripts.bench_chat_load --concurrency 1 8 32 --embed-ms 50 --llm-ms 800
+
+Starts, on localhost:
+
+- a stub of the OpenAI API (/v1/embeddings and /v1/chat/completions) that
+  answers after `--embed-ms` / `--llm-ms`, standing in for the provider's
+  latency without spending tokens
+- the API itself (uvicorn app:app, one worker) with VECTOR_STORE=local over a
+  temporary store seeded with `--chunks` random chunks, answer and embedding
+  caches off, pointed at the stub through OPENAI_BASE_URL
+
+and then sends distinct questions to POST /chat from `--concurrency` clients
+at a time, reporting requests/sec and p50/p99 latency per level. With a
+non-blocking request path, throughput grows with concurrency up to about
+concurrency / (embed + LLM latency); a handler that blocks the event loop
+stays at about 1 / (embed + LLM latency) at every level.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from scripts.eval_retrieval import percentile
+
+ANSWER = "A bomba P-101 parte com a valvula de succao aberta [manual_p101.pdf p.12]."
+API_KEY = "bench-key"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def stub_app(embed_ms: int, llm_ms: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    stub = FastAPI()
+
+    def vector(text: str, dim: int) -> list:
+        v = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(dim)
+        return (v / np.linalg.norm(v)).round(6).tolist()
+
+    @stub.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions") or (3072 if "large" in body.get("model", "") else 1536)
+        await asyncio.sleep(embed_ms / 1000)
+        return JSONResponse({
+            "object": "list", "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": vector(str(t), dim)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    @stub.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(llm_ms / 1000)
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        async def chunks():
+            for word in ANSWER.split(" "):
+                delta = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return stub
+
+def seed_store(path: Path, chunks: int, dim: int):
+    """Fill a local vector store with `chunks` random chunks spread over 100 files."""
+    from ingest.pipeline import FileWork
+    from rag.local_store import LocalVectorStore
+
+    store = LocalVectorStore(str(path))
+    store.init(dim)
+    rng = np.random.default_rng(0)
+    batch = []
+    for f in range(100):
+        work = FileWork(uri=f"bench://manual_{f:03d}.pdf", source="bench", size=0, mtime=0.0,
+                        content_hash=f"{f:064x}", doc_type=".pdf")
+        for c in range(chunks // 100):
+            content = f"Procedimento {c} da bomba P-{f:03d}: verificar a pressao no PT-{c:04d} antes da partida."
+            work.pending.append((None, c + 1, f"manual_{f:03d}.pdf#p{c + 1}#c0", content, f"{f:032x}{c:032x}"))
+            v = rng.standard_normal(dim)
+            work.vectors.append(v / np.linalg.norm(v))
+        batch.append(work)
+    store.write(batch, "bench")
+    store.ensure_index()
+    store.close()
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+async def load(url: str, concurrency: int, requests: int) -> dict:
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            r = await http.post(url, data={"x_api_key": API_KEY, "question": f"Como partir a bomba P-{i:05d}?"})
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += r.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"rps": len(latencies) / elapsed, "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99), "errors": errors}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=8, help="requests per client at each level")
+    parser.add_argument("--embed-ms", type=int, default=50)
+    parser.add_argument("--llm-ms", type=int, default=800)
+    parser.add_argument("--chunks", type=int, default=20_000, help="chunks seeded into the local store")
+    parser.add_argument("--dim", type=int, default=256, help="EMBED_DIMENSIONS for text-embedding-3-large")
+    parser.add_argument("--stub", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stub:
+        import uvicorn
+        uvicorn.run(stub_app(args.embed_ms, args.llm_ms), host="127.0.0.1", port=args.stub, log_level="warning")
+        return
+
+    stub_port, app_port = _free_port(), _free_port()
+    backend = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory(prefix="tauon-load-") as tmp:
+        seed_store(Path(tmp), args.chunks, args.dim)
+        env = {k: v for k, v in os.environ.items() if not k.startswith("AZURE_OPENAI")}
+        env.update({
+            "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+            "OPENAI_EMBED_MODEL": "text-embedding-3-large", "EMBED_DIMENSIONS": str(args.dim),
+            "TAUON_API_KEY": API_KEY, "VECTOR_STORE": "local", "LOCAL_STORE_DIR": tmp,
+            "ANSWER_CACHE": "0", "EMBED_CACHE": "0", "RERANK": "0", "WARM_MODELS": "0",
+        })
+        procs = [
+            subprocess.Popen([sys.executable, "-m", "scripts.bench_chat_load", "--stub", str(stub_port),
+                              "--embed-ms", str(args.embed_ms), "--llm-ms", str(args.llm_ms)], cwd=backend, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+            subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(app_port),
+                              "--log-level", "warning"], cwd=backend, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+        ]
+        try:
+            wait_ready(f"http://127.0.0.1:{stub_port}/docs", procs[0])
+            wait_ready(f"http://127.0.0.1:{app_port}/ready", procs[1])
+            url = f"http://127.0.0.1:{app_port}/chat"
+            asyncio.run(load(url, 1, 2))  # first requests load clients and open the store
+            bound = 1000 / (args.embed_ms + args.llm_ms)
+            print(f"stub latency {args.embed_ms} ms embed + {args.llm_ms} ms LLM "
+                  f"(a blocking handler tops out at {bound:.2f} req/s); {args.chunks} chunks, dim {args.dim}")
+            for c in args.concurrency:
+                r = asyncio.run(load(url, c, c * args.requests))
+                print(f"concurrency {c:>4}  {r['rps']:7.2f} req/s  p50={r['p50_ms']:.0f}ms  p99={r['p99_ms']:.0f}ms"
+                      f"  errors={r['errors']}")
+        finally:
+            for p in procs:
+                p.terminate()
+                p.wait(timeout=30)
+
+if __name__ == "__main__":
+    main()
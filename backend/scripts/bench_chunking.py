@@ -0,0 +1,125 @@
+"""
+Extraction and chunking throughput on large generated (or given) files.
+
+    cd backend && python -m scripts.bench_chunking --rows 200000 --pages 2000
+    cd backend && python -m scripts.bench_chunking relatorio.pdf export.xlsx
+
+Without file arguments, a SCADA-style log and an XLSX export of `--rows` rows
+and a `--pages`-page text PDF are generated in a temporary directory. Each
+file goes through extract_text() and split_into_chunks() with the configured
+CHUNK_TOKENS/CHUNK_OVERLAP_TOKENS, exactly as ingestion does (no database or
+embedding). The chunk count is also reported for the original chunker, which
+sliced every page into 1500-character windows with 200 characters of overlap.
+"""
+import argparse
+import math
+import resource
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from openpyxl import Workbook
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from ingest.extractors import extract_text
+from ingest.utils import split_into_chunks
+from rag.tokens import _encoding, count_tokens
+from settings import settings
+
+def _row(i: int) -> tuple:
+    return (i, f"P-{i % 500:03d}", "bomba centrifuga", "running" if i % 7 else "alarm E217", round(i * 0.25, 2),
+            f"2024-05-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}")
+
+def write_log(path: Path, rows: int):
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(" ".join(map(str, _row(i))) + " leitura do transmissor dentro da faixa\n")
+
+def write_xlsx(path: Path, rows: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leituras")
+    ws.append(["id", "tag", "equipamento", "status", "pressao", "data"])
+    for i in range(rows):
+        ws.append(_row(i))
+    wb.save(path)
+
+def write_pdf(path: Path, pages: int, lines: int = 45):
+    """A text-layer PDF: a numbered section title and a paragraph of procedure text per page."""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for p in range(pages):
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        text = [f"{p // 10 + 1}.{p % 10 + 1} Partida da bomba P-{p % 500:03d}"] + [
+            f"Verifique a pressao no PT-{(p * lines + i) % 9000:04d} antes de abrir a valvula V-{i:02d} "
+            f"e registre o valor no livro de turno." for i in range(lines)
+        ]
+        stream = DecodedStreamObject()
+        stream.set_data(("BT /F1 9 Tf 11 TL 40 760 Td " + " Tj T* ".join(f"({t})" for t in text) + " Tj ET").encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    with path.open("wb") as f:
+        writer.write(f)
+
+def char_chunks(text: str, size: int = 1500, overlap: int = 200) -> int:
+    """Chunks the original character slicer made of `text`."""
+    text = text.strip()
+    return math.ceil(len(text) / (size - overlap)) if text else 0
+
+def bench(path: Path) -> Dict[str, float]:
+    chunks: List[str] = []
+    old_chunks = 0
+    chars = 0
+    started = time.perf_counter()
+    for page_text, _ in extract_text(path):
+        chars += len(page_text)
+        old_chunks += char_chunks(page_text)
+        chunks += split_into_chunks(page_text, settings.chunk_tokens, settings.chunk_overlap_tokens)
+    seconds = time.perf_counter() - started
+    mb = path.stat().st_size / 1e6
+    return {
+        "file_mb": mb,
+        "text_mb": chars / 1e6,
+        "seconds": seconds,
+        "text_mb_per_s": chars / 1e6 / seconds if seconds else 0.0,
+        "chunks": len(chunks),
+        "tokens_per_chunk": statistics.fmean(count_tokens(c) for c in chunks) if chunks else 0.0,
+        "old_chunks": old_chunks,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="files to measure instead of generated ones")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows of the generated log and XLSX")
+    parser.add_argument("--pages", type=int, default=2_000, help="pages of the generated PDF")
+    args = parser.parse_args()
+    count_tokens("load the tokenizer before timing")
+    with tempfile.TemporaryDirectory(prefix="tauon-bench-") as tmp:
+        files = [Path(f) for f in args.files]
+        if not files:
+            files = [Path(tmp) / "scada.log", Path(tmp) / "export.xlsx", Path(tmp) / "manual.pdf"]
+            print(f"Generating {args.rows} log/XLSX rows and {args.pages} PDF pages...")
+            write_log(files[0], args.rows)
+            write_xlsx(files[1], args.rows)
+            write_pdf(files[2], args.pages)
+        tokenizer = "tiktoken" if _encoding() is not None else "len/4 estimate, tiktoken unavailable"
+        print(f"chunk_tokens={settings.chunk_tokens} overlap={settings.chunk_overlap_tokens} "
+              f"segment_chars={settings.extract_segment_chars} tokenizer={tokenizer}")
+        for path in files:
+            r = bench(path)
+            print(f"{path.name:>14}  {r['file_mb']:.1f} MB file, {r['text_mb']:.1f} MB text in {r['seconds']:.1f}s "
+                  f"({r['text_mb_per_s']:.2f} MB/s)  chunks={r['chunks']} ({r['tokens_per_chunk']:.0f} tokens avg)  "
+                  f"1500-char slicer: {r['old_chunks']} chunks")
+    # ru_maxrss is in KB on Linux
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    main()
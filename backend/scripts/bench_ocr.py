@@ -0,0 +1,114 @@
+"""
+OCR throughput (pages/sec, per core) on generated scanned pages.
+
+    cd backend && python -m scripts.bench_ocr --pages 24 --workers 1 2 4
+
+Pages are rendered A4 at OCR_DPI (a numbered section title and procedure
+lines), rotated by up to ±3° and speckled, and saved as PNG files. Each file
+goes through ocr_image_file() with the cache off: decoding, preprocessing
+(grayscale, downscale, deskew) and tesseract, as ingestion does for a scanned
+image. With `--workers`, the same files are OCR'd by a process pool of that
+size (the extraction pool of the ingestion pipeline), so pages/sec per core
+shows how well it scales.
+
+Also reported: preprocessing alone, and a second pass over the pages with the
+OCR cache on (what a re-ingest costs). Without a tesseract binary only the
+preprocessing is measured.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+from ingest import ocr
+from settings import settings
+
+def make_page(n: int, dpi: int) -> Image.Image:
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", dpi // 7)
+    except OSError:
+        font = ImageFont.load_default()
+    line, y = dpi // 5, dpi
+    draw.text((dpi, y), f"{n // 10 + 1}.{n % 10 + 1} PARTIDA DA BOMBA P-{n:03d}", fill=0, font=font)
+    for i in range(45):
+        y += line
+        draw.text((dpi, y), f"{i + 1}. Verifique a pressao no PT-{(n * 45 + i) % 9000:04d} e abra a valvula V-{i:02d}.",
+                  fill=0, font=font)
+    rng = np.random.default_rng(n)
+    img = img.rotate(float(rng.uniform(-3, 3)), fillcolor=255, expand=False)
+    pixels = np.asarray(img).copy()
+    speckle = rng.random(pixels.shape) < 0.002
+    pixels[speckle] = 0
+    return Image.fromarray(pixels).convert("RGB")
+
+def _ocr_file(path: Path) -> int:
+    return sum(len(text) for text, _ in ocr.ocr_image_file(path))
+
+def _init_worker(cache: bool, cache_dir: str):
+    settings.ocr_cache_enabled = cache
+    settings.ocr_cache_dir = cache_dir
+
+def ocr_rate(files: List[Path], workers: int, cache: bool, cache_dir: str) -> float:
+    """Pages/sec OCR'ing `files` with `workers` processes (0: in this process)."""
+    started = time.perf_counter()
+    if workers == 0:
+        _init_worker(cache, cache_dir)
+        for path in files:
+            _ocr_file(path)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache, cache_dir)) as pool:
+            list(pool.map(_ocr_file, files))
+    return len(files) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+    print(f"Rendering {args.pages} pages at {settings.ocr_dpi} dpi (OCR_MAX_SIDE={settings.ocr_max_side}, "
+          f"OCR_LANG={settings.ocr_lang}, {os.cpu_count()} cores)...")
+    tmp = Path(tempfile.mkdtemp(prefix="tauon-ocr-bench-"))
+    try:
+        files = []
+        for n in range(args.pages):
+            files.append(tmp / f"scan_{n:03d}.png")
+            make_page(n, settings.ocr_dpi).save(files[-1])
+
+        started = time.perf_counter()
+        for path in files:
+            with Image.open(path) as img:
+                ocr.preprocess(img)
+        print(f"{'preprocess only':>22}  {args.pages / (time.perf_counter() - started):.2f} pages/s on one core")
+
+        try:
+            version = pytesseract.get_tesseract_version()
+        except (pytesseract.TesseractNotFoundError, OSError):
+            print("tesseract not found: OCR throughput not measured")
+            return
+        print(f"tesseract {version}")
+        cache_dir = str(tmp / "cache")
+        rate = ocr_rate(files, 0, False, cache_dir)
+        print(f"{'in process':>22}  {rate:.2f} pages/s")
+        for workers in args.workers:
+            rate = ocr_rate(files, workers, False, cache_dir)
+            per_core = rate / min(workers, os.cpu_count() or 1)
+            print(f"{f'{workers} worker(s)':>22}  {rate:.2f} pages/s  ({per_core:.2f} per core)")
+        ocr_rate(files, 0, True, cache_dir)
+        rate = ocr_rate(files, 0, True, cache_dir)
+        print(f"{'cached (re-ingest)':>22}  {rate:.2f} pages/s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
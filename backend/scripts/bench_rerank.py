@@ -0,0 +1,80 @@
+"""
+Cross-encoder rerank latency against the number of candidates.
+
+    cd backend && python -m scripts.bench_rerank --candidates 8 16 32 64 128 --repeat 5
+
+Candidates are generated chunks of `--words` words of plant-operations text
+(about the size the chunker stores). For each RERANK_QUANTIZE setting the
+model named by `--model` (RERANK_MODEL by default; a local path works) is
+loaded through Reranker, warmed up, and then every candidate count is reranked
+`--repeat` times with k equal to the count, so every batch is scored (the
+early exit can only make a request cheaper). Reported: p50/p99 per request,
+ms per candidate, and the cost of the MMR + pack_context step that follows the
+rerank in /chat. Latency depends on the model's shape and the token count of
+each pair, not on its weights.
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from rag.context import mmr, pack_context
+from rag.reranker import Reranker
+from scripts.eval_retrieval import percentile
+from settings import settings
+
+QUESTION = "Qual a pressao de succao minima para partir a bomba P-101 apos uma parada de manutencao?"
+WORDS = ("bomba valvula pressao vazao alarme partida parada manutencao turno sensor transmissor succao "
+         "descarga motor inversor temperatura nivel tanque operador painel intertravamento procedimento").split()
+
+def make_hits(n: int, words: int, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    return [{
+        "uri": f"bench://manual_{i % 20:02d}.pdf", "page": i + 1, "chunk_id": f"manual#p{i + 1}#c0",
+        "score": float(1 - i / n),
+        "content": f"P-{100 + i} " + " ".join(rng.choice(WORDS, size=words)) + f" PT-{i:04d}.",
+    } for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--candidates", nargs="+", type=int, default=[8, 16, 32, 64, 128])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--words", type=int, default=180, help="words per candidate chunk")
+    parser.add_argument("--model", default=settings.rerank_model)
+    parser.add_argument("--quantize", nargs="+", choices=("0", "1"), default=["0", "1"])
+    args = parser.parse_args()
+    hits = make_hits(max(args.candidates), args.words)
+    k = 8
+    configured = settings.rerank_quantize
+    try:
+        for quantize in args.quantize:
+            settings.rerank_quantize = quantize == "1"
+            reranker = Reranker()
+            reranker.model_name = args.model
+            started = time.perf_counter()
+            model = reranker.model
+            print(f"{args.model} quantized={settings.rerank_quantize}: loaded in {time.perf_counter() - started:.1f}s, "
+                  f"RERANK_BATCH_SIZE={settings.rerank_batch_size}")
+            tokens = [len(ids) for ids in model.tokenizer(
+                [QUESTION] * len(hits), [h["content"] for h in hits],
+                truncation=True, max_length=settings.rerank_max_length)["input_ids"]]
+            print(f"  {np.mean(tokens):.0f} tokens per (question, chunk) pair")
+            warm = reranker.rerank(QUESTION, hits[:settings.rerank_batch_size], settings.rerank_batch_size)
+            pack_context(mmr(warm, k, settings.mmr_lambda), settings.context_token_budget)
+            for n in args.candidates:
+                latencies, post = [], []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    ranked = reranker.rerank(QUESTION, hits[:n], n)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    started = time.perf_counter()
+                    pack_context(mmr(ranked, k, settings.mmr_lambda), settings.context_token_budget)
+                    post.append((time.perf_counter() - started) * 1000)
+                print(f"  {n:>4} candidates  p50={percentile(latencies, 50):.0f}ms  p99={percentile(latencies, 99):.0f}ms"
+                      f"  ({percentile(latencies, 50) / n:.1f} ms/candidate)  mmr+pack p50={percentile(post, 50):.2f}ms")
+    finally:
+        settings.rerank_quantize = configured
+
+if __name__ == "__main__":
+    main()
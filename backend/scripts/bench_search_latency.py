@@ -0,0 +1,70 @@
+"""
+Retrieval latency p50/p99 with and without server-side prepared statements.
+
+    cd backend && python -m scripts.bench_search_latency --queries 500 --modes vector hybrid --concurrency 1 8
+
+Query vectors are embeddings of stored chunks (so no embedding API is
+called) and the query text is the first words of the same chunks. Every
+query runs through Retriever.search() twice per setting, once with
+DB_PREPARED_STATEMENTS on and once off, from `--concurrency` threads sharing
+one Retriever as the API's db_executor does. The first pass of each setting
+warms the pool and (when on) PREPAREs each statement once per connection and
+is not counted.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from db import engine
+from rag.retriever import MODES, Retriever
+from scripts.eval_retrieval import percentile
+from settings import settings
+
+def sample_queries(n: int) -> List[tuple[list, str]]:
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT embedding::text, left(content, 80) FROM documents "
+            "WHERE embedding IS NOT NULL ORDER BY random() LIMIT :n"
+        ), {"n": n}).all()
+    return [([float(x) for x in vec.strip("[]").split(",")], words) for vec, words in rows]
+
+def run(retriever: Retriever, queries: List[tuple[list, str]], mode: str, k: int, concurrency: int) -> List[float]:
+    def one(q):
+        vec, words = q
+        started = time.perf_counter()
+        retriever.search(vec, query_text=words, mode=mode, k=k)
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, queries))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8])
+    args = parser.parse_args()
+    queries = sample_queries(args.queries)
+    print(f"{len(queries)} queries, k={args.k}, pool_size={settings.db_pool_size}")
+    configured = settings.db_prepared_statements
+    try:
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                results: Dict[str, List[float]] = {}
+                for prepared in (False, True):
+                    settings.db_prepared_statements = prepared
+                    retriever = Retriever(k=args.k)
+                    run(retriever, queries, mode, args.k, concurrency)
+                    results["prepared" if prepared else "unprepared"] = run(retriever, queries, mode, args.k, concurrency)
+                for label, latencies in results.items():
+                    print(f"{mode:>8} x{concurrency:<3} {label:>10}  p50={percentile(latencies, 50):.2f}ms  "
+                          f"p99={percentile(latencies, 99):.2f}ms")
+    finally:
+        settings.db_prepared_statements = configured
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Recall@k and latency of HNSW and IVFFLAT indexes against exact search.
+
+    cd backend && python -m scripts.bench_vector_index --rows 100000 --queries 200 --k 8 \
+        --ef-search 40 100 200 --probes 1 10 30
+
+The vectors go into a scratch table (`bench_vectors`, dropped at the end):
+with `--source corpus` (the default when `documents` has enough rows) they
+are copied from `documents.embedding` and the queries are further stored
+chunks left out of the table; with `--source random` both are random unit
+vectors of `--dim` dimensions, which is the hard case for an ANN index.
+
+Exact top-k (index scans disabled) is the ground truth. Each index is built
+with the same options and expression as ensure_vector_index() (VECTOR_STORAGE,
+HNSW_M/HNSW_EF_CONSTRUCTION, IVFFLAT_LISTS, halfvec cast past 2000 dims) and
+then searched at every `--ef-search` (HNSW) or `--probes` (IVFFLAT) value.
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import text
+
+from db import embedding_column, embedding_search_sql, engine, vector_index_options, vector_literal
+from scripts.eval_retrieval import percentile
+from settings import settings
+
+TABLE = "bench_vectors"
+
+def _random_unit(n: int, dim: int, rng) -> np.ndarray:
+    x = rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def load(source: str, rows: int, queries: int, dim: int, storage: str) -> tuple[List[str], int]:
+    """Fill TABLE; return (query vector literals, dimension)."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        if source == "corpus":
+            dim = embedding_column(conn)[1]
+            conn.execute(text(f"CREATE TABLE {TABLE} (id bigserial PRIMARY KEY, embedding {storage}({dim}))"))
+            sample = conn.execute(text(
+                "SELECT id, embedding::text FROM documents WHERE embedding IS NOT NULL ORDER BY random() LIMIT :n"
+            ), {"n": queries}).all()
+            conn.execute(text(
+                f"INSERT INTO {TABLE} (embedding) SELECT embedding::{storage}({dim}) FROM documents "
+                "WHERE embedding IS NOT NULL AND id <> ALL(:ids) LIMIT :n"
+            ), {"ids": [row_id for row_id, _ in sample], "n": rows})
+            return [vec for _, vec in sample], dim
+        rng = np.random.default_rng(0)
+        conn.execute(text(f"CREATE TABLE {TABLE} (id bigserial PRIMARY KEY, embedding {storage}({dim}))"))
+        for start in range(0, rows, 5000):
+            vecs = _random_unit(min(5000, rows - start), dim, rng)
+            conn.execute(text(f"INSERT INTO {TABLE} (embedding) VALUES (CAST(:v AS {storage}({dim})))"),
+                         [{"v": vector_literal(v)} for v in vecs])
+        return [vector_literal(v) for v in _random_unit(queries, dim, rng)], dim
+
+def search(queries: List[str], expr: str, qtype: str, k: int, gucs: Dict[str, str]) -> tuple[List[List[int]], List[float]]:
+    """Top-k ids per query and per-query latency (ms), with `gucs` set for each search's transaction."""
+    results, latencies = [], []
+    sql = text(f"SELECT id FROM {TABLE} ORDER BY {expr} <=> CAST(:q AS {qtype}) LIMIT :k")
+    with engine.connect() as conn:
+        for q in queries:
+            with conn.begin():
+                for guc, value in gucs.items():
+                    conn.execute(text("SELECT set_config(:guc, :value, true)"), {"guc": guc, "value": value})
+                started = time.perf_counter()
+                ids = conn.execute(sql, {"q": q, "k": k}).scalars().all()
+                latencies.append((time.perf_counter() - started) * 1000)
+            results.append(ids)
+    return results, latencies
+
+def recall(truth: List[List[int]], found: List[List[int]], k: int) -> float:
+    return float(np.mean([len(set(t[:k]) & set(f[:k])) / max(1, len(t[:k])) for t, f in zip(truth, found)]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", choices=("corpus", "random"), default=None)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of random vectors")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--indexes", nargs="+", choices=("hnsw", "ivfflat"), default=["hnsw", "ivfflat"])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[40, 100, 200])
+    parser.add_argument("--probes", nargs="+", type=int, default=[1, 10, 30])
+    args = parser.parse_args()
+    storage = "halfvec" if settings.vector_storage == "halfvec" else "vector"
+    source = args.source
+    if source is None:
+        with engine.connect() as conn:
+            stored = conn.execute(text("SELECT count(*) FROM documents WHERE embedding IS NOT NULL")).scalar()
+        source = "corpus" if stored >= args.rows // 2 + args.queries else "random"
+    queries, dim = load(source, args.rows, args.queries, args.dim, storage)
+    expr, qtype, opclass = embedding_search_sql(storage, dim)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT count(*) FROM {TABLE}")).scalar()
+        print(f"{rows} {source} vectors, {storage}({dim}), {len(queries)} queries, k={args.k}")
+        off = {"enable_indexscan": "off", "enable_bitmapscan": "off"}
+        truth, latencies = search(queries, expr, qtype, args.k, off)
+        print(f"{'exact':>18}  recall@{args.k}=1.000  p50={percentile(latencies, 50):.1f}ms  "
+              f"p95={percentile(latencies, 95):.1f}ms")
+        if opclass is None:
+            print(f"No ANN index possible for {storage}({dim})")
+            return
+        for index in args.indexes:
+            configured = settings.vector_index
+            settings.vector_index = index
+            try:
+                with_clause = vector_index_options(rows)
+            finally:
+                settings.vector_index = configured
+            with engine.connect() as conn:
+                started = time.perf_counter()
+                conn.execute(text(
+                    f"CREATE INDEX bench_vectors_ann ON {TABLE} USING {index} ({expr} {opclass}) WITH ({with_clause})"
+                ))
+                conn.commit()
+                build = time.perf_counter() - started
+            print(f"{index} ({with_clause}) built in {build:.1f}s")
+            guc, values = ("hnsw.ef_search", args.ef_search) if index == "hnsw" else ("ivfflat.probes", args.probes)
+            for value in values:
+                found, latencies = search(queries, expr, qtype, args.k, {guc: str(value)})
+                print(f"{guc + '=' + str(value):>18}  recall@{args.k}={recall(truth, found, args.k):.3f}  "
+                      f"p50={percentile(latencies, 50):.1f}ms  p95={percentile(latencies, 95):.1f}ms")
+            with engine.begin() as conn:
+                conn.execute(text("DROP INDEX bench_vectors_ann"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Footprint and query latency of the local vector store, and optionally of pgvector, on the same vectors.
+
+    cd backend && python -m scripts.bench_vector_store --rows 100000 --dim 1536 --probes 1 10 30
+    cd backend && python -m scripts.bench_vector_store --pgvector   # also load them into Postgres
+
+`--rows` random unit vectors (the same ones bench_vector_index generates,
+so the two scripts agree) are written with short chunk texts through
+LocalVectorStore.write() into a temporary store, once per `--dtypes`
+value (LOCAL_STORE_DTYPE). For each store it reports:
+
+- bytes on disk: vectors (+ int8 scales), IVF index, SQLite metadata/FTS
+- resident memory one exact search adds to a freshly opened reader (the
+  pages of the memory-mapped files it touches)
+- p50/p99 of store.search() in vector mode, the path /chat takes, with an
+  exact scan and with the IVF index at each `--probes` value, plus recall@k
+  against the exact results
+
+With `--pgvector` the same vectors go into bench_vector_index's scratch
+table in DATABASE_URL (VECTOR_STORAGE type, VECTOR_INDEX index built as
+ensure_vector_index() would), whose table/index sizes and exact and indexed
+latency are reported the same way; the table is dropped at the end.
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from ingest.pipeline import FileWork
+from rag.local_store import LocalVectorStore
+from scripts.bench_vector_index import _random_unit, recall
+from scripts.eval_retrieval import percentile
+from settings import settings
+
+WORDS = "bomba valvula pressao vazao alarme partida parada manutencao turno sensor transmissor".split()
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def seed(store: LocalVectorStore, rows: int, dim: int) -> np.random.Generator:
+    """Write the vectors in blocks of 5000 (one file each); return the generator, ready to draw the queries."""
+    rng = np.random.default_rng(0)
+    for f, start in enumerate(range(0, rows, 5000)):
+        vecs = _random_unit(min(5000, rows - start), dim, rng)
+        work = FileWork(uri=f"bench://store/file_{f:04d}.log", source="bench", size=0, mtime=0.0,
+                        content_hash=f"{f:064x}", doc_type=".log")
+        for i, v in enumerate(vecs):
+            row = start + i
+            content = " ".join(WORDS[(row + j) % len(WORDS)] for j in range(40)) + f" P-{row}"
+            work.pending.append((None, 1, f"file_{f:04d}.log#p1#c{i}", content, f"{row:064x}"))
+            work.vectors.append(v)
+        store.write([work], "bench")
+    return rng
+
+def timed(store: LocalVectorStore, queries: np.ndarray, k: int, probes=None) -> tuple[List[List[int]], List[float]]:
+    found, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        hits = store.search(q.tolist(), mode="vector", k=k, probes=probes)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append([h["id"] for h in hits])
+    return found, latencies
+
+def report(label: str, latencies: List[float], rec: float, k: int):
+    print(f"{label:>22}  recall@{k}={rec:.3f}  p50={percentile(latencies, 50):.1f}ms  p99={percentile(latencies, 99):.1f}ms")
+
+def bench_local(dtype: str, rows: int, dim: int, n_queries: int, k: int, probes: List[int]):
+    tmp = Path(tempfile.mkdtemp(prefix="tauon-store-bench-"))
+    configured = settings.local_store_dtype, settings.local_index_min_rows
+    settings.local_store_dtype, settings.local_index_min_rows = dtype, 0
+    try:
+        writer = LocalVectorStore(str(tmp))
+        writer.init(dim)
+        started = time.perf_counter()
+        queries = _random_unit(n_queries, dim, seed(writer, rows, dim))
+        written = time.perf_counter() - started
+        writer.close()
+        del writer
+        gc.collect()
+
+        store = LocalVectorStore(str(tmp))
+        before = rss_bytes()
+        timed(store, queries[:1], k)
+        resident = rss_bytes() - before
+        truth, latencies = timed(store, queries, k)
+        stats = store.stats()
+        print(f"local {dtype}: {stats['rows']} x {dim}, written at {rows / written:,.0f} rows/s")
+        print(f"{'on disk':>22}  vectors {stats['vector_bytes'] / 2**20:.1f} MB, "
+              f"metadata {stats['metadata_bytes'] / 2**20:.1f} MB")
+        print(f"{'resident after scan':>22}  +{resident / 2**20:.1f} MB")
+        report("exact", latencies, 1.0, k)
+        settings.vector_index = "ivfflat"
+        started = time.perf_counter()
+        store.ensure_index(rebuild=True)
+        stats = store.stats()
+        print(f"{stats['index']:>22}  trained in {time.perf_counter() - started:.1f}s, "
+              f"{stats['index_bytes'] / 2**20:.1f} MB on disk")
+        for p in probes:
+            found, latencies = timed(store, queries, k, probes=p)
+            report(f"probes={p}", latencies, recall(truth, found, k), k)
+        store.close()
+    finally:
+        settings.local_store_dtype, settings.local_index_min_rows = configured
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def bench_pgvector(rows: int, dim: int, n_queries: int, k: int, probes: List[int], ef_search: List[int]):
+    from sqlalchemy import text
+
+    from db import embedding_search_sql, engine, vector_index_options
+    from scripts.bench_vector_index import TABLE, load, search
+
+    storage = "halfvec" if settings.vector_storage == "halfvec" else "vector"
+    queries, _ = load("random", rows, n_queries, dim, storage)
+    expr, qtype, opclass = embedding_search_sql(storage, dim)
+    try:
+        truth, latencies = search(queries, expr, qtype, k, {"enable_indexscan": "off", "enable_bitmapscan": "off"})
+        with engine.connect() as conn:
+            table = conn.execute(text(f"SELECT pg_total_relation_size('{TABLE}')")).scalar()
+        print(f"pgvector {storage}({dim}): {rows} rows")
+        print(f"{'on disk':>22}  table {table / 2**20:.1f} MB")
+        report("exact", latencies, 1.0, k)
+        if opclass is None or settings.vector_index == "none":
+            return
+        with engine.begin() as conn:
+            started = time.perf_counter()
+            conn.execute(text(
+                f"CREATE INDEX bench_vectors_ann ON {TABLE} USING {settings.vector_index} ({expr} {opclass}) "
+                f"WITH ({vector_index_options(rows)})"
+            ))
+            build = time.perf_counter() - started
+        with engine.connect() as conn:
+            index = conn.execute(text(f"SELECT pg_indexes_size('{TABLE}')")).scalar()
+        print(f"{settings.vector_index:>22}  built in {build:.1f}s, {index / 2**20:.1f} MB on disk")
+        guc, values = ("hnsw.ef_search", ef_search) if settings.vector_index == "hnsw" else ("ivfflat.probes", probes)
+        for value in values:
+            found, latencies = search(queries, expr, qtype, k, {guc: str(value)})
+            report(f"{guc}={value}", latencies, recall(truth, found, k), k)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--dtypes", nargs="+", choices=("float16", "int8"), default=["float16", "int8"])
+    parser.add_argument("--probes", nargs="+", type=int, default=[1, 10, 30])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[40, 100, 200])
+    parser.add_argument("--pgvector", action="store_true", help="also measure pgvector in DATABASE_URL")
+    args = parser.parse_args()
+    configured = settings.vector_index
+    try:
+        for dtype in args.dtypes:
+            bench_local(dtype, args.rows, args.dim, args.queries, args.k, args.probes)
+    finally:
+        settings.vector_index = configured
+    if args.pgvector:
+        bench_pgvector(args.rows, args.dim, args.queries, args.k, args.probes, args.ef_search)
+
+if __name__ == "__main__":
+    main()
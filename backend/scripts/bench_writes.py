@@ -0,0 +1,143 @@
+"""
+Rows/sec of the ways to write chunks with their vectors into `documents`.
+
+    cd backend && python -m scripts.bench_writes --rows 20000 --files 200
+
+- insert: one INSERT per chunk through SQLAlchemy and a single commit at the
+  end, as the original pipeline did
+- values: multi-row INSERTs with execute_values, committed per
+  `INGEST_WRITE_BATCH` rows
+- copy: the pipeline's writer (_flush_writes: COPY for new chunks, the
+  manifest through execute_values), same batches
+
+Rows carry random unit vectors sized for the live `embedding` column and
+~1300 characters of text, under `source = 'bench-writes'`; they (and their
+manifest rows) are deleted after each mode. Point DATABASE_URL at a scratch
+database if the live one must not see the extra writes.
+"""
+import argparse
+import hashlib
+import time
+from typing import Dict, List
+
+import numpy as np
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+
+from db import engine, vector_literal
+from ingest.pipeline import FileWork, _flush_writes
+from settings import settings
+
+SOURCE = "bench-writes"
+WORDS = "bomba valvula pressao vazao alarme partida parada manutencao turno sensor transmissor".split()
+MODES = ("insert", "values", "copy")
+
+def make_files(rows: int, files: int, dim: int, seed: int = 0) -> List[FileWork]:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    per_file = max(1, rows // files)
+    out, row = [], 0
+    for f in range(files):
+        uri = f"bench://writes/file_{f:05d}.log"
+        work = FileWork(uri=uri, source=SOURCE, size=0, mtime=0.0, content_hash=f"{f:064x}", doc_type=".log")
+        for c in range(per_file if f < files - 1 else rows - row):
+            content = " ".join(WORDS[(row + i) % len(WORDS)] for i in range(180)) + f" P-{row}"
+            h = hashlib.sha256(content.encode()).hexdigest()
+            work.pending.append((None, 1, f"file_{f:05d}.log#p1#c{c}", content, h))
+            work.vectors.append(vectors[row])
+            row += 1
+        out.append(work)
+    return out
+
+def batches(files: List[FileWork], rows: int):
+    batch, n = [], 0
+    for work in files:
+        batch.append(work)
+        n += len(work.pending)
+        if n >= rows:
+            yield batch
+            batch, n = [], 0
+    if batch:
+        yield batch
+
+def write_insert(files: List[FileWork], vtype: str):
+    with engine.connect() as conn:
+        stmt = text(f"""
+            INSERT INTO documents (source, uri, page, chunk_id, content, content_hash, embedding)
+            VALUES (:source, :uri, :page, :chunk_id, :content, :content_hash, CAST(:embedding AS {vtype}))
+            """)
+        for work in files:
+            for (_, page, chunk_id, content, h), vec in zip(work.pending, work.vectors):
+                conn.execute(stmt, {"source": work.source, "uri": work.uri, "page": page, "chunk_id": chunk_id,
+                                    "content": content, "content_hash": h, "embedding": vector_literal(vec)})
+        conn.commit()
+
+def write_values(files: List[FileWork], vtype: str):
+    conn = engine.raw_connection()
+    try:
+        for batch in batches(files, settings.ingest_write_batch):
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO documents (source, uri, page, chunk_id, content, content_hash, embedding)
+                    VALUES %s
+                    """, [(w.source, w.uri, page, chunk_id, content, h, vector_literal(vec))
+                          for w in batch for (_, page, chunk_id, content, h), vec in zip(w.pending, w.vectors)],
+                    template=f"(%s, %s, %s, %s, %s, %s, %s::{vtype})", page_size=1000)
+            conn.commit()
+    finally:
+        conn.close()
+
+def write_copy(files: List[FileWork], vtype: str):
+    conn = engine.raw_connection()
+    try:
+        for batch in batches(files, settings.ingest_write_batch):
+            _flush_writes(conn, batch, "bench", vtype)
+    finally:
+        conn.close()
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM documents WHERE source = :s"), {"s": SOURCE})
+        conn.execute(text("DELETE FROM ingest_manifest WHERE source = :s"), {"s": SOURCE})
+
+def run(modes: List[str], rows: int, files: int, repeat: int) -> Dict[str, float]:
+    with engine.connect() as conn:
+        vtype = conn.execute(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'documents'::regclass AND attname = 'embedding'"
+        )).scalar()
+    dim = int(vtype[vtype.index("(") + 1:-1])
+    print(f"documents.embedding is {vtype}; {rows} rows in {files} files, INGEST_WRITE_BATCH={settings.ingest_write_batch}")
+    work = make_files(rows, files, dim)
+    writers = {"insert": write_insert, "values": write_values, "copy": write_copy}
+    results = {}
+    cleanup()
+    for mode in modes:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                writers[mode](work, vtype)
+                seconds = time.perf_counter() - started
+            finally:
+                cleanup()
+            best = seconds if best is None else min(best, seconds)
+        results[mode] = rows / best
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--files", type=int, default=200, help="files the rows are spread over (manifest rows)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode; the fastest counts")
+    args = parser.parse_args()
+    results = run(args.modes, args.rows, args.files, args.repeat)
+    base = results.get("insert")
+    for mode, rate in results.items():
+        speedup = f"  ({rate / base:.1f}x insert)" if base and mode != "insert" else ""
+        print(f"{mode:>8}  {rate:,.0f} rows/s{speedup}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Recall@k and latency of each retrieval mode over a labeled query set.
+
+    cd backend && python -m scripts.eval_retrieval queries.jsonl --k 8 --modes vector lexical hybrid
+
+`queries.jsonl` holds one labeled query per line:
+
+    {"query": "alarme E217 na bomba P-101", "relevant": ["manual_p101.pdf", "manual_p101.pdf#p12-c3"],
+     "filters": {"site": "Camacari"}}
+
+A hit counts as relevant when its `chunk_id` or `uri` is listed. `filters`
+(optional) takes the same names as SearchFilters. Every query is embedded
+once and then searched in every mode, so the latency reported is the
+database side only.
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from rag.embedder import Embedder
+from rag.retriever import MODES, Retriever
+
+def recall_at_k(hits: List[Dict], relevant: set, k: int) -> float:
+    """Share of the labeled items found among the first `k` hits."""
+    found = {key for h in hits[:k] for key in (h.get("chunk_id"), h.get("uri")) if key in relevant}
+    return len(found) / len(relevant) if relevant else 0.0
+
+def reciprocal_rank(hits: List[Dict], relevant: set) -> float:
+    for rank, h in enumerate(hits, start=1):
+        if h.get("chunk_id") in relevant or h.get("uri") in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+def evaluate(queries: List[Dict], modes: List[str], k: int, repeat: int = 1) -> Dict[str, Dict[str, float]]:
+    embedder = Embedder()
+    retriever = Retriever(k=k)
+    vectors = embedder.embed([q["query"] for q in queries])
+    results = {}
+    for mode in modes:
+        recalls, rrs, latencies = [], [], []
+        for q, vec in zip(queries, vectors):
+            relevant = set(q["relevant"])
+            for _ in range(repeat):
+                started = time.perf_counter()
+                hits = retriever.search(vec, query_text=q["query"], mode=mode, k=k, **q.get("filters", {}))
+                latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(recall_at_k(hits, relevant, k))
+            rrs.append(reciprocal_rank(hits, relevant))
+        results[mode] = {
+            f"recall@{k}": statistics.fmean(recalls),
+            "mrr": statistics.fmean(rrs),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("queries", help="JSONL file of labeled queries")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="searches per query and mode, for steadier latencies")
+    args = parser.parse_args()
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    results = evaluate(queries, args.modes, args.k, args.repeat)
+    print(f"{len(queries)} queries, k={args.k}")
+    for mode, metrics in results.items():
+        print(f"{mode:>8}  " + "  ".join(f"{name}={value:.3f}" for name, value in metrics.items()))
+
+if __name__ == "__main__":
+    main()
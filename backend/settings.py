@@ -1,6 +1,7 @@
 
 from pydantic import BaseModel
 import os
+import tempfile
 
 class Settings(BaseModel):
     postgres_host: str = os.getenv("POSTGRES_HOST", "localhost")
@@ -8,6 +9,13 @@ class Settings(BaseModel):
     postgres_db: str = os.getenv("POSTGRES_DB", "tauon")
     postgres_user: str = os.getenv("POSTGRES_USER", "tauon")
     postgres_password: str = os.getenv("POSTGRES_PASSWORD", "changeme")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 = never
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
+    # Server-side prepared statements for retrieval; disable behind PgBouncer in transaction mode
+    db_prepared_statements: bool = os.getenv("DB_PREPARED_STATEMENTS", "1") not in ("0", "false", "False")
 
     api_key: str = os.getenv("TAUON_API_KEY", "dev-key")
     cors_origins: str = os.getenv("CORS_ORIGINS", "http://localhost:5173")
@@ -16,6 +24,8 @@ class Settings(BaseModel):
     azure_base: str | None = os.getenv("AZURE_OPENAI_API_BASE")
     azure_key: str | None = os.getenv("AZURE_OPENAI_API_KEY")
     azure_embed: str | None = os.getenv("AZURE_OPENAI_EMBED_DEPLOYMENT")
+    # Model behind the embedding deployment (deployment names are free-form); defaults to the deployment name
+    azure_embed_model: str | None = os.getenv("AZURE_OPENAI_EMBED_MODEL")
     azure_chat: str | None = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
     azure_version: str | None = os.getenv("AZURE_OPENAI_API_VERSION")
 
@@ -24,6 +34,100 @@ class Settings(BaseModel):
     openai_chat_model: str = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 
     st_model: str = os.getenv("SENTENCE_TRANSFORMER", "all-MiniLM-L6-v2")
+    # Truncated (Matryoshka) embedding size for text-embedding-3-* and ST models; unset = native size
+    embed_dimensions: int | None = int(os.getenv("EMBED_DIMENSIONS")) if os.getenv("EMBED_DIMENSIONS") else None
+    st_batch_size: int = int(os.getenv("ST_BATCH_SIZE", "128"))
+
+    # Embedding requests (API modes)
+    embed_batch_tokens: int = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+    embed_concurrency: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    embed_max_retries: int = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+    # Embedding cache (in-memory LRU in front of the embedding_cache table)
+    embed_cache_enabled: bool = os.getenv("EMBED_CACHE", "1") not in ("0", "false", "False")
+    embed_cache_memory_items: int = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "20000"))
+    embed_cache_max_rows: int = int(os.getenv("EMBED_CACHE_MAX_ROWS", "2000000"))
+    # Chunks re-embedded per batch by an embedding migration (ingest/reembed.py)
+    embed_migration_batch: int = int(os.getenv("EMBED_MIGRATION_BATCH", "512"))
+
+    # Vector index (pgvector)
+    vector_index: str = os.getenv("VECTOR_INDEX", "hnsw").lower()  # hnsw | ivfflat | none
+    vector_storage: str = os.getenv("VECTOR_STORAGE", "vector").lower()  # vector | halfvec (new tables)
+    hnsw_m: int = int(os.getenv("HNSW_M", "16"))
+    hnsw_ef_construction: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    hnsw_ef_search: int = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    ivfflat_lists: int = int(os.getenv("IVFFLAT_LISTS", "0"))  # 0 = derive from row count
+    ivfflat_probes: int = int(os.getenv("IVFFLAT_PROBES", "10"))
+    index_maintenance_work_mem: str | None = os.getenv("INDEX_MAINTENANCE_WORK_MEM")
+    # Per-value partial ANN indexes for filtered search: "" | site | source
+    vector_index_partition_by: str = os.getenv("VECTOR_INDEX_PARTITION_BY", "").lower()
+    partial_index_min_rows: int = int(os.getenv("PARTIAL_INDEX_MIN_ROWS", "10000"))
+    # pgvector >= 0.8: keep scanning the HNSW graph until filtered searches fill k ("" | relaxed_order | strict_order)
+    hnsw_iterative_scan: str = os.getenv("HNSW_ITERATIVE_SCAN", "").lower()
+
+    # Vector store: pgvector (Postgres) | local (embedded: memory-mapped vectors + SQLite, no Postgres)
+    vector_store: str = os.getenv("VECTOR_STORE", "pgvector").lower()
+    local_store_dir: str = os.getenv("LOCAL_STORE_DIR", "data/vector-store")
+    local_store_dtype: str = os.getenv("LOCAL_STORE_DTYPE", "float16").lower()  # float16 | int8 (new stores)
+    local_index_min_rows: int = int(os.getenv("LOCAL_INDEX_MIN_ROWS", "50000"))  # exact scan below this
+
+    # Retrieval
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "hybrid").lower()  # vector | lexical | hybrid
+    text_search_config: str = os.getenv("TEXT_SEARCH_CONFIG", "simple")
+    hybrid_candidates_factor: int = int(os.getenv("HYBRID_CANDIDATES_FACTOR", "5"))  # candidates per side = k * factor
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+
+    # Reranking and context packing for /chat
+    rerank_enabled: bool = os.getenv("RERANK", "0") in ("1", "true", "True")
+    rerank_model: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "40"))
+    rerank_batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    rerank_max_length: int = int(os.getenv("RERANK_MAX_LENGTH", "512"))  # tokens per (question, chunk) pair
+    rerank_quantize: bool = os.getenv("RERANK_QUANTIZE", "1") not in ("0", "false", "False")
+    mmr_lambda: float = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = relevance only, lower = more diversity
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+    # Answer cache for repeated /chat questions
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE", "1") not in ("0", "false", "False")
+    answer_cache_ttl: int = int(os.getenv("ANSWER_CACHE_TTL", "43200"))
+    answer_cache_max_items: int = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "2000"))
+    answer_cache_similarity: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+    # Ingestion pipeline
+    chunk_tokens: int = int(os.getenv("CHUNK_TOKENS", "350"))
+    chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+    extract_segment_chars: int = int(os.getenv("EXTRACT_SEGMENT_CHARS", "200000"))
+    ingest_stream_min_bytes: int = int(os.getenv("INGEST_STREAM_MIN_MB", "32")) * 1024 * 1024
+    ingest_extract_workers: int = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    ingest_pdf_pages_per_task: int = int(os.getenv("INGEST_PDF_PAGES_PER_TASK", "16"))
+    ingest_queue_size: int = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+    ingest_embed_batch: int = int(os.getenv("INGEST_EMBED_BATCH", "1024"))
+    ingest_write_batch: int = int(os.getenv("INGEST_WRITE_BATCH", "2000"))
+    # Folder levels under the ingested root that name metadata, e.g. "site/area"
+    ingest_path_metadata: str = os.getenv("INGEST_PATH_METADATA", "")
+    ingest_max_concurrent_jobs: int = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "1"))
+
+    # OCR (scanned PDF pages and images)
+    ocr_enabled: bool = os.getenv("OCR", "1") not in ("0", "false", "False")
+    ocr_lang: str = os.getenv("OCR_LANG", "eng")
+    ocr_dpi: int = int(os.getenv("OCR_DPI", "300"))
+    ocr_max_side: int = int(os.getenv("OCR_MAX_SIDE", "4000"))  # pixels; larger images are downscaled
+    ocr_min_chars: int = int(os.getenv("OCR_MIN_CHARS", "20"))  # PDF pages with less text are OCR'd
+    ocr_cache_enabled: bool = os.getenv("OCR_CACHE", "1") not in ("0", "false", "False")
+    ocr_cache_dir: str = os.getenv("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tauon-ocr-cache"))
+
+    # Uploads (/ingest/folder-upload and resumable /ingest/uploads)
+    upload_max_file_mb: int = int(os.getenv("UPLOAD_MAX_FILE_MB", "1024"))
+    upload_max_total_mb: int = int(os.getenv("UPLOAD_MAX_TOTAL_MB", "10240"))  # unpacked archives included
+    upload_idle_timeout: int = int(os.getenv("UPLOAD_IDLE_TIMEOUT", "3600"))  # seconds; then finish the resumable upload
+
+    # Observability
+    metrics_enabled: bool = os.getenv("METRICS", "1") not in ("0", "false", "False")
+    profiling_enabled: bool = os.getenv("PROFILING", "0") in ("1", "true", "True")
+    profile_dir: str = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "tauon-profiles"))
+
+    # Startup: models load lazily on first use; 1 = load them in the background right after startup
+    warm_models: bool = os.getenv("WARM_MODELS", "1") not in ("0", "false", "False")
 
     # SharePoint
     tenant_id: str | None = os.getenv("MS_TENANT_ID")
@@ -32,5 +136,11 @@ class Settings(BaseModel):
     sp_site_host: str | None = os.getenv("MS_SP_SITE_HOST")
     sp_site_path: str | None = os.getenv("MS_SP_SITE_PATH")
     sp_drive_name: str | None = os.getenv("MS_SP_DRIVE_NAME")
+    sp_mirror_dir: str = os.getenv("MS_SP_MIRROR_DIR", os.path.join(tempfile.gettempdir(), "tauon-sharepoint"))
+    sp_download_concurrency: int = int(os.getenv("MS_SP_DOWNLOAD_CONCURRENCY", "8"))
+    sp_max_retries: int = int(os.getenv("MS_SP_MAX_RETRIES", "6"))
+    # Overridable to point the client at a mock Graph / login server
+    graph_base_url: str = os.getenv("MS_GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+    ms_login_base_url: str = os.getenv("MS_LOGIN_BASE_URL", "https://login.microsoftonline.com")
 
 settings = Settings()
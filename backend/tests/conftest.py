@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend imports its modules flat (`from settings import settings`), as under PYTHONPATH=/app in the image
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
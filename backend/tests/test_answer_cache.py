@@ -0,0 +1,55 @@
+from rag.answer_cache import AnswerCache, context_fingerprint
+
+
+def make_cache(threshold=0.95, max_items=10, ttl=3600):
+    cache = AnswerCache()
+    cache.threshold, cache.max_items, cache.ttl = threshold, max_items, ttl
+    return cache
+
+
+def test_exact_hit_ignores_case_and_spacing():
+    cache = make_cache()
+    cache.put("Qual o alarme E217?", [1.0, 0.0], "fp", "resposta")
+    assert cache.get("  qual o ALARME   e217? ", [0.0, 1.0], "fp") == "resposta"
+    assert cache.exact_hits == 1
+
+
+def test_near_hit_above_threshold():
+    cache = make_cache(threshold=0.95)
+    cache.put("Qual o alarme E217?", [1.0, 0.0, 0.0], "fp", "resposta")
+    assert cache.get("O que significa o alarme E217?", [0.99, 0.05, 0.0], "fp") == "resposta"
+    assert cache.near_hits == 1
+
+
+def test_near_miss_below_threshold_or_other_context():
+    cache = make_cache(threshold=0.95)
+    cache.put("Qual o alarme E217?", [1.0, 0.0, 0.0], "fp", "resposta")
+    assert cache.get("Como trocar o selo da P-101?", [0.6, 0.8, 0.0], "fp") is None
+    assert cache.get("O que significa o alarme E217?", [0.99, 0.05, 0.0], "other") is None
+    assert cache.misses == 2
+
+
+def test_near_hit_never_crosses_embedding_models():
+    cache = make_cache(threshold=0.5)
+    hits = [{"id": 1, "content_hash": "x"}]
+    old, new = context_fingerprint(hits, "openai:text-embedding-3-small"), context_fingerprint(hits, "st:e5-base")
+    cache.put("Qual o alarme E217?", [1.0, 0.0, 0.0], old, "resposta")
+    # Same dimension, different vector space after a migration
+    assert cache.get("O que significa o alarme E217?", [1.0, 0.0, 0.0], new) is None
+    assert cache.get("O que significa o alarme E217?", [1.0, 0.0, 0.0], old) == "resposta"
+
+
+def test_lru_eviction_and_ttl():
+    cache = make_cache(max_items=2)
+    for i in range(3):
+        cache.put(f"pergunta {i}", [1.0, float(i)], "fp", str(i))
+    assert cache.stats()["items"] == 2
+    assert cache.get("pergunta 0", [0.0, -1.0], "fp") is None
+    cache.ttl = -1
+    assert cache.get("pergunta 2", [1.0, 2.0], "fp") is None
+
+
+def test_fingerprint_tracks_content_hash_not_order():
+    a = [{"id": 1, "content_hash": "x"}, {"id": 2, "content_hash": "y"}]
+    assert context_fingerprint(a) == context_fingerprint(a[::-1])
+    assert context_fingerprint(a) != context_fingerprint([{"id": 1, "content_hash": "z"}, a[1]])
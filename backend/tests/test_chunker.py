@@ -0,0 +1,61 @@
+import statistics
+
+from ingest.utils import split_into_chunks
+from rag.tokens import count_tokens
+
+
+def log_text(lines=200):
+    return "\n".join(f"2024-05-{i % 28 + 1:02d} bomba P-{i:03d} pressao {i * 3} bar status ok" for i in range(lines))
+
+
+def test_consecutive_chunks_share_overlap():
+    chunks = split_into_chunks(log_text(), max_tokens=120, overlap=30)
+    assert len(chunks) > 3
+    for prev, nxt in zip(chunks, chunks[1:]):
+        prev_lines, next_lines = prev.split("\n"), nxt.split("\n")
+        shared = next(n for n in range(len(next_lines), 0, -1) if prev_lines[-n:] == next_lines[:n])
+        tokens = sum(count_tokens(l) + 1 for l in next_lines[:shared])
+        # Whole lines, up to the overlap budget, and the next chunk still brings new lines
+        assert 0 < tokens <= 30
+        assert shared < len(next_lines)
+
+
+def test_chunks_respect_budget_and_cover_every_line():
+    text = log_text()
+    chunks = split_into_chunks(text, max_tokens=120, overlap=30)
+    assert all(count_tokens(c) <= 120 for c in chunks)
+    seen = {l for c in chunks for l in c.split("\n")}
+    assert seen == set(text.split("\n"))
+
+
+def test_no_overlap():
+    chunks = split_into_chunks(log_text(), max_tokens=120, overlap=0)
+    lines = [l for c in chunks for l in c.split("\n")]
+    assert lines == log_text().split("\n")
+
+
+def test_heading_starts_fresh_chunk_without_overlap():
+    text = log_text(20) + "\n\n# PROCEDIMENTO DE PARTIDA\n" + log_text(5)
+    chunks = split_into_chunks(text, max_tokens=120, overlap=30)
+    assert any(c.startswith("# PROCEDIMENTO DE PARTIDA") for c in chunks)
+
+
+def test_table_rows_and_numbered_steps_are_not_headings():
+    rows = "\n".join(f"{i} | PUMP-{i} | running | {i * 1.5:.1f} bar" for i in range(1, 400))
+    steps = "\n".join(f"{i}. Open valve V-{i} and check the pressure at PT-{i} before the next step." for i in range(1, 200))
+    for text in (rows, steps):
+        chunks = split_into_chunks(text, max_tokens=400, overlap=60)
+        # Packed close to the budget, not cut at half of it on every line
+        assert statistics.fmean(count_tokens(c) for c in chunks[:-1]) > 300
+        for prev, nxt in zip(chunks, chunks[1:]):
+            assert nxt.split("\n")[0] in prev.split("\n")
+
+
+def test_numbered_section_title_is_a_heading():
+    text = log_text(20) + "\n4.2 Partida da bomba\n" + log_text(5)
+    chunks = split_into_chunks(text, max_tokens=120, overlap=30)
+    assert any(c.startswith("4.2 Partida da bomba") for c in chunks)
+
+
+def test_empty_text():
+    assert split_into_chunks("   ") == []
@@ -0,0 +1,26 @@
+import pytest
+
+from rag.embed_cache import EmbeddingCache, cached_embed
+
+
+@pytest.fixture
+def cache():
+    c = EmbeddingCache("st:test")
+    c.db_tier = False
+    return c
+
+
+def test_duplicates_count_the_same_for_hits_and_misses(cache):
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    assert cached_embed(cache, ["a", "bb", "a"], embed) == [[1.0], [2.0], [1.0]]
+    assert calls == [["a", "bb"]]
+    assert (cache.memory_hits, cache.db_hits, cache.misses) == (0, 0, 3)
+    cached_embed(cache, ["a", "a", "bb", "ccc"], embed)
+    assert calls[-1] == ["ccc"]
+    assert (cache.memory_hits, cache.misses) == (3, 4)
+    assert cache.stats()["hit_rate"] == pytest.approx(3 / 7)
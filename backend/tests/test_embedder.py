@@ -0,0 +1,33 @@
+import pytest
+
+from rag.embedder import Embedder, configured_model
+from settings import settings
+
+
+@pytest.fixture
+def azure(monkeypatch):
+    monkeypatch.setattr(settings, "azure_base", "https://example.openai.azure.com/")
+    monkeypatch.setattr(settings, "azure_key", "key")
+    monkeypatch.setattr(settings, "azure_version", "2024-02-01")
+    monkeypatch.setattr(settings, "embed_dimensions", 1024)
+    monkeypatch.setattr(settings, "embed_cache_enabled", False)
+    monkeypatch.setattr(settings, "azure_embed_model", None)
+    return monkeypatch
+
+
+def test_azure_ada_deployment_is_not_truncated(azure):
+    azure.setattr(settings, "azure_embed", "text-embedding-ada-002")
+    assert configured_model() == "azure:text-embedding-ada-002"
+    emb = Embedder()
+    assert emb.dimensions is None and emb.dimension == 1536
+    with pytest.raises(ValueError, match="dimensions"):
+        Embedder("azure:text-embedding-ada-002@1024")
+
+
+def test_azure_deployment_model_from_setting(azure):
+    azure.setattr(settings, "azure_embed", "embeddings-prod")
+    assert configured_model() == "azure:embeddings-prod"
+    azure.setattr(settings, "azure_embed_model", "text-embedding-3-large")
+    assert configured_model() == "azure:embeddings-prod@1024"
+    emb = Embedder()
+    assert emb.dimensions == 1024 and emb.dimension == 1024
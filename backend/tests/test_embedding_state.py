@@ -0,0 +1,133 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from ingest import reembed
+from rag import retriever as r
+from rag.retriever import Retriever
+
+
+class FakeConn:
+    """Records statements; answers the embedding_state SELECT with `state`."""
+
+    def __init__(self, state):
+        self.state = state
+        self.statements = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.statements.append(sql)
+        return self
+
+    def one(self):
+        return self.state
+
+    def scalar(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self):
+        self.conn = FakeConn(None)
+
+    @contextmanager
+    def connect(self):
+        yield self.conn
+
+    begin = connect
+
+    def raw_connection(self):
+        return self.conn
+
+
+class FakeEmbedder:
+    model_name = "openai:b"
+
+    def __init__(self, model):
+        pass
+
+
+def test_state_is_cached_without_a_pending_migration(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(r.time, "monotonic", lambda: now[0])
+    retriever, conn = Retriever(), FakeConn(("openai:a", 1, None))
+    assert retriever._embedding_state(conn) == ("openai:a", 1)
+    locked = len(conn.statements)
+    assert any("pg_advisory_xact_lock_shared" in s for s in conn.statements)
+    now[0] += r.EMBEDDING_STATE_RECHECK / 2
+    assert retriever._embedding_state(conn) == ("openai:a", 1)
+    assert len(conn.statements) == locked
+    now[0] += r.EMBEDDING_STATE_RECHECK
+    retriever._embedding_state(conn)
+    assert len(conn.statements) == 2 * locked
+
+
+def test_state_is_read_every_search_while_a_migration_is_announced(monkeypatch):
+    monkeypatch.setattr(r.time, "monotonic", lambda: 100.0)
+    retriever, conn = Retriever(), FakeConn(("openai:a", 1, "openai:b"))
+    retriever._embedding_state(conn)
+    locked = len(conn.statements)
+    conn.state = ("openai:b", 2, None)
+    assert retriever._embedding_state(conn) == ("openai:b", 2)
+    assert len(conn.statements) == 2 * locked
+    assert any("lock_timeout" in s for s in conn.statements)
+
+
+@pytest.fixture
+def migration(monkeypatch):
+    """migrate_embeddings against fakes, stopped before any real backfill."""
+    engine = FakeEngine()
+    monkeypatch.setattr(reembed.settings, "vector_store", "pgvector")
+    monkeypatch.setattr(reembed, "engine", engine)
+    monkeypatch.setattr(reembed, "Embedder", FakeEmbedder)
+    monkeypatch.setattr(reembed, "embedding_state", lambda conn: {"model": "openai:a", "next_model": None})
+    monkeypatch.setattr(reembed, "_prepare", lambda emb: "vector(3)")
+    monkeypatch.setattr(reembed, "_pending_rows", lambda conn: 10)
+    return engine.conn.statements
+
+
+def abandoned(statements):
+    return (
+        any("DROP TRIGGER IF EXISTS " + reembed.RESET_TRIGGER in s for s in statements)
+        and any("DROP COLUMN IF EXISTS " + reembed.NEXT_COLUMN in s for s in statements)
+        and any("next_model = NULL" in s for s in statements)
+    )
+
+
+def test_cancelled_migration_clears_the_announcement(migration):
+    cancel = threading.Event()
+    cancel.set()
+    stats = reembed.migrate_embeddings("openai:b", cancel=cancel)
+    assert stats["cancelled"]
+    assert abandoned(migration)
+
+
+def test_failed_migration_clears_the_announcement(migration, monkeypatch):
+    def fail(conn):
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(reembed, "_pending_rows", fail)
+    with pytest.raises(RuntimeError, match="connection lost"):
+        reembed.migrate_embeddings("openai:b")
+    assert abandoned(migration)
+    # The migration lock is still released
+    assert "pg_advisory_unlock" in migration[-1]
+
+
+def test_search_sql_stays_with_the_generation_it_was_built_for(monkeypatch):
+    monkeypatch.setattr(r, "embedding_column", lambda s: ("vector", 3))
+    retriever = Retriever()
+    old = retriever._plans_for(1)
+    new = retriever._plans_for(2)
+    assert retriever._search_sql(None, old, "vector", (), False, False)[1].endswith("_g1")
+    assert retriever._search_sql(None, new, "vector", (), False, False)[1].endswith("_g2")
+    # A search still holding a pre-cutover state gets its own cache without evicting the new one
+    stale = retriever._plans_for(1)
+    assert stale is not old and not stale.sql
+    assert retriever._plans_for(2) is new
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from rag import local_store as ls
+from rag.local_store import LocalStoreMismatch, LocalVectorStore
+
+
+def work(uri, chunks):
+    """A FileWork-shaped batch item: chunks are (text, vector) pairs."""
+    return SimpleNamespace(
+        uri=uri, source="test", size=1, mtime=0.0, content_hash=uri, site=None, area=None, doc_type=None,
+        pending=[(None, 1, f"{uri}#p1#c{i}", text, f"h{i}") for i, (text, _) in enumerate(chunks)],
+        vectors=[vec for _, vec in chunks], stale_ids=[], partial=False,
+    )
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(ls, "REFRESH_SECONDS", 0.0)
+    s = LocalVectorStore(str(tmp_path))
+    s.init(3)
+    yield s
+    s.close()
+
+
+def test_hybrid_search(store):
+    store.write([work("a.txt", [("bomba P-101 alarme E217", [1, 0, 0]), ("valvula V-20 aberta", [0, 1, 0])])], "m")
+    hits = store.search([0, 1, 0], "E217", mode="hybrid", k=2)
+    assert {h["content"] for h in hits} == {"bomba P-101 alarme E217", "valvula V-20 aberta"}
+    assert all("rrf" in h and "score" in h for h in hits)
+
+
+def test_reader_process_sees_other_writers_rows(store, tmp_path):
+    reader = LocalVectorStore(str(tmp_path))
+    reader.init(3)
+    assert reader.search([1, 0, 0], "E217", mode="hybrid", k=2) == []
+    # Enough rows that the writer grows vectors.bin past the reader's mapping
+    rows = [(f"linha {i} alarme E217", [1, 0, i / 5000]) for i in range(ls.INITIAL_CAPACITY + 10)]
+    store.write([work("big.log", rows)], "m")
+    hits = reader.search([1, 0, 0], "E217", mode="hybrid", k=3)
+    assert len(hits) == 3
+    store.delete_file("big.log")
+    assert reader.search([1, 0, 0], "E217", mode="hybrid", k=3) == []
+    reader.close()
+
+
+def test_lexical_hits_beyond_loaded_arrays_are_skipped(store, tmp_path, monkeypatch):
+    reader = LocalVectorStore(str(tmp_path))
+    reader.init(3)
+    monkeypatch.setattr(ls, "REFRESH_SECONDS", 3600.0)
+    reader._checked = float("inf")
+    store.write([work("big.log", [(f"alarme E217 {i}", [1, 0, 0]) for i in range(ls.INITIAL_CAPACITY + 10)])], "m")
+    # Stale view: rows it can't score are left out instead of raising IndexError
+    assert reader.search([1, 0, 0], "E217", mode="hybrid", k=5) == []
+    reader.close()
+
+
+def test_dimension_mismatch_is_fatal(store, tmp_path):
+    with pytest.raises(LocalStoreMismatch):
+        LocalVectorStore(str(tmp_path)).init(4)
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import pytest
+from pypdf.generic import DictionaryObject, NameObject
+
+from ingest import extractors
+from ingest.ocr import needs_ocr
+
+
+def pdf_dict(**entries):
+    return DictionaryObject({NameObject(f"/{k}"): v for k, v in entries.items()})
+
+
+def xobject(subtype, **entries):
+    return pdf_dict(Subtype=NameObject(f"/{subtype}"), **entries)
+
+
+def resources(**xobjects):
+    return pdf_dict(XObject=pdf_dict(**xobjects))
+
+
+@pytest.fixture(autouse=True)
+def ocr_enabled(monkeypatch):
+    monkeypatch.setattr(extractors.settings, "ocr_enabled", True)
+
+
+def test_image_on_the_page_needs_ocr():
+    assert needs_ocr(pdf_dict(Resources=resources(Im0=xobject("Image"))), "")
+
+
+def test_resources_inherited_from_the_page_tree():
+    parent = pdf_dict(Resources=resources(Im0=xobject("Image")))
+    assert needs_ocr(pdf_dict(Parent=pdf_dict(Parent=parent)), "")
+
+
+def test_forms_count_only_when_they_wrap_an_image():
+    stamp = xobject("Form", Resources=pdf_dict())
+    assert not needs_ocr(pdf_dict(Resources=resources(Fm0=stamp)), "")
+    scan = xobject("Form", Resources=resources(Im0=xobject("Image")))
+    assert needs_ocr(pdf_dict(Resources=resources(Fm0=scan)), "")
+
+
+def test_text_layer_skips_ocr():
+    page = pdf_dict(Resources=resources(Im0=xobject("Image")))
+    assert not needs_ocr(page, "x" * extractors.settings.ocr_min_chars)
+
+
+def test_failed_frame_keeps_the_ones_already_read(monkeypatch):
+    def frames(path):
+        yield "pagina 1", 1
+        raise OSError("truncated TIFF")
+
+    monkeypatch.setattr(extractors, "ocr_image_file", frames)
+    assert list(extractors.extract_text(Path("scan.tif"))) == [("pagina 1", 1)]
+
+
+def test_unreadable_image_yields_a_placeholder(monkeypatch):
+    def frames(path):
+        raise OSError("not an image")
+        yield
+
+    monkeypatch.setattr(extractors, "ocr_image_file", frames)
+    assert list(extractors.extract_text(Path("scan.png"))) == [("", 1)]
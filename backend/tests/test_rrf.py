@@ -0,0 +1,30 @@
+import pytest
+
+from rag.local_store import rrf_fuse
+from scripts.eval_retrieval import percentile, recall_at_k, reciprocal_rank
+
+
+def test_rrf_sums_reciprocal_ranks_across_lists():
+    fused = rrf_fuse([[1, 2, 3], [3, 1]], rrf_k=60)
+    assert fused[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2] == pytest.approx(1 / 62)
+    assert fused[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert list(fused) == [1, 3, 2]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert list(rrf_fuse([[7, 8], [8, 7]], rrf_k=60)) == [7, 8]
+
+
+def test_rrf_single_list_keeps_its_order():
+    assert list(rrf_fuse([[5, 3, 9]], rrf_k=60)) == [5, 3, 9]
+    assert rrf_fuse([], rrf_k=60) == {}
+
+
+def test_eval_metrics():
+    hits = [{"chunk_id": "a#1", "uri": "a"}, {"chunk_id": "b#1", "uri": "b"}, {"chunk_id": "c#2", "uri": "c"}]
+    assert recall_at_k(hits, {"b#1", "c"}, k=2) == 0.5
+    assert recall_at_k(hits, {"b#1", "c"}, k=3) == 1.0
+    assert reciprocal_rank(hits, {"c#2"}) == pytest.approx(1 / 3)
+    assert reciprocal_rank(hits, {"z"}) == 0.0
+    assert percentile([5.0, 1.0, 3.0, 2.0, 4.0], 50) == 3.0
@@ -0,0 +1,85 @@
+import tracemalloc
+
+import pytest
+from openpyxl import Workbook
+
+from ingest import pipeline
+from ingest.extractors import extract_text
+from ingest.pipeline import FileWork, _plan_chunks
+from rag.tokens import count_tokens
+
+
+class EmptySession:
+    """A metadata session for a file that was never ingested."""
+
+    def execute(self, stmt, params=None):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
+
+
+def row(i):
+    return (i, f"P-{i % 500:03d}", "bomba centrifuga", "running" if i % 7 else "alarm", i * 0.25, f"2024-05-{i % 28 + 1:02d}")
+
+
+def write_xlsx(path, rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leituras")
+    ws.append(["id", "tag", "equipamento", "status", "pressao", "data"])
+    for i in range(rows):
+        ws.append(row(i))
+    wb.save(path)
+
+
+def write_log(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(" | ".join(map(str, row(i))) + " leitura normal do sensor\n")
+
+
+def peak_while_ingesting(path):
+    """tracemalloc peak (bytes) of extracting and planning the chunks of `path`, and the chunk count."""
+    parts = []
+    work = FileWork(uri=str(path), source="test", size=path.stat().st_size, mtime=0.0, content_hash="")
+    count_tokens("warm up the tokenizer outside the measurement")
+    tracemalloc.start()
+    try:
+        _plan_chunks(EmptySession(), work, extract_text(path), reembed_all=False,
+                     emit=lambda part: parts.append(len(part.pending)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, sum(parts) + len(work.pending)
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(pipeline.settings, "extract_segment_chars", 100_000)
+    monkeypatch.setattr(pipeline.settings, "ingest_embed_batch", 256)
+
+
+def test_log_planning_memory_does_not_grow_with_the_file(tmp_path, small_batches):
+    peaks = []
+    for lines in (60_000, 240_000):
+        path = tmp_path / f"scada_{lines}.log"
+        write_log(path, lines)
+        peak, chunks = peak_while_ingesting(path)
+        print(f"\nlog: {path.stat().st_size / 1e6:.1f} MB on disk, {chunks} chunks, peak {peak / 1e6:.1f} MB")
+        peaks.append(peak)
+    # 4x the file (~22 MB): the peak stays bounded by the segment size and the dedupe window
+    assert peaks[1] < 1.5 * peaks[0]
+    assert peaks[1] < 4_000_000
+
+
+def test_xlsx_streams_in_bounded_memory(tmp_path, small_batches):
+    path = tmp_path / "leituras.xlsx"
+    write_xlsx(path, 12_000)
+    peak, chunks = peak_while_ingesting(path)
+    print(f"\nxlsx: {path.stat().st_size / 1e6:.1f} MB on disk, {chunks} chunks, peak {peak / 1e6:.1f} MB")
+    assert chunks > 500
+    # A loaded (not read_only) workbook of 72k cells alone takes several times this
+    assert peak < 4_000_000
@@ -0,0 +1,153 @@
+import io
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from ingest import uploads as up
+from ingest.uploads import OffsetMismatch, UploadBudget, UploadError, UploadFeed, UploadSessions, UploadTooLarge
+from settings import settings
+
+MB = 1 << 20
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_file_mb", 1)
+    monkeypatch.setattr(settings, "upload_max_total_mb", 2)
+
+
+def test_budget_per_file_and_total():
+    budget = UploadBudget()
+    budget.add("a.txt", MB, MB)
+    with pytest.raises(UploadTooLarge, match="per-file"):
+        budget.add("a.txt", 1, MB + 1)
+    budget = UploadBudget()
+    budget.add("a.txt", MB, MB)
+    budget.add("b.txt", MB, MB)
+    with pytest.raises(UploadTooLarge, match="total"):
+        budget.add("c.txt", 1, 1)
+
+
+def test_zip_member_sizes_are_counted_not_trusted(tmp_path):
+    archive = tmp_path / "bomb.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("big.log", b"0" * (MB + 1))
+        zf.writestr("small.log", b"ok")
+    with pytest.raises(UploadTooLarge):
+        up.unpack_zip(archive, tmp_path / "out", UploadBudget(), UploadFeed())
+
+    # A header claiming a small size doesn't get past the byte count
+    budget = UploadBudget()
+    src = io.BytesIO(b"0" * (MB + 1))
+    with pytest.raises(UploadTooLarge):
+        up.copy_limited(src, io.BytesIO(), "lying.log", budget)
+
+
+def test_tar_members_feed_as_they_land(tmp_path):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in (("a/1.log", b"um"), ("a/../../escape.log", b"x")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    feed = UploadFeed()
+    with pytest.raises(UploadError, match="Invalid file name"):
+        up.unpack_tar(buf, tmp_path / "out", UploadBudget(), feed)
+    feed.close()
+    assert [p.name for p in feed] == ["1.log"]
+    assert not (tmp_path / "escape.log").exists()
+
+
+BOUNDARY = "tauon"
+
+
+def multipart(fields=(), files=()):
+    body = b""
+    for name, value in fields:
+        body += f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    for name, data in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                 "Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receiver(tmp_path, started):
+    return up.MultipartUpload(f"multipart/form-data; boundary={BOUNDARY}", tmp_path, UploadBudget(), UploadFeed(),
+                              lambda fields: started.append(dict(fields)))
+
+
+def test_multipart_keeps_relative_paths_and_authenticates_at_the_first_file(tmp_path):
+    started = []
+    r = receiver(tmp_path, started)
+    r.write(multipart([("x_api_key", "k"), ("site", "Camacari")],
+                      [("area1/log.txt", b"a"), ("area2/log.txt", b"b")]))
+    r.finish()
+    assert started == [{"x_api_key": "k", "site": "Camacari"}]
+    assert (tmp_path / "area1" / "log.txt").read_bytes() == b"a"
+    assert (tmp_path / "area2" / "log.txt").read_bytes() == b"b"
+
+
+def test_fields_before_authentication_are_capped(tmp_path):
+    with pytest.raises(UploadError, match="form fields"):
+        receiver(tmp_path, []).write(multipart([(f"f{i}", "x") for i in range(up.MAX_FIELDS + 1)]))
+    # Many fields, each under the per-field limit, still can't add up past it
+    fields = [(f"f{i}", "x" * (up.MAX_FIELD_BYTES // 8)) for i in range(10)]
+    with pytest.raises(UploadError, match="exceed"):
+        receiver(tmp_path, []).write(multipart(fields))
+
+
+def test_file_part_headers_do_not_count_against_the_field_limit(tmp_path):
+    started = []
+    r = receiver(tmp_path, started)
+    r.write(multipart([("x_api_key", "k")], [(f"dir/{'n' * 200}_{i}.log", b"x") for i in range(400)]))
+    r.finish()
+    assert r.files == 400
+
+
+def put(session, name, data, offset=0, final=True):
+    path, out, _ = session.open_chunk(name, offset)
+    out.write(data)
+    session.close_chunk(name, path, out, final)
+
+
+def test_resumable_session_starts_its_job_only_when_finished():
+    started = []
+    sessions = UploadSessions(lambda s: started.append(s.id) or "job-1")
+    session = sessions.create()
+    try:
+        put(session, "a.log", b"linha 1\n", final=False)
+        with pytest.raises(OffsetMismatch):
+            put(session, "a.log", b"linha 2\n", offset=0)
+        put(session, "a.log", b"linha 2\n", offset=8)
+        assert started == []
+        sessions.finish(session)
+        sessions.finish(session)
+        assert started == [session.id] and session.job_id == "job-1"
+        assert [p.read_bytes() for p in session.feed] == [b"linha 1\nlinha 2\n"]
+        with pytest.raises(UploadError, match="finished"):
+            put(session, "b.log", b"x")
+    finally:
+        sessions.discard(session.id)
+
+
+def test_idle_session_is_finished_with_complete_files(monkeypatch):
+    started = []
+    sessions = UploadSessions(lambda s: started.append(s.id) or "job-1")
+    monkeypatch.setattr(settings, "upload_idle_timeout", 60)
+    empty, partial = sessions.create(), sessions.create()
+    put(partial, "a.log", b"completo")
+    put(partial, "b.log", b"pela met", final=False)
+    for s in (empty, partial):
+        s.feed.last_activity = time.monotonic() - 61
+    assert sessions.get(empty.id) is None and not empty.dir.exists()
+    assert sessions.get(partial.id) is partial
+    assert started == [partial.id]
+    assert [p.name for p in partial.feed] == ["a.log"]
+    # Its job owns the files from here on: forgetting the session leaves them alone
+    partial.feed.last_activity = time.monotonic() - 121
+    assert sessions.get(partial.id) is None and partial.dir.exists()
+    sessions.discard(partial.id)
+    up.shutil.rmtree(partial.dir, ignore_errors=True)
@@ -1,6 +1,6 @@
 
 import React from 'react'
-import { chat } from '../lib/api'
+import { chatStream } from '../lib/api'
 
 type Source = { source:string, uri:string, page:number, chunk_id:string, content:string, score:number }
 
@@ -45,28 +45,31 @@ export default function Chat(){
       timestamp: Date.now()
     }
     
-    setMessages(prev => [...prev, userMessage])
+    const assistantId = (Date.now() + 1).toString()
+    const placeholder: Message = {
+      id: assistantId,
+      role: 'assistant',
+      content: '',
+      timestamp: Date.now()
+    }
+    const update = (fn: (m: Message) => Message) =>
+      setMessages(prev => prev.map(m => m.id === assistantId ? fn(m) : m))
+
+    setMessages(prev => [...prev, userMessage, placeholder].slice(-MAX_MESSAGES))
     setInput('')
     setBusy(true)
     
     try {
-      const res = await chat(input.trim())
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: res.answer,
-        timestamp: Date.now(),
-        sources: res.sources
-      }
-      setMessages(prev => [...prev.slice(-(MAX_MESSAGES - 1)), assistantMessage])
+      await chatStream(userMessage.content, {
+        onSources: sources => update(m => ({ ...m, sources })),
+        onToken: token => update(m => ({ ...m, content: m.content + token, timestamp: Date.now() }))
+      })
     } catch (error: any) {
-      const errorMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: 'Erro ao processar a pergunta. Verifique se a API está configurada corretamente.',
+      update(m => ({
+        ...m,
+        content: m.content || 'Erro ao processar a pergunta. Verifique se a API está configurada corretamente.',
         timestamp: Date.now()
-      }
-      setMessages(prev => [...prev.slice(-(MAX_MESSAGES - 1)), errorMessage])
+      }))
     } finally {
       setBusy(false)
     }
@@ -166,7 +169,12 @@ export default function Chat(){
                     </span>
                   </div>
                   <div className="message-text">
-                    {msg.content}
+                    {msg.role === 'assistant' && !msg.content && busy ? (
+                      <>
+                        <span className="spinner"></span>
+                        Pensando...
+                      </>
+                    ) : msg.content}
                   </div>
                   {msg.sources && msg.sources.length > 0 && (
                     <div style={{marginTop: '1rem'}}>
@@ -197,20 +205,6 @@ export default function Chat(){
                 </div>
               </div>
             ))}
-            {busy && (
-              <div className="chat-message" data-role="assistant">
-                <div className="message-avatar">🤖</div>
-                <div className="message-content">
-                  <div className="message-header">
-                    <span className="message-role">Assistente</span>
-                  </div>
-                  <div className="message-text">
-                    <span className="spinner"></span>
-                    Pensando...
-                  </div>
-                </div>
-              </div>
-            )}
             <div ref={messagesEndRef} />
           </>
         )}
@@ -1,6 +1,6 @@
 
 import React from 'react'
-import { ingestFolderUpload } from '../lib/api'
+import { ingestFolderUpload, waitForJob, describeJob } from '../lib/api'
 
 export default function FolderPicker() {
   const [busy, setBusy] = React.useState(false)
@@ -12,8 +12,10 @@ export default function FolderPicker() {
     setBusy(true)
     setMsg('Processando arquivos...')
     try {
-      await ingestFolderUpload(files)
-      setMsg('✅ Ingestão concluída com sucesso!')
+      const { data } = await ingestFolderUpload(files)
+      const job = await waitForJob(data.job_id, j => setMsg(`Processando: ${describeJob(j)}`))
+      if (job.status === 'succeeded') setMsg(`✅ Ingestão concluída: ${describeJob(job)}`)
+      else setMsg(`❌ Ingestão ${job.status === 'cancelled' ? 'cancelada' : 'falhou'}: ${job.error || describeJob(job)}`)
     } catch (err: any) {
       setMsg('❌ Erro: ' + (err?.message || 'Falha na ingestão'))
     } finally {
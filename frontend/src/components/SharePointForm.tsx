@@ -1,6 +1,6 @@
 
 import React from 'react'
-import { ingestSharePoint } from '../lib/api'
+import { ingestSharePoint, waitForJob, describeJob } from '../lib/api'
 
 export default function SharePointForm(){
   const [path, setPath] = React.useState('Documents/PlantSpecs')
@@ -11,8 +11,12 @@ export default function SharePointForm(){
     setBusy(true)
     setStatus('Conectando ao SharePoint e processando...')
     try {
-      await ingestSharePoint(path)
-      setStatus('✅ Ingestão concluída do SharePoint')
+      const { data } = await ingestSharePoint(path)
+      const job = await waitForJob(data.job_id, j => setStatus(
+        j.status === 'running' && j.progress ? `Processando: ${describeJob(j)}` : 'Conectando ao SharePoint e processando...'
+      ))
+      if (job.status === 'succeeded') setStatus(`✅ Ingestão concluída do SharePoint: ${describeJob(job)}`)
+      else setStatus(`❌ Ingestão ${job.status === 'cancelled' ? 'cancelada' : 'falhou'}: ${job.error || describeJob(job)}`)
     } catch (e:any){
       setStatus('❌ Erro: ' + (e?.message || 'Falha na conexão'))
     } finally { 
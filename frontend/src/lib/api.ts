@@ -7,7 +7,8 @@ const key = localStorage.getItem('TAUON_API_KEY') || 'dev-key'
 export async function ingestFolderUpload(files: File[]) {
   const form = new FormData()
   form.append('x_api_key', key)
-  files.forEach(f => form.append('files', f))
+  // Relative path, so same-named files in different subfolders stay apart
+  files.forEach(f => form.append('files', f, f.webkitRelativePath || f.name))
   return axios.post(`${base}/ingest/folder-upload`, form)
 }
 
@@ -18,6 +19,43 @@ export async function ingestSharePoint(sp_folder: string) {
   return axios.post(`${base}/ingest/sharepoint`, form)
 }
 
+export type IngestJob = {
+  id: string
+  kind: string
+  target: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  progress?: { files_seen?: number, updated?: number, skipped?: number, chunks_done?: number,
+               chunks_per_sec?: number, errors?: { uri: string, error: string }[] }
+  error?: string
+}
+
+export async function getJob(id: string): Promise<IngestJob> {
+  const { data } = await axios.get(`${base}/ingest/jobs/${id}`, { params: { x_api_key: key } })
+  return data
+}
+
+export async function cancelJob(id: string) {
+  const form = new FormData()
+  form.append('x_api_key', key)
+  return axios.post(`${base}/ingest/jobs/${id}/cancel`, form)
+}
+
+// Poll an ingestion job until it reaches a terminal state.
+export async function waitForJob(id: string, onProgress?: (job: IngestJob) => void, intervalMs = 2000) {
+  while (true) {
+    const job = await getJob(id)
+    onProgress?.(job)
+    if (job.status === 'succeeded' || job.status === 'failed' || job.status === 'cancelled') return job
+    await new Promise(r => setTimeout(r, intervalMs))
+  }
+}
+
+export function describeJob(job: IngestJob) {
+  const p = job.progress || {}
+  const errors = p.errors?.length ? `, ${p.errors.length} erro(s)` : ''
+  return `${p.files_seen ?? 0} arquivos, ${p.chunks_done ?? 0} chunks (${(p.chunks_per_sec ?? 0).toFixed(1)}/s)${errors}`
+}
+
 export async function chat(question: string) {
   const form = new FormData()
   form.append('x_api_key', key)
@@ -25,3 +63,43 @@ export async function chat(question: string) {
   const { data } = await axios.post(`${base}/chat`, form)
   return data
 }
+
+export type ChatStreamHandlers = {
+  onSources?: (sources: any[]) => void
+  onToken?: (token: string) => void
+}
+
+// POST /chat/stream and dispatch its Server-Sent Events as they arrive.
+// EventSource only supports GET, so the stream is read with fetch.
+export async function chatStream(question: string, handlers: ChatStreamHandlers) {
+  const form = new FormData()
+  form.append('x_api_key', key)
+  form.append('question', question)
+  const res = await fetch(`${base}/chat/stream`, { method: 'POST', body: form })
+  if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let sep
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, sep)
+      buffer = buffer.slice(sep + 2)
+      let event = 'message'
+      let data = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      const payload = data ? JSON.parse(data) : null
+      if (event === 'sources') handlers.onSources?.(payload)
+      else if (event === 'token') handlers.onToken?.(payload)
+      else if (event === 'error') throw new Error(payload?.error || 'Stream error')
+      else if (event === 'done') return
+    }
+  }
+}